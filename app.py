@@ -5,20 +5,46 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+import atexit
+from typing import Dict, Optional
+
 from flask import Flask
 from database import init_database, add_sample_data
 from routes import register_blueprints
+from services import catalog_snapshot
+from services.archive_service import ArchiveWorker, DEFAULT_ARCHIVE_AFTER_DAYS
+from services.backup_service import BackupScheduler, DEFAULT_KEEP
+from services.due_date_scheduler import DueDateScheduler, FileNotifier
+from services.loan_policy import configure_loan_policy
+from services.recommendation_service import RebuildWorker
+from services.rendering import init_rendering
+from services.shard_router import init_branch_routing
+from services.payment_service import PaymentGateway
+from services.payment_worker import PaymentSettlementWorker
+
 
+# Background services bound to database.DATABASE, which BRANCHES deployments don't serve from
+SINGLE_DATABASE_SETTINGS = ('CATALOG_SNAPSHOT', 'PAYMENT_WORKERS', 'BACKUP_DIR',
+                            'RECOMMENDATION_REBUILD_INTERVAL', 'ARCHIVE_INTERVAL', 'DUE_DATE_NOTIFICATIONS')
 
-def create_app():
+
+def create_app(config: Optional[Dict] = None):
     """
     Application factory function to create and configure Flask app.
     
+    Args:
+        config: Optional settings applied to app.config before blueprints are registered
+    
     Returns:
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
+    if config:
+        app.config.update(config)
+    for setting in SINGLE_DATABASE_SETTINGS:
+        if app.config.get('BRANCHES') and app.config.get(setting):
+            raise ValueError(f"{setting} runs against one database and cannot be combined with BRANCHES.")
     
     # Initialize the database
     init_database()
@@ -26,12 +52,62 @@ def create_app():
     # Add sample data for testing and demonstration
     add_sample_data()
     
+    # Serve catalog reads from a memory-mapped snapshot shared by all workers
+    if app.config.get('CATALOG_SNAPSHOT'):
+        catalog_snapshot.enable(app.config['CATALOG_SNAPSHOT'])
+    
+    # Borrowing limits, loan periods and late fees from a JSON policy file (or dict)
+    if app.config.get('LOAN_POLICY'):
+        configure_loan_policy(app.config['LOAN_POLICY'])
+    
+    # Cached compiled templates and rendered catalog/search rows
+    init_rendering(app)
+    
+    # One database per library branch; each request is served from one of them
+    if app.config.get('BRANCHES'):
+        init_branch_routing(app, app.config['BRANCHES'])
+    
     # Register all route blueprints
     register_blueprints(app)
     
+    # Background settlement of queued late fee payments; without a worker
+    # /api/pay_late_fee refuses payments rather than queueing them forever
+    workers = app.config.get('PAYMENT_WORKERS', 0)
+    if workers:
+        _run_in_background(app, 'payment_worker', PaymentSettlementWorker(PaymentGateway(), workers=workers))
+    
+    # Periodic online snapshots of the database
+    if app.config.get('BACKUP_DIR'):
+        _run_in_background(app, 'backup_scheduler', BackupScheduler(
+            app.config['BACKUP_DIR'], interval=app.config.get('BACKUP_INTERVAL', 3600.0),
+            keep=app.config.get('BACKUP_KEEP', DEFAULT_KEEP)))
+    
+    # Periodic rebuild of the co-borrow recommendation index from full history
+    if app.config.get('RECOMMENDATION_REBUILD_INTERVAL'):
+        _run_in_background(app, 'recommendation_rebuilder',
+                           RebuildWorker(app.config['RECOMMENDATION_REBUILD_INTERVAL']))
+    
+    # Periodic move of old returned loans into the archive database
+    if app.config.get('ARCHIVE_INTERVAL'):
+        _run_in_background(app, 'archive_worker', ArchiveWorker(
+            app.config.get('ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS),
+            interval=app.config['ARCHIVE_INTERVAL']))
+    
+    # "Due soon" and "now overdue" notifications, one JSON line each
+    if app.config.get('DUE_DATE_NOTIFICATIONS'):
+        _run_in_background(app, 'due_date_scheduler',
+                           DueDateScheduler(FileNotifier(app.config['DUE_DATE_NOTIFICATIONS'])))
+    
     return app
 
 
+def _run_in_background(app, name: str, worker):
+    """Start a background worker, expose it as app.extensions[name] and stop it at exit."""
+    worker.start()
+    app.extensions[name] = worker
+    atexit.register(worker.stop)
+
+
 if __name__ == '__main__':
-    app = create_app()
+    app = create_app({'PAYMENT_WORKERS': 4})
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,196 @@
+"""
+ASGI entry point for the asyncio-native JSON API.
+
+Mirrors the JSON endpoints of the Flask app (search, late fee, borrow, return,
+pay late fee) without holding a thread per in-flight request: SQLite work runs
+on a bounded thread pool. Late fee payments go through the same payments
+outbox as the Flask API and are charged on the event loop by an
+AsyncPaymentSettlementWorker, which runs for the app's lifespan; without a
+running lifespan the pay endpoint returns 503.
+
+Serve with any ASGI server, e.g.  uvicorn asgi:app
+"""
+
+import asyncio
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+from database import init_database, add_sample_data
+from library_service import (
+    borrow_book_by_patron, calculate_late_fee_for_book, return_book_by_patron,
+    search_books_in_catalog, submit_late_fee_payment
+)
+from services.payment_service import AsyncPaymentGateway
+from services.payment_worker import AsyncPaymentSettlementWorker
+
+logger = logging.getLogger(__name__)
+
+# Threads available for blocking SQLite calls, and how many calls may wait for one
+DB_WORKERS = 8
+DB_MAX_PENDING = 256
+# Late fee payments charged concurrently on the event loop
+PAYMENT_WORKERS = 4
+
+
+class BadRequest(Exception):
+    """A request body that cannot be parsed."""
+
+
+class AsyncLibraryAPI:
+    """Minimal ASGI application routing /api requests to the service layer."""
+
+    def __init__(self, payment_gateway=None, db_workers: int = DB_WORKERS,
+                 db_max_pending: int = DB_MAX_PENDING, payment_workers: int = PAYMENT_WORKERS):
+        self.payment_worker = AsyncPaymentSettlementWorker(payment_gateway or AsyncPaymentGateway(),
+                                                           self.run_db, workers=payment_workers)
+        self._executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix='library-db')
+        self._db_max_pending = db_max_pending
+        self._db_slots = None
+        self._routes = [
+            ('GET', re.compile(r'^/api/search$'), self.search),
+            ('GET', re.compile(r'^/api/late_fee/(?P<patron_id>[^/]+)/(?P<book_id>\d+)$'), self.late_fee),
+            ('POST', re.compile(r'^/api/borrow$'), self.borrow),
+            ('POST', re.compile(r'^/api/return$'), self.return_book),
+            ('POST', re.compile(r'^/api/pay_late_fee$'), self.pay_late_fee),
+        ]
+
+    async def run_db(self, func, *args):
+        """Run a blocking database call on the bounded executor."""
+        if self._db_slots is None:
+            self._db_slots = asyncio.Semaphore(self._db_max_pending)
+        async with self._db_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        body = b''
+        more = True
+        while more:
+            message = await receive()
+            body += message.get('body', b'')
+            more = message.get('more_body', False)
+
+        try:
+            status, payload = await self.dispatch(
+                scope['method'], scope['path'], scope.get('query_string', b''), body,
+                dict(scope.get('headers', [])).get(b'content-type', b''))
+        except BadRequest as e:
+            status, payload = 400, {'error': str(e)}
+        except Exception:
+            logger.exception('Unhandled error serving %s %s', scope['method'], scope['path'])
+            status, payload = 500, {'error': 'Internal server error'}
+
+        encoded = json.dumps(payload, default=str).encode()
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'),
+                                (b'content-length', str(len(encoded)).encode())]})
+        await send({'type': 'http.response.body', 'body': encoded})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.run_db(init_database)
+                await self.run_db(add_sample_data)
+                self.payment_worker.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.payment_worker.stop()
+                self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dispatch(self, method: str, path: str, query_string: bytes, body: bytes,
+                       content_type: bytes = b''):
+        """Route a request and return (status, JSON payload)."""
+        path_matched = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            path_matched = True
+            if route_method != method:
+                continue
+            params = {k: v[0] for k, v in parse_qs(_decode(query_string)).items()}
+            if method == 'POST':
+                params.update(_parse_body(body, content_type))
+            return await handler(params, **match.groupdict())
+        if path_matched:
+            return 405, {'error': 'Method not allowed'}
+        return 404, {'error': 'Not found'}
+
+    async def search(self, params: Dict):
+        search_term = params.get('q', '').strip()
+        search_type = params.get('type', 'title')
+        if not search_term:
+            return 400, {'error': 'Search term is required'}
+
+        books = await self.run_db(search_books_in_catalog, search_term, search_type)
+        return 200, {'search_term': search_term, 'search_type': search_type,
+                     'results': books, 'count': len(books)}
+
+    async def late_fee(self, params: Dict, patron_id: str, book_id: str):
+        return 200, await self.run_db(calculate_late_fee_for_book, patron_id, int(book_id))
+
+    async def borrow(self, params: Dict):
+        return await self._circulation(borrow_book_by_patron, params)
+
+    async def return_book(self, params: Dict):
+        return await self._circulation(return_book_by_patron, params)
+
+    async def pay_late_fee(self, params: Dict):
+        if not self.payment_worker.running:
+            return 503, {'success': False, 'message': 'Late fee payments are not being accepted right now.'}
+        book_id = _book_id(params)
+        if book_id is None:
+            return 400, {'success': False, 'message': 'Invalid book ID.'}
+        success, message = await self.run_db(
+            submit_late_fee_payment, params.get('patron_id', '').strip(), book_id)
+        return (202 if success else 400), {'success': success, 'message': message}
+
+    async def _circulation(self, func, params: Dict):
+        book_id = _book_id(params)
+        if book_id is None:
+            return 400, {'success': False, 'message': 'Invalid book ID.'}
+        success, message = await self.run_db(func, params.get('patron_id', '').strip(), book_id)
+        return (200 if success else 400), {'success': success, 'message': message}
+
+
+def _parse_body(body: bytes, content_type: bytes) -> Dict:
+    """Accept JSON or form-encoded POST bodies."""
+    if not body:
+        return {}
+    if content_type.startswith(b'application/json'):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return {}
+        return {k: str(v) for k, v in data.items()} if isinstance(data, dict) else {}
+    return {k: v[0] for k, v in parse_qs(_decode(body)).items()}
+
+
+def _decode(raw: bytes) -> str:
+    try:
+        return raw.decode()
+    except UnicodeDecodeError:
+        raise BadRequest('Request is not valid UTF-8')
+
+
+def _book_id(params: Dict) -> Optional[int]:
+    try:
+        return int(params.get('book_id', ''))
+    except (ValueError, TypeError):
+        return None
+
+
+app = AsyncLibraryAPI()
@@ -0,0 +1,4 @@
+"""
+Benchmarks Package - Standalone performance scripts
+Run a benchmark with: python -m benchmarks.<module>
+"""
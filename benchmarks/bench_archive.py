@@ -0,0 +1,79 @@
+"""
+Benchmark - Active-loan query latency as returned history grows
+
+For each history size, fills borrow_records with old returned loans plus a
+fixed set of active loans, times the hot-path queries, archives the old
+history and times them again.
+
+Usage: python -m benchmarks.bench_archive [history sizes...]
+       e.g. python -m benchmarks.bench_archive 100000 1000000 10000000
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+from services.archive_service import archive_returned_loans
+
+ACTIVE_LOANS = 5000
+PATRONS = 20000
+
+
+def _fill(history: int):
+    now = datetime.now()
+    old = database.to_epoch(now - timedelta(days=900))
+    conn = database.get_db_connection()
+    conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                 "VALUES ('Book', 'Author', '0000000000001', 1000000, 1000000)")
+    chunk = 100_000
+    for start in range(0, history, chunk):
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+            VALUES (?, 1, ?, ?, ?)
+        ''', [(f'{100000 + i % PATRONS}', old + i, old + i + 14 * 86400, old + i + 10 * 86400)
+              for i in range(start, min(history, start + chunk))])
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+        VALUES (?, 1, ?, ?)
+    ''', [(f'{100000 + i % PATRONS}', database.to_epoch(now - timedelta(days=i % 20)),
+           database.to_epoch(now + timedelta(days=14 - i % 20))) for i in range(ACTIVE_LOANS)])
+    conn.commit()
+    conn.close()
+
+
+def _time_hot_path(rng: random.Random, runs: int = 2000) -> str:
+    started = time.perf_counter()
+    for _ in range(runs):
+        patron = f'{100000 + rng.randrange(PATRONS)}'
+        database.get_patron_borrow_count(patron)
+        database.get_patron_borrowed_books(patron)
+    per_patron = (time.perf_counter() - started) / runs
+
+    started = time.perf_counter()
+    overdue = database.get_overdue_borrow_records()
+    sweep = time.perf_counter() - started
+    return f'patron active loans {per_patron * 1e6:7.0f} us   overdue sweep {sweep * 1000:7.1f} ms ({len(overdue)} rows)'
+
+
+def main(sizes):
+    rng = random.Random(32)
+    for history in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DATABASE = os.path.join(tmp, 'library.db')
+            database.ARCHIVE_DATABASE = os.path.join(tmp, 'library_archive.db')
+            database.init_database()
+            _fill(history)
+            print(f'history={history:>10}  live:     {_time_hot_path(rng)}')
+            started = time.perf_counter()
+            moved = archive_returned_loans(older_than_days=365, batch_size=50_000)
+            elapsed = time.perf_counter() - started
+            print(f'history={history:>10}  archived: {_time_hot_path(rng)}   '
+                  f'(moved {moved} in {elapsed:.1f} s)')
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,107 @@
+"""
+Benchmark - Sync Flask API vs asyncio ASGI API under concurrent load
+
+Runs both apps in-process against a temporary database:
+  * /api/search through the Flask test client on a fixed thread pool
+    vs. the ASGI app with every request in flight at once
+  * late fee payments: pay_late_fees + PaymentGateway on threads,
+    the payments outbox drained by PaymentSettlementWorker threads, and
+    the ASGI /api/pay_late_fee endpoint with AsyncPaymentSettlementWorker
+    awaiting AsyncPaymentGateway (same 100 ms latency) on the event loop
+
+Usage: python -m benchmarks.bench_async_api [requests] [threads]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import database
+from asgi import AsyncLibraryAPI
+from library_service import pay_late_fees, submit_late_fee_payment
+from services.payment_service import AsyncPaymentGateway, PaymentGateway
+from services.payment_worker import PaymentSettlementWorker
+
+
+def _seed(patrons: int):
+    database.init_database()
+    database.add_sample_data()
+    now = datetime.now()
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+        VALUES (?, 1, ?, ?, ?)
+    ''', [(f'{200000 + i}', database.to_epoch(now - timedelta(days=30)),
+           database.to_epoch(now - timedelta(days=16)), database.to_epoch(now)) for i in range(patrons)])
+    conn.commit()
+    conn.close()
+
+
+def _report(name: str, requests: int, elapsed: float):
+    print(f'{name:42s} {elapsed:7.2f} s  {requests / elapsed:9.0f} req/s')
+
+
+async def _asgi_get(app, path: str, query: bytes):
+    return await app.dispatch('GET', path, query, b'')
+
+
+def main(requests: int = 2000, threads: int = 32):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        _seed(requests)
+
+        from app import create_app
+        client = create_app({'RATE_LIMIT_ENABLED': False}).test_client()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(lambda _: client.get('/api/search?q=the&type=title'), range(requests)))
+        _report(f'flask /api/search ({threads} threads)', requests, time.perf_counter() - started)
+
+        api = AsyncLibraryAPI(db_workers=threads)
+        started = time.perf_counter()
+
+        async def searches():
+            await asyncio.gather(*(_asgi_get(api, '/api/search', b'q=the&type=title') for _ in range(requests)))
+        asyncio.run(searches())
+        _report(f'asgi /api/search ({threads} db threads)', requests, time.perf_counter() - started)
+
+        payments = min(requests, 500)
+        gateway = PaymentGateway()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(lambda i: pay_late_fees(f'{200000 + i}', 1, gateway), range(payments)))
+        _report(f'sync pay_late_fees ({threads} threads)', payments, time.perf_counter() - started)
+
+        _seed(payments)
+        worker = PaymentSettlementWorker(PaymentGateway(), workers=threads)
+        started = time.perf_counter()
+        for i in range(payments):
+            submit_late_fee_payment(f'{200000 + i}', 1)
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(lambda _: worker.drain(), range(threads)))
+        _report(f'outbox, worker threads ({threads})', payments, time.perf_counter() - started)
+
+        # Tasks hold no thread while a charge is in flight, so they can outnumber the db threads
+        for tasks in (threads, 4 * threads):
+            _seed(payments)
+            api = AsyncLibraryAPI(AsyncPaymentGateway(), db_workers=threads, payment_workers=tasks)
+
+            async def queue_and_settle():
+                api.payment_worker.start()
+                await asyncio.gather(*(api.dispatch('POST', '/api/pay_late_fee', b'',
+                                                    f'patron_id={200000 + i}&book_id=1'.encode())
+                                       for i in range(payments)))
+                # Drain alongside the worker tasks, then let in-flight charges finish
+                await asyncio.gather(*(api.payment_worker.drain() for _ in range(tasks)))
+                await api.payment_worker.stop()
+            started = time.perf_counter()
+            asyncio.run(queue_and_settle())
+            _report(f'asgi outbox, event loop ({tasks} tasks)', payments, time.perf_counter() - started)
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,89 @@
+"""
+Benchmark - Borrow/return latency while an online backup runs
+
+Grows a database to the requested size with returned-loan history, measures
+borrow+return latency on its own, then again while backup_database copies
+the file step by step, and reports the backup's duration.
+
+Usage: python -m benchmarks.bench_backup [--size-mb MB] [--pages N] [--pause S] [--dir PATH]
+       e.g. python -m benchmarks.bench_backup --size-mb 4096
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import database
+from library_service import borrow_book_by_patron, return_book_by_patron
+from services.backup_service import backup_database
+
+CHUNK = 200_000
+
+
+def _grow(size_mb: int):
+    database.insert_book('Book', 'Author', '0000000000001', 1000000, 1000000)
+    conn = database.get_db_connection()
+    # Backups switch the primary to WAL; use it for the baseline too
+    conn.execute('PRAGMA journal_mode=WAL')
+    start = 0
+    while os.path.getsize(database.DATABASE) < size_mb * 1e6:
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+            VALUES (?, 1, ?, ?, ?)
+        ''', [(f'{100000 + i % 50000}', i, i + 1209600, i + 864000) for i in range(start, start + CHUNK)])
+        conn.commit()
+        start += CHUNK
+    conn.close()
+
+
+def _circulate(stop: threading.Event, latencies: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        borrow_book_by_patron('654321', 1)
+        return_book_by_patron('654321', 1)
+        latencies.append(time.perf_counter() - started)
+
+
+def _summary(latencies: list) -> str:
+    latencies = sorted(latencies)
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+    return f'n={len(latencies):6d}  p50 {pick(0.5):6.2f} ms  p99 {pick(0.99):7.2f} ms  max {latencies[-1] * 1000:7.2f} ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size-mb', type=int, default=200)
+    parser.add_argument('--pages', type=int, default=256)
+    parser.add_argument('--pause', type=float, default=0.005)
+    parser.add_argument('--baseline-seconds', type=float, default=3.0)
+    parser.add_argument('--dir', help='where to create the database (default: system temp dir)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        database.init_database()
+        started = time.perf_counter()
+        _grow(args.size_mb)
+        print(f'database {os.path.getsize(database.DATABASE) / 1e6:.0f} MB '
+              f'(filled in {time.perf_counter() - started:.1f}s)')
+
+        for label in ('no backup', 'during backup'):
+            stop = threading.Event()
+            latencies = []
+            worker = threading.Thread(target=_circulate, args=(stop, latencies))
+            worker.start()
+            if label == 'no backup':
+                time.sleep(args.baseline_seconds)
+            else:
+                result = backup_database(os.path.join(tmp, 'snapshot.db'), args.pages, args.pause)
+            stop.set()
+            worker.join()
+            print(f'{label:14s} {_summary(latencies)}')
+
+        print(f'backup: {result["pages"]} pages in {result["steps"]} steps, {result["seconds"]:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
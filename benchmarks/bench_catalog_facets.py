@@ -0,0 +1,92 @@
+"""
+Benchmark - Faceted catalog pages and facet sidebars at scale
+
+Fills the catalog (facet counts maintained by triggers while inserting),
+then times the precomputed facet sidebar against GROUP BY over the whole
+books table, and first/deep filtered pages for each facet.
+
+Usage: python -m benchmarks.bench_catalog_facets [titles]
+       e.g. python -m benchmarks.bench_catalog_facets 1000000
+"""
+
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+import database
+from library_service import browse_catalog
+
+RUNS = 50
+
+
+def _fill(titles: int, rng: random.Random):
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))).capitalize()
+             for _ in range(5000)]
+    authors = [f'{rng.choice(words)} {rng.choice(words)}' for _ in range(titles // 20 + 1)]
+    conn = database.get_db_connection()
+    chunk = 50_000
+    for start in range(0, titles, chunk):
+        rows = []
+        for i in range(start, min(titles, start + chunk)):
+            total = rng.choice((1, 1, 2, 3, 5, 8, 12))
+            rows.append((' '.join(rng.choices(words, k=rng.randint(1, 4))), rng.choice(authors),
+                         f'{i:013d}', total, rng.randint(0, total)))
+        conn.executemany('INSERT INTO books (title, author, isbn, total_copies, available_copies) '
+                         'VALUES (?, ?, ?, ?, ?)', rows)
+        conn.commit()
+    conn.close()
+    return authors
+
+
+def _time(label: str, func, runs: int = RUNS):
+    started = time.perf_counter()
+    for _ in range(runs):
+        result = func()
+    print(f'{label:40s} {(time.perf_counter() - started) / runs * 1000:8.2f} ms')
+    return result
+
+
+def _group_by_sidebar():
+    conn = database.get_db_connection()
+    for facet in database.FACET_SQL:
+        conn.execute(f'SELECT {database._facet_sql(facet)}, COUNT(*) FROM books GROUP BY 1').fetchall()
+    conn.close()
+
+
+def main():
+    titles = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        database.init_database()
+        started = time.perf_counter()
+        authors = _fill(titles, rng)
+        print(f'{titles} titles inserted in {time.perf_counter() - started:.1f}s (facet triggers on)')
+
+        _time('facet sidebar (book_facets)', database.get_book_facets)
+        _time('facet sidebar (GROUP BY books)', _group_by_sidebar, runs=3)
+
+        _time('page: unfiltered', lambda: browse_catalog({}))
+        _time('page: author', lambda: browse_catalog({'author': authors[7]}))
+        _time('page: available, letter M', lambda: browse_catalog({'availability': 'available', 'letter': 'M'}))
+        _time('page: copies 10+', lambda: browse_catalog({'copies': '10+'}))
+        page = browse_catalog({'letter': 'Q'})
+        for _ in range(20):
+            page = browse_catalog({'letter': 'Q'}, page['next_after'])
+        _time('page 21: letter Q (cursor)', lambda: browse_catalog({'letter': 'Q'}, page['next_after']))
+
+        conn = database.get_db_connection()
+        book_ids = [row['id'] for row in conn.execute('SELECT id FROM books WHERE available_copies > 1 LIMIT 2000')]
+        conn.close()
+        started = time.perf_counter()
+        for book_id in book_ids:
+            database.update_book_availability(book_id, -1)
+        print(f'{"availability update (triggers on)":40s} '
+              f'{(time.perf_counter() - started) / len(book_ids) * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark - Per-worker memory and catalog read latency: SQLite vs mmap snapshot
+
+Spawns worker processes that each hold the catalog the way a worker would
+(a materialized get_all_books() list vs a mapped snapshot) and report their
+peak RSS, plus read latency for a full catalog and single-book lookups.
+
+Usage: python -m benchmarks.bench_catalog_snapshot [books] [workers]
+"""
+
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import database
+from services.catalog_snapshot import CatalogSnapshot, CatalogSnapshotWriter
+
+
+def _private_mb() -> float:
+    """Anonymous (unshared) resident memory of this process in MB."""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('RssAnon:'):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _worker(mode: str, db_path: str, snapshot_path: str, results):
+    database.DATABASE = db_path
+    rng = random.Random(os.getpid())
+    baseline = _private_mb()
+
+    if mode == 'sqlite':
+        # A worker caching the catalog holds its own materialized copy
+        started = time.perf_counter()
+        cached = database.get_all_books()
+        full = time.perf_counter() - started
+        count = len(cached)
+        read = lambda book_id: database.get_book_by_id(book_id)
+    else:
+        snapshot = CatalogSnapshot(snapshot_path)
+        started = time.perf_counter()
+        count = len(snapshot.all_books())
+        full = time.perf_counter() - started
+        read = snapshot.get_book
+
+    private = _private_mb() - baseline
+    started = time.perf_counter()
+    for _ in range(1000):
+        read(rng.randrange(1, count + 1))
+    lookup = (time.perf_counter() - started) / 1000
+    results.put((mode, private, full, lookup))
+
+
+def main(books: int = 200_000, workers: int = 4):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        database.init_database()
+        conn = database.get_db_connection()
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)
+        ''', ((f'Title number {i} of the catalog', f'Author {i % 5000}', f'{i:013d}', 3, 2)
+              for i in range(1, books + 1)))
+        conn.commit()
+        conn.close()
+
+        snapshot_path = os.path.join(tmp, 'catalog.snapshot')
+        started = time.perf_counter()
+        CatalogSnapshotWriter(snapshot_path).rebuild()
+        print(f'snapshot build: {time.perf_counter() - started:.2f} s, '
+              f'{os.path.getsize(snapshot_path) / 1e6:.1f} MB on disk (shared page cache)')
+
+        ctx = multiprocessing.get_context('spawn')
+        for mode in ('sqlite', 'snapshot'):
+            results = ctx.Queue()
+            procs = [ctx.Process(target=_worker, args=(mode, database.DATABASE, snapshot_path, results))
+                     for _ in range(workers)]
+            for p in procs:
+                p.start()
+            rows = [results.get() for _ in procs]
+            for p in procs:
+                p.join()
+            rss = sum(r[1] for r in rows) / len(rows)
+            lookup = sum(r[3] for r in rows) / len(rows)
+            full = sum(r[2] for r in rows) / len(rows)
+            print(f'{mode:8s} x{workers}: private memory held {rss:7.1f} MB/worker  '
+                  f'full read {full * 1000:7.1f} ms  lookup {lookup * 1e6:6.1f} us')
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,54 @@
+"""
+Benchmark - Fan-out latency of the availability change bus
+
+Starts N subscriber threads blocked on the bus (as SSE clients would be),
+publishes events from one producer and reports how long until every
+subscriber has seen each event.
+
+Usage: python -m benchmarks.bench_change_feed [subscribers] [events]
+"""
+
+import sys
+import threading
+import time
+
+from services.change_feed import ChangeBus
+
+
+def main(subscribers: int = 2000, events: int = 20):
+    bus = ChangeBus()
+    received = [0] * events
+    lock = threading.Lock()
+    all_seen = [threading.Event() for _ in range(events)]
+
+    def subscriber():
+        last_id = 0
+        while last_id < events:
+            batch, _ = bus.wait(last_id, timeout=5)
+            for event_id, _, _ in batch:
+                with lock:
+                    received[event_id - 1] += 1
+                    if received[event_id - 1] == subscribers:
+                        all_seen[event_id - 1].set()
+                last_id = event_id
+
+    threads = [threading.Thread(target=subscriber, daemon=True) for _ in range(subscribers)]
+    for t in threads:
+        t.start()
+    time.sleep(0.5)
+
+    latencies = []
+    for i in range(events):
+        started = time.perf_counter()
+        bus.publish('availability', {'book_id': i, 'available_copies': 1, 'total_copies': 2})
+        all_seen[i].wait(10)
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+    print(f'{subscribers} subscribers: fan-out p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+          f'max {latencies[-1] * 1000:.1f} ms, no database queries')
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,73 @@
+"""
+Benchmark - ISO text dates parsed in Python vs integer dates computed in SQL
+
+Measures the per-row cost removed from get_patron_borrowed_books and
+calculate_late_fee_for_book by the schema v1 date storage.
+
+Usage: python -m benchmarks.bench_date_storage [rows]
+"""
+
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+from database import to_epoch, SECONDS_PER_DAY
+
+
+def _build(rows: int):
+    """Create in-memory tables holding the same loans in both encodings."""
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute('CREATE TABLE text_loans (borrow_date TEXT, due_date TEXT, return_date TEXT)')
+    conn.execute('CREATE TABLE int_loans (borrow_date INTEGER, due_date INTEGER, return_date INTEGER)')
+    start = datetime(2024, 1, 1)
+    text_rows, int_rows = [], []
+    for i in range(rows):
+        borrowed = start + timedelta(minutes=i)
+        due = borrowed + timedelta(days=14)
+        returned = due + timedelta(days=i % 30 - 10) if i % 3 else None
+        text_rows.append((borrowed.isoformat(), due.isoformat(), returned.isoformat() if returned else None))
+        int_rows.append((to_epoch(borrowed), to_epoch(due), to_epoch(returned) if returned else None))
+    conn.executemany('INSERT INTO text_loans VALUES (?, ?, ?)', text_rows)
+    conn.executemany('INSERT INTO int_loans VALUES (?, ?, ?)', int_rows)
+    conn.commit()
+    return conn
+
+
+def _python_parse(conn, now: datetime) -> int:
+    """Old path: fetch ISO strings and parse every row with fromisoformat."""
+    overdue = 0
+    for r in conn.execute('SELECT borrow_date, due_date, return_date FROM text_loans'):
+        due = datetime.fromisoformat(r['due_date'])
+        end = datetime.fromisoformat(r['return_date']) if r['return_date'] else now
+        datetime.fromisoformat(r['borrow_date'])
+        if (end - due).days > 0:
+            overdue += 1
+    return overdue
+
+
+def _sql_compute(conn, now: datetime) -> int:
+    """New path: SQLite returns the days overdue directly."""
+    overdue = 0
+    for r in conn.execute('''
+        SELECT (COALESCE(return_date, ?) - due_date) / ? AS days_overdue FROM int_loans
+    ''', (to_epoch(now), SECONDS_PER_DAY)):
+        if r['days_overdue'] > 0:
+            overdue += 1
+    return overdue
+
+
+def main(rows: int = 200_000):
+    conn = _build(rows)
+    now = datetime(2024, 6, 1)
+    for name, fn in (('python fromisoformat', _python_parse), ('sql integer math', _sql_compute)):
+        started = time.perf_counter()
+        overdue = fn(conn, now)
+        elapsed = time.perf_counter() - started
+        print(f'{name:22s} {elapsed * 1000:9.1f} ms  {elapsed / rows * 1e9:8.0f} ns/row  overdue={overdue}')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
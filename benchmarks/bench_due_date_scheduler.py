@@ -0,0 +1,70 @@
+"""
+Benchmark - Due date scheduler load and tick cost with many active loans
+
+Fills borrow_records with active loans spread over 60 days, then times the
+windowed load from the active-loan index, event-driven inserts and ticks.
+
+Usage: python -m benchmarks.bench_due_date_scheduler [active_loans]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+from services.due_date_scheduler import DueDateScheduler
+
+
+class CountingNotifier:
+    def __init__(self):
+        self.count = 0
+
+    def notify(self, kind, loan):
+        self.count += 1
+
+
+def main(loans: int = 1_000_000):
+    start = datetime(2025, 1, 1)
+    span = 60 * 86400
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        database.init_database()
+        base = database.to_epoch(start)
+        conn = database.get_db_connection()
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)
+        ''', ((f'{100000 + i % 900000}', i % 50000 + 1, base, base + (i * 7919) % span) for i in range(loans)))
+        conn.commit()
+        conn.close()
+
+        notifier = CountingNotifier()
+        clock = [start]
+        scheduler = DueDateScheduler(notifier, clock=lambda: clock[0])
+        started = time.perf_counter()
+        scheduler.load(start)
+        print(f'{loans} active loans: loaded {len(scheduler)} in window in '
+              f'{time.perf_counter() - started:.2f} s')
+
+        inserts = 100_000
+        started = time.perf_counter()
+        for i in range(inserts):
+            scheduler._on_change('loan_created', {'id': loans + i + 1, 'patron_id': '123456', 'book_id': 1,
+                                                 'due_date': base + 86400 + i})
+        elapsed = time.perf_counter() - started
+        print(f'event-driven insert: {elapsed / inserts * 1e6:.2f} us per loan')
+
+        started = time.perf_counter()
+        ticks = 0
+        for hour in range(1, 24 * 14):
+            clock[0] = start + timedelta(hours=hour)
+            scheduler.tick(clock[0])
+            ticks += 1
+        elapsed = time.perf_counter() - started
+        print(f'{ticks} hourly ticks over two weeks: {elapsed:.2f} s, {notifier.count} notifications')
+        scheduler.stop()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,50 @@
+"""
+Benchmark - Fuzzy search latency on a large synthetic catalog
+
+Builds the deletion index over generated titles/authors drawn from a large
+pseudo-word vocabulary, then times misspelled queries.
+
+Usage: python -m benchmarks.bench_fuzzy_search [titles] [vocabulary]
+"""
+
+import random
+import string
+import sys
+import time
+
+from services.fuzzy_search import FuzzyIndex
+
+
+def _vocabulary(size: int, rng: random.Random):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 11))))
+    return sorted(words)
+
+
+def _misspell(word: str, rng: random.Random) -> str:
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def main(titles: int = 1_000_000, vocabulary: int = 100_000):
+    rng = random.Random(36)
+    words = _vocabulary(vocabulary, rng)
+    books = [{'id': i, 'title': ' '.join(rng.choice(words) for _ in range(3)),
+              'author': f'{rng.choice(words)} {rng.choice(words)}'} for i in range(1, titles + 1)]
+
+    started = time.perf_counter()
+    index = FuzzyIndex.build(books)
+    print(f'build: {time.perf_counter() - started:.1f} s for {titles} titles, {vocabulary} words')
+
+    queries = [' '.join(_misspell(w, rng) for w in rng.choice(books)['title'].split()[:2]) for _ in range(200)]
+    queries += [_misspell(rng.choice(books)['author'].split()[1], rng) for _ in range(200)]
+    started = time.perf_counter()
+    hits = sum(1 for q in queries if index.search(q))
+    elapsed = (time.perf_counter() - started) / len(queries)
+    print(f'{len(queries)} misspelled queries: {elapsed * 1000:.2f} ms avg, {hits} with results')
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,98 @@
+"""
+Benchmark - ISBN filter false-positive rate and duplicate-check throughput
+
+Measures the Bloom filter's false-positive rate against its target as it
+fills, membership test throughput, and the duplicate-check cost of a vendor
+feed (mostly new ISBNs) against a large catalog: one get_book_by_isbn query
+per row versus the filter plus batched lookups of possible duplicates.
+
+Usage: python -m benchmarks.bench_isbn_filter [catalog size] [feed size]
+       e.g. python -m benchmarks.bench_isbn_filter 1000000 100000
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+import database
+from library_service import import_books
+from services.isbn_filter import BloomFilter, IsbnFilter, filter_path, isbn_forms
+
+
+def _isbn13(n: int) -> str:
+    first12 = f'979{n:09d}'
+    check = -sum((3 if i % 2 else 1) * int(c) for i, c in enumerate(first12)) % 10
+    return first12 + str(check)
+
+
+def _false_positive_rates():
+    capacity = 100_000
+    bloom = BloomFilter(capacity, 0.01)
+    added = 0
+    print(f'filter: {bloom.bits / 8 / 1024:.0f} KiB, {bloom.hashes} hashes, capacity {capacity}, target 1%')
+    for load in (0.25, 0.5, 1.0, 1.5):
+        while added < capacity * load:
+            bloom.add(_isbn13(added))
+            added += 1
+        probes = 50_000
+        hits = sum(_isbn13(10_000_000 + i) in bloom for i in range(probes))
+        print(f'  load {load:4.0%}: false positives {hits / probes:6.2%}')
+
+    started = time.perf_counter()
+    for i in range(probes):
+        _isbn13(20_000_000 + i) in bloom
+    print(f'  membership test {(time.perf_counter() - started) / probes * 1e6:.1f} us')
+
+
+def main():
+    catalog = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    feed_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    _false_positive_rates()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        database.init_database()
+        conn = database.get_db_connection()
+        conn.executemany('INSERT INTO books (title, author, isbn, total_copies, available_copies) '
+                         'VALUES (?, ?, ?, 1, 1)',
+                         [(f'Book {i}', 'Author', _isbn13(i)) for i in range(catalog)])
+        conn.commit()
+        conn.close()
+
+        started = time.perf_counter()
+        isbn_filter = IsbnFilter.load_or_build(filter_path(database.DATABASE))
+        print(f'\n{catalog} books: filter built in {time.perf_counter() - started:.2f}s')
+        started = time.perf_counter()
+        IsbnFilter.load_or_build(filter_path(database.DATABASE))
+        print(f'  reloaded from disk in {time.perf_counter() - started:.2f}s')
+
+        # 10% of the feed duplicates the catalog
+        rng = random.Random(5)
+        feed = [_isbn13(rng.randrange(catalog)) if i % 10 == 0 else _isbn13(catalog + i)
+                for i in range(feed_size)]
+
+        started = time.perf_counter()
+        duplicates = sum(database.get_book_by_isbn(isbn) is not None for isbn in feed)
+        per_row = time.perf_counter() - started
+
+        started = time.perf_counter()
+        maybe = [isbn for isbn in feed if isbn_filter.might_contain(isbn)]
+        found = database.get_books_by_isbns([form for isbn in maybe for form in isbn_forms(isbn)])
+        filtered = time.perf_counter() - started
+        print(f'feed of {feed_size} ({duplicates} duplicates):')
+        print(f'  query per row           {per_row:6.2f}s  ({feed_size / per_row:8.0f} rows/s)')
+        print(f'  filter + batch lookups  {filtered:6.2f}s  ({feed_size / filtered:8.0f} rows/s, '
+              f'{len(maybe)} looked up, {len(found)} found)')
+
+        started = time.perf_counter()
+        result = import_books([{'title': f'Feed {i}', 'author': 'Vendor', 'isbn': isbn, 'total_copies': 1}
+                               for i, isbn in enumerate(feed)])
+        elapsed = time.perf_counter() - started
+        print(f'  import_books            {elapsed:6.2f}s  ({feed_size / elapsed:8.0f} rows/s, '
+              f'{result["added"]} added, {result["duplicates"]} duplicates)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark - Loan policy fee evaluation, per call and in bulk
+
+Computes late fees for N loans (default 1,000,000) with the original
+hard-coded tier arithmetic, the compiled default policy one call at a
+time, and the compiled policy's bulk late_fees(). Both are also run with
+a policy that has patron classes and collections, where each loan first
+resolves its rule.
+
+Usage: python -m benchmarks.bench_loan_policy [loans]
+       e.g. python -m benchmarks.bench_loan_policy 1000000
+"""
+
+import random
+import sys
+import time
+
+from services.loan_policy import DEFAULT_POLICY, LoanPolicy
+
+MIXED_POLICY = {
+    'default': {},
+    'patron_classes': {'staff': {'patrons': [f'{200000 + i}' for i in range(500)], 'max_loans': 10,
+                                 'fee_tiers': [[None, 0.25]], 'fee_cap': 5.0}},
+    'collections': {'reserve': {'books': list(range(1, 1001)), 'loan_days': 3,
+                                'fee_tiers': [[1, 1.0], [None, 2.0]], 'fee_cap': 30.0}},
+}
+
+
+def _legacy_fee(overdue_days: int) -> float:
+    if overdue_days <= 0:
+        return 0.0
+    if overdue_days <= 7:
+        fee = 0.5 * overdue_days
+    else:
+        fee = (0.5 * 7) + (1.0 * (overdue_days - 7))
+    return round(min(fee, 15.0), 2)
+
+
+def _time(label: str, compute, n: int):
+    started = time.perf_counter()
+    result = compute()
+    elapsed = time.perf_counter() - started
+    print(f'{label:<40} {elapsed * 1000:9.1f} ms   {n / elapsed / 1e6:6.2f} M loans/s')
+    return result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(42)
+    loans = [(f'{rng.randrange(100000, 200500)}', rng.randrange(1, 20001), rng.randrange(-30, 60))
+             for _ in range(n)]
+    days = [d for _, _, d in loans]
+    default = LoanPolicy.compile(DEFAULT_POLICY)
+    mixed = LoanPolicy.compile(MIXED_POLICY)
+    print(f'{n} loans')
+
+    legacy = _time('original arithmetic, per call', lambda: [_legacy_fee(d) for d in days], n)
+    per_call = _time('default policy, per call',
+                     lambda: [default.late_fee(p, b, d) for p, b, d in loans], n)
+    bulk = _time('default policy, bulk', lambda: default.late_fees(loans), n)
+    assert legacy == per_call == bulk
+    _time('mixed policy, per call', lambda: [mixed.late_fee(p, b, d) for p, b, d in loans], n)
+    _time('mixed policy, bulk', lambda: mixed.late_fees(loans), n)
+
+
+if __name__ == '__main__':
+    main()
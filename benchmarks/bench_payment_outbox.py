@@ -0,0 +1,80 @@
+"""
+Benchmark - Queued late fee payments vs inline gateway calls
+
+Measures request-side latency of submit_late_fee_payment (outbox insert only)
+against pay_late_fees (inline 100 ms gateway call), then how long the
+settlement worker pool takes to drain the queue with the simulated gateway.
+
+Usage: python -m benchmarks.bench_payment_outbox [payments] [workers]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+from library_service import pay_late_fees, submit_late_fee_payment
+from services.payment_service import PaymentGateway
+from services.payment_worker import PaymentSettlementWorker
+
+
+def _seed(patrons: int):
+    database.init_database()
+    database.insert_book('Book', 'Author', '0000000000001', 1, 1)
+    now = datetime.now()
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+        VALUES (?, 1, ?, ?, ?)
+    ''', [(f'{300000 + i}', database.to_epoch(now - timedelta(days=30)),
+           database.to_epoch(now - timedelta(days=16)), database.to_epoch(now)) for i in range(patrons)])
+    conn.commit()
+    conn.close()
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main(payments: int = 2000, workers: int = 32):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        _seed(payments)
+
+        inline = []
+        gateway = PaymentGateway()
+        for i in range(min(payments, 20)):
+            started = time.perf_counter()
+            pay_late_fees(f'{300000 + i}', 1, gateway)
+            inline.append(time.perf_counter() - started)
+        print(f'inline pay_late_fees     p50 {_percentile(inline, 0.5) * 1000:7.2f} ms  '
+              f'p99 {_percentile(inline, 0.99) * 1000:7.2f} ms')
+
+        queued = []
+        for i in range(payments):
+            started = time.perf_counter()
+            submit_late_fee_payment(f'{300000 + i}', 1)
+            queued.append(time.perf_counter() - started)
+        print(f'submit_late_fee_payment  p50 {_percentile(queued, 0.5) * 1000:7.2f} ms  '
+              f'p99 {_percentile(queued, 0.99) * 1000:7.2f} ms')
+
+        worker = PaymentSettlementWorker(PaymentGateway(), workers=workers, base_delay=0.5, poll_interval=0.05)
+        started = time.perf_counter()
+        worker.start()
+        conn = database.get_db_connection()
+        while conn.execute("SELECT COUNT(*) FROM payments WHERE status IN ('pending', 'processing')").fetchone()[0]:
+            time.sleep(0.1)
+        elapsed = time.perf_counter() - started
+        worker.stop()
+        counts = dict(conn.execute('SELECT status, COUNT(*) FROM payments GROUP BY status').fetchall())
+        conn.close()
+        print(f'drained {payments} payments with {workers} workers in {elapsed:.1f} s '
+              f'({payments / elapsed:.0f}/s)  {counts}')
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,79 @@
+"""
+Benchmark - Co-borrow index rebuild, size and lookup latency
+
+Generates a borrow history with skewed book popularity, rebuilds the
+co-occurrence index from it in patron chunks, and times related-book
+lookups and incremental updates.
+
+Usage: python -m benchmarks.bench_recommendations [loans] [--books N] [--patrons N]
+       e.g. python -m benchmarks.bench_recommendations 1000000 --books 50000 --patrons 100000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+import database
+from services import recommendation_service
+
+
+def _fill(loans: int, books: int, patrons: int, rng: random.Random):
+    conn = database.get_db_connection()
+    conn.executemany('INSERT INTO books (title, author, isbn, total_copies, available_copies) '
+                     'VALUES (?, ?, ?, 5, 5)',
+                     [(f'Book {i}', f'Author {i % 500}', f'{i:013d}') for i in range(1, books + 1)])
+    weights = [1 / rank for rank in range(1, books + 1)]
+    chunk = 100_000
+    for start in range(0, loans, chunk):
+        size = min(chunk, loans - start)
+        book_ids = rng.choices(range(1, books + 1), weights, k=size)
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+            VALUES (?, ?, 0, 1209600, 864000)
+        ''', [(f'{100000 + rng.randrange(patrons)}', book_id) for book_id in book_ids])
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('loans', nargs='?', type=int, default=200_000)
+    parser.add_argument('--books', type=int, default=20_000)
+    parser.add_argument('--patrons', type=int, default=20_000)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'library.db')
+        database.ARCHIVE_DATABASE = os.path.join(tmp, 'library_archive.db')
+        database.init_database()
+        _fill(args.loans, args.books, args.patrons, rng)
+
+        started = time.perf_counter()
+        index = recommendation_service.rebuild_index()
+        rebuild = time.perf_counter() - started
+        print(f'{args.loans} loans, {args.books} books, {args.patrons} patrons')
+        print(f'rebuild {rebuild:6.2f}s   index entries {len(index)} '
+              f'(at most {2 * index.capacity} per book)')
+
+        probes = [rng.randrange(1, args.books + 1) for _ in range(20000)]
+        for label in ('cold', 'warm'):
+            started = time.perf_counter()
+            for book_id in probes:
+                index.related(book_id, 10)
+            print(f'{label} lookup {(time.perf_counter() - started) / len(probes) * 1e6:8.1f} us')
+
+        now = datetime.now()
+        started = time.perf_counter()
+        for _ in range(500):
+            database.insert_borrow_record(f'{100000 + rng.randrange(args.patrons)}',
+                                          rng.randrange(1, args.books + 1), now, now)
+        per_loan = (time.perf_counter() - started) / 500
+        print(f'insert_borrow_record incl. index update {per_loan * 1e6:8.0f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark - Catalog page rendering with cached row fragments
+
+Renders catalog.html with N books (default 10,000) per page: the
+per-row Jinja loop the template used before (baseline), book_rows() with a
+cold row cache, with a warm cache, and with a warm cache after 1% of the
+books changed availability. Also times loading (parsing and compiling)
+the templates in a fresh environment with and without the bytecode cache,
+which is what each new worker pays on its first request.
+
+Usage: python -m benchmarks.bench_rendering [rows] [repeats]
+       e.g. python -m benchmarks.bench_rendering 10000 10
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from flask import Flask, render_template, render_template_string
+from jinja2 import FileSystemBytecodeCache
+
+from routes import register_blueprints
+from services.rendering import init_rendering
+
+BASELINE_ROWS = '''
+{% for book in books %}
+<tr>
+    <td>{{ book.id }}</td>
+    <td>{{ book.title }}</td>
+    <td>{{ book.author }}</td>
+    <td>{{ book.isbn }}</td>
+    <td>
+        {% if book.available_copies > 0 %}
+            <span class="status-available">{{ book.available_copies }}/{{ book.total_copies }} Available</span>
+        {% else %}
+            <span class="status-unavailable">Not Available</span>
+        {% endif %}
+    </td>
+    <td>
+        {% if book.available_copies > 0 %}
+            <form method="POST" action="{{ url_for('borrowing.borrow_book') }}" style="display: inline;">
+                <input type="hidden" name="book_id" value="{{ book.id }}">
+                <input type="text" name="patron_id" placeholder="Patron ID (6 digits)"
+                       pattern="[0-9]{6}" maxlength="6" required style="width: 120px; margin-right: 5px;">
+                <button type="submit" class="btn btn-success">Borrow</button>
+            </form>
+        {% else %}
+            <span style="color: #666;">Unavailable</span>
+        {% endif %}
+    </td>
+</tr>
+{% endfor %}
+'''
+
+
+def _books(n: int):
+    return [{'id': i, 'title': f'The Collected Works, Volume {i}', 'author': f'Author {i % 997}',
+             'isbn': f'{9780000000000 + i}', 'total_copies': 3, 'available_copies': i % 4}
+            for i in range(1, n + 1)]
+
+
+def _app(config):
+    app = Flask('app', template_folder=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates'))
+    app.secret_key = 'bench'
+    app.config.update(config)
+    init_rendering(app)
+    register_blueprints(app)
+    return app
+
+
+def _time(label: str, render, repeats: int):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        render()
+    elapsed = (time.perf_counter() - started) / repeats
+    print(f'{label:<40} {elapsed * 1000:9.2f} ms')
+
+
+def _template_load_times(cache_dir: str, repeats: int):
+    names = ('catalog.html', 'search.html', 'base.html', '_book_row.html')
+    for label, bytecode_cache in (('load templates, no bytecode cache', None),
+                                  ('load templates, bytecode cache', FileSystemBytecodeCache(cache_dir))):
+        def load():
+            app = _app({'TEMPLATE_BYTECODE_CACHE': False, 'RATE_LIMIT_ENABLED': False})
+            app.jinja_env.bytecode_cache = bytecode_cache
+            for name in names:
+                app.jinja_env.get_template(name)
+        load()      # fill the bytecode cache
+        _time(label, load, repeats)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    books = _books(n)
+    page = {'books': books, 'filters': {}, 'facets': {f: [] for f in ('availability', 'letter', 'copies', 'author')},
+            'next_after': None, 'prev_before': None}
+    cache_dir = tempfile.mkdtemp(prefix='bench-jinja-')
+    print(f'{n} rows per page, {repeats} repeats')
+    try:
+        app = _app({'TEMPLATE_BYTECODE_CACHE': cache_dir, 'RATE_LIMIT_ENABLED': False})
+        row_cache = app.extensions['row_cache']
+        with app.test_request_context('/catalog'):
+            _time('baseline per-row loop', lambda: render_template_string(BASELINE_ROWS, books=books), repeats)
+
+            def cold():
+                row_cache.clear()
+                return render_template('catalog.html', **page)
+            _time('catalog.html, cold row cache', cold, repeats)
+            render_template('catalog.html', **page)
+            _time('catalog.html, warm row cache', lambda: render_template('catalog.html', **page), repeats)
+
+            def churn():
+                # 1% of books change availability between renders
+                for book in books[::100]:
+                    book['available_copies'] = (book['available_copies'] + 1) % 4
+                return render_template('catalog.html', **page)
+            _time('catalog.html, warm cache, 1% changed', churn, repeats)
+
+        _template_load_times(cache_dir, repeats)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
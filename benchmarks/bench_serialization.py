@@ -0,0 +1,68 @@
+"""
+Benchmark - API response serialization for large book lists
+
+Encodes a search response with N books (default 10,000) using Flask's
+jsonify, the fast JSON encoder, MessagePack, and book_list_response with
+a cold and a warm fragment cache, reporting time per response and body
+size. Run it with and without orjson installed: with orjson, JSON lists
+bypass the fragment cache.
+
+Usage: python -m benchmarks.bench_serialization [results] [repeats]
+       e.g. python -m benchmarks.bench_serialization 10000 20
+"""
+
+import sys
+import time
+
+from flask import Flask, jsonify
+
+from services import serialization
+from services.serialization import FragmentCache, book_list_response, dumps_json, dumps_msgpack
+
+
+def _books(n: int):
+    return [{'id': i, 'title': f'The Collected Works, Volume {i}', 'author': f'Author {i % 997}',
+             'isbn': f'{9780000000000 + i}', 'total_copies': 3, 'available_copies': i % 4}
+            for i in range(1, n + 1)]
+
+
+def _time(label: str, build, repeats: int):
+    body = build()
+    started = time.perf_counter()
+    for _ in range(repeats):
+        build()
+    elapsed = (time.perf_counter() - started) / repeats
+    print(f'{label:<34} {elapsed * 1000:8.2f} ms   {len(body) / 1024:8.0f} KiB')
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    books = _books(n)
+    envelope = {'search_term': 'the', 'search_type': 'title', 'count': n}
+    payload = dict(envelope, results=books)
+
+    app = Flask(__name__)
+    print(f'{n} results, {repeats} repeats, orjson={"yes" if serialization.orjson else "no"}, '
+          f'msgpack package={"yes" if serialization.msgpack else "no"}')
+
+    def respond(accept: str):
+        with app.test_request_context(headers={'Accept': accept}):
+            return book_list_response(envelope, 'results', books).get_data()
+
+    def cold(accept: str):
+        serialization.fragment_cache = FragmentCache()
+        return respond(accept)
+
+    with app.app_context():
+        _time('jsonify', lambda: jsonify(payload).get_data(), repeats)
+    _time('fast JSON (whole payload)', lambda: dumps_json(payload), repeats)
+    _time('msgpack (whole payload)', lambda: dumps_msgpack(payload), repeats)
+    _time('JSON response, cold cache', lambda: cold('application/json'), repeats)
+    _time('JSON response, warm cache', lambda: respond('application/json'), repeats)
+    _time('msgpack response, cold cache', lambda: cold('application/msgpack'), repeats)
+    _time('msgpack response, warm cache', lambda: respond('application/msgpack'), repeats)
+
+
+if __name__ == '__main__':
+    main()
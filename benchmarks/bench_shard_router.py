@@ -0,0 +1,86 @@
+"""
+Benchmark - Borrow/return write throughput against shard count
+
+Runs the same number of writer threads against 1, 2, 4 ... branch databases.
+Each thread borrows and returns books from every branch in turn through the
+ShardRouter, so with one shard all writes queue on a single SQLite writer
+lock and with more shards they spread across independent files.
+
+Usage: python -m benchmarks.bench_shard_router [shard counts...] [--threads N] [--seconds S] [--dir PATH]
+       e.g. python -m benchmarks.bench_shard_router 1 2 4 8 --threads 16 --seconds 5
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from services.isbn_filter import complete_isbn13
+from services.shard_router import ShardRouter
+
+BOOKS_PER_SHARD = 20
+
+
+def _run(shards: int, threads: int, seconds: float, directory=None) -> tuple:
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        router = ShardRouter({f'branch{n}': os.path.join(tmp, f'branch{n}.db') for n in range(shards)},
+                             max_workers=threads)
+        router.init_shards()
+        for n in range(shards):
+            for b in range(BOOKS_PER_SHARD):
+                router.add_book(f'branch{n}', f'Book {n}-{b}', 'Author', complete_isbn13(f'{n:06d}{b:06d}'), 10000)
+        book_ids = [book['id'] for book in router.search_books('book', 'title')]
+
+        stop = threading.Event()
+        counts = [0] * threads
+        errors = [0] * threads
+
+        def writer(slot: int):
+            patron = f'{500000 + slot:06d}'
+            i = slot
+            while not stop.is_set():
+                book_id = book_ids[i % len(book_ids)]
+                i += 1
+                try:
+                    if router.borrow_book(patron, book_id)[0] and router.return_book(patron, book_id)[0]:
+                        counts[slot] += 1
+                    else:
+                        errors[slot] += 1
+                except sqlite3.OperationalError:
+                    errors[slot] += 1
+
+        workers = [threading.Thread(target=writer, args=(slot,)) for slot in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        time.sleep(seconds)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        router.close()
+        return sum(counts) / elapsed, sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('shards', nargs='*', type=int, default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--dir', help='where to create the shard files (default: system temp dir)')
+    args = parser.parse_args()
+
+    print(f'{args.threads} writer threads on {os.cpu_count()} CPU(s), {args.seconds:.0f}s per run, '
+          'borrow+return per cycle')
+    baseline = None
+    for shards in args.shards:
+        rate, errors = _run(shards, args.threads, args.seconds, args.dir)
+        baseline = baseline or rate
+        print(f'{shards:3d} shard(s): {rate:8.0f} cycles/s   x{rate / baseline:4.2f}   '
+              f'(lock timeouts/failures: {errors})')
+
+
+if __name__ == '__main__':
+    main()
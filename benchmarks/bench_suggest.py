@@ -0,0 +1,48 @@
+"""
+Benchmark - Typeahead latency of the suggest index on a large synthetic catalog
+
+Usage: python -m benchmarks.bench_suggest [titles]
+"""
+
+import random
+import sys
+import time
+
+from services.suggest_service import SuggestIndex
+
+WORDS = ('river', 'shadow', 'garden', 'empire', 'winter', 'silent', 'golden', 'storm',
+         'letters', 'journey', 'island', 'machine', 'kingdom', 'harbor', 'memory', 'fire')
+NAMES = ('Ada', 'Ben', 'Clara', 'Dev', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonah')
+
+
+def _catalog(titles: int):
+    rng = random.Random(327)
+    for book_id in range(1, titles + 1):
+        title = ' '.join(rng.choice(WORDS) for _ in range(3)) + f' {book_id}'
+        author = f'{rng.choice(NAMES)} {rng.choice(WORDS).title()}{book_id % 5000}'
+        yield {'id': book_id, 'title': title, 'author': author}
+
+
+def main(titles: int = 1_000_000):
+    rng = random.Random(1)
+    popularity = {rng.randrange(1, titles + 1): rng.randrange(1, 50) for _ in range(titles // 10)}
+
+    started = time.perf_counter()
+    index = SuggestIndex.build(list(_catalog(titles)), popularity)
+    print(f'build: {time.perf_counter() - started:.1f} s for {titles} titles')
+
+    for prefix in ('s', 'si', 'sil', 'silent g', 'grace', 'memory fire 12'):
+        runs = 200
+        started = time.perf_counter()
+        for _ in range(runs):
+            index.suggest(prefix, 10)
+        elapsed = (time.perf_counter() - started) / runs
+        print(f'suggest({prefix!r:18}) {elapsed * 1000:7.3f} ms')
+
+    started = time.perf_counter()
+    index.add_book(titles + 1, 'Silent Harbor Letters', 'Grace Winter')
+    print(f'incremental add: {(time.perf_counter() - started) * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -3,23 +3,183 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import contextvars
+import os
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 # Database configuration
 DATABASE = 'library.db'
 
+# Returned loans moved out of the live table by services.archive_service
+ARCHIVE_DATABASE = 'library_archive.db'
+
+# Schema version stored in PRAGMA user_version
+# v1: borrow_records dates are INTEGER seconds since 1970-01-01 (naive local time)
+SCHEMA_VERSION = 1
+
+EPOCH = datetime(1970, 1, 1)
+SECONDS_PER_DAY = 86400
+
+BORROW_RECORDS_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS borrow_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date INTEGER NOT NULL,
+            due_date INTEGER NOT NULL,
+            return_date INTEGER,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+'''
+
+# Catalog facets: SQL for each facet's value, over a books row alias ("NEW", "OLD" or the
+# table itself). Filters, expression indexes and the book_facets triggers share these
+# exact expressions so SQLite can match them to the indexes.
+FACET_SQL = {
+    'author': '{row}author',
+    'availability': "CASE WHEN {row}available_copies > 0 THEN 'available' ELSE 'unavailable' END",
+    'letter': "CASE WHEN upper(substr({row}title, 1, 1)) BETWEEN 'A' AND 'Z' "
+              "THEN upper(substr({row}title, 1, 1)) ELSE '#' END",
+    'copies': "CASE WHEN {row}total_copies >= 10 THEN '10+' WHEN {row}total_copies >= 5 THEN '5-9' "
+              "WHEN {row}total_copies >= 2 THEN '2-4' ELSE '1' END",
+}
+
+def _facet_sql(facet: str, row: str = '') -> str:
+    return FACET_SQL[facet].format(row=f'{row}.' if row else '')
+
+# Callbacks notified after catalog and circulation writes: listener(event_type, data)
+_change_listeners = []
+
+def add_change_listener(listener) -> None:
+    """
+    Register a callback for write events: book_added, books_added (a bulk
+    insert, data {'books': [...]}), availability, loan_created, loan_returned.
+    """
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+def remove_change_listener(listener) -> None:
+    """Unregister a callback added with add_change_listener."""
+    if listener in _change_listeners:
+        _change_listeners.remove(listener)
+
+def _publish_change(event_type: str, data: Dict) -> None:
+    """Notify listeners of a committed write; a failing listener never fails the write."""
+    for listener in list(_change_listeners):
+        try:
+            listener(event_type, data)
+        except Exception:
+            pass
+
+# Per-context (database, archive database) paths used instead of the module defaults
+_database_override = contextvars.ContextVar('database_override', default=None)
+
+def current_database() -> str:
+    """Path of the database that get_db_connection() opens in this context."""
+    override = _database_override.get()
+    return override[0] if override else DATABASE
+
+def current_archive_database() -> str:
+    """Path of the archive database attached in this context."""
+    override = _database_override.get()
+    return override[1] if override else ARCHIVE_DATABASE
+
+@contextmanager
+def use_database(path: str, archive_path: Optional[str] = None):
+    """
+    Route every database call made in this context (thread or task) to `path`.
+    The archive defaults to a sibling file, e.g. branch.db -> branch_archive.db.
+    """
+    if archive_path is None:
+        archive_path = f'{os.path.splitext(path)[0]}_archive.db'
+    token = _database_override.set((path, archive_path))
+    try:
+        yield path
+    finally:
+        _database_override.reset(token)
+
+class QueryCounter:
+    """Counts SQL statements (not transaction control) run on connections it is attached to."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, statement: str):
+        if not statement.startswith(('BEGIN', 'COMMIT', 'ROLLBACK')):
+            self.count += 1
+
+_query_counter = contextvars.ContextVar('query_counter', default=None)
+
+@contextmanager
+def count_queries():
+    """Count the statements run on connections opened in this context."""
+    counter = QueryCounter()
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
 def get_db_connection():
     """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
+    conn = sqlite3.connect(current_database())
     conn.row_factory = sqlite3.Row  # This enables column access by name
+    counter = _query_counter.get()
+    if counter is not None:
+        conn.set_trace_callback(counter)
     return conn
 
+def get_archive_connection():
+    """Get a database connection with the archive database attached as `archive`."""
+    conn = get_db_connection()
+    conn.execute('ATTACH DATABASE ? AS archive', (current_archive_database(),))
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive.borrow_records (
+            id INTEGER PRIMARY KEY,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date INTEGER NOT NULL,
+            due_date INTEGER NOT NULL,
+            return_date INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS archive.idx_archived_patron
+        ON borrow_records (patron_id, borrow_date)
+    ''')
+    return conn
+
+def _history_source(include_archived: bool):
+    """Connection and borrow_records source for history queries, unioning the archive if asked."""
+    if include_archived and os.path.exists(current_archive_database()):
+        columns = 'id, patron_id, book_id, borrow_date, due_date, return_date'
+        source = (f'(SELECT {columns} FROM main.borrow_records '
+                  f'UNION ALL SELECT {columns} FROM archive.borrow_records)')
+        return get_archive_connection(), source
+    return get_db_connection(), 'borrow_records'
+
+def to_epoch(value: datetime) -> int:
+    """Encode a naive datetime as whole seconds since the epoch, as stored in borrow_records."""
+    return (value - EPOCH) // timedelta(seconds=1)
+
+def from_epoch(value: Optional[int]) -> Optional[datetime]:
+    """Decode a stored epoch-seconds value back into a naive datetime."""
+    if value is None:
+        return None
+    return EPOCH + timedelta(seconds=value)
+
 def init_database():
     """Initialize the database with required tables."""
     conn = get_db_connection()
     
+    # Upgrade databases created before dates were stored as integers
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version < 1 and _table_exists(conn, 'borrow_records'):
+        _migrate_borrow_dates_to_epoch(conn)
+    
     # Create books table
     conn.execute('''
         CREATE TABLE IF NOT EXISTS books (
@@ -33,21 +193,187 @@ def init_database():
     ''')
     
     # Create borrow_records table
+    conn.execute(BORROW_RECORDS_SCHEMA)
+    
+    # Indexes for circulation queries; the partial index keeps overdue
+    # sweeps (due_date < now AND return_date IS NULL) to a range scan
     conn.execute('''
-        CREATE TABLE IF NOT EXISTS borrow_records (
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_book
+        ON borrow_records (patron_id, book_id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_active_due
+        ON borrow_records (due_date) WHERE return_date IS NULL
+    ''')
+    
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_returned
+        ON borrow_records (return_date) WHERE return_date IS NOT NULL
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_history
+        ON borrow_records (patron_id, borrow_date)
+    ''')
+    
+    # Per-patron summary maintained incrementally by borrow/return/payment
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS patron_summary (
+            patron_id TEXT PRIMARY KEY,
+            active_loans INTEGER NOT NULL,
+            fees_incurred REAL NOT NULL,
+            fees_paid REAL NOT NULL,
+            last_activity INTEGER
+        )
+    ''')
+    
+    # Late fee payments; pending rows form an outbox drained by the settlement worker
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payments (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             patron_id TEXT NOT NULL,
             book_id INTEGER NOT NULL,
-            borrow_date TEXT NOT NULL,
-            due_date TEXT NOT NULL,
-            return_date TEXT,
-            FOREIGN KEY (book_id) REFERENCES books (id)
+            borrow_record_id INTEGER,
+            amount REAL NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at INTEGER NOT NULL,
+            claimed_at INTEGER,
+            claim_token TEXT,
+            transaction_id TEXT,
+            refund_id TEXT,
+            last_error TEXT,
+            created_at INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL,
+            FOREIGN KEY (borrow_record_id) REFERENCES borrow_records (id)
         )
     ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_payments_record
+        ON payments (borrow_record_id, status)
+    ''')
+    if 'claim_token' not in _column_names(conn, 'payments'):
+        conn.execute('ALTER TABLE payments ADD COLUMN claim_token TEXT')
+    # At most one open payment per loan, enforced by SQLite rather than a check-then-insert
+    conn.execute(f'''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_open
+        ON payments (borrow_record_id) WHERE status IN ('{PAYMENT_PENDING}', '{PAYMENT_PROCESSING}')
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_payments_queue
+        ON payments (status, next_attempt_at)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_payments_transaction
+        ON payments (transaction_id)
+    ''')
     
+    _create_book_facets(conn)
+    
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
     conn.commit()
     conn.close()
 
+def _create_book_facets(conn):
+    """
+    Create the catalog browse indexes and the book_facets count table.
+    
+    Triggers on books keep the counts current on every insert, delete and
+    availability change, so facet sidebars are a primary key range read.
+    """
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_books_title ON books (title)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_books_author_title ON books (author, title)')
+    for facet in ('availability', 'letter', 'copies'):
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_books_{facet}_title ON books ({_facet_sql(facet)}, title)
+        ''')
+    
+    backfill = not _table_exists(conn, 'book_facets')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS book_facets (
+            facet TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (facet, value)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_book_facets_count ON book_facets (facet, count)
+    ''')
+    
+    def facet_rows(row: str) -> str:
+        return ' UNION ALL '.join(f"SELECT '{facet}', {_facet_sql(facet, row)}" for facet in FACET_SQL)
+    
+    def changed(facet: str) -> str:
+        return f'{_facet_sql(facet, "OLD")} IS NOT {_facet_sql(facet, "NEW")}'
+    
+    add = '''
+            INSERT INTO book_facets (facet, value, count)
+            SELECT *, 1 FROM ({rows}) WHERE true
+            ON CONFLICT (facet, value) DO UPDATE SET count = count + 1;'''
+    remove = '''
+            UPDATE book_facets SET count = count - 1
+            WHERE (facet, value) IN ({rows});'''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_book_facets_insert AFTER INSERT ON books
+        BEGIN{add.format(rows=facet_rows('NEW'))}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_book_facets_delete AFTER DELETE ON books
+        BEGIN{remove.format(rows=facet_rows('OLD'))}
+        END
+    ''')
+    # Most availability updates do not cross zero and leave the facets untouched
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_book_facets_update AFTER UPDATE ON books
+        WHEN {' OR '.join(changed(facet) for facet in FACET_SQL)}
+        BEGIN{remove.format(rows=facet_rows('OLD'))}{add.format(rows=facet_rows('NEW'))}
+        END
+    ''')
+    
+    if backfill:
+        for facet in FACET_SQL:
+            conn.execute(f'''
+                INSERT INTO book_facets (facet, value, count)
+                SELECT '{facet}', {_facet_sql(facet)}, COUNT(*) FROM books GROUP BY 2
+            ''')
+
+def _table_exists(conn, name: str) -> bool:
+    """Check whether a table exists in the connected database."""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+def _column_names(conn, table: str) -> List[str]:
+    """Column names of a table in the connected database."""
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+def _migrate_borrow_dates_to_epoch(conn):
+    """
+    Rebuild borrow_records with INTEGER date columns (schema v0 -> v1).
+    
+    The table has to be copied because SQLite would coerce integers written
+    into the old TEXT columns back into strings.
+    """
+    conn.execute('BEGIN')
+    conn.execute('ALTER TABLE borrow_records RENAME TO borrow_records_v0')
+    conn.execute(BORROW_RECORDS_SCHEMA)
+    # strftime('%s') reads the ISO text as-is, matching to_epoch() on naive datetimes
+    conn.execute('''
+        INSERT INTO borrow_records (id, patron_id, book_id, borrow_date, due_date, return_date)
+        SELECT id, patron_id, book_id,
+               CASE WHEN typeof(borrow_date) = 'integer' THEN borrow_date
+                    ELSE CAST(strftime('%s', borrow_date) AS INTEGER) END,
+               CASE WHEN typeof(due_date) = 'integer' THEN due_date
+                    ELSE CAST(strftime('%s', due_date) AS INTEGER) END,
+               CASE WHEN return_date IS NULL OR typeof(return_date) = 'integer' THEN return_date
+                    ELSE CAST(strftime('%s', return_date) AS INTEGER) END
+        FROM borrow_records_v0
+    ''')
+    conn.execute('DROP TABLE borrow_records_v0')
+    conn.commit()
+
 def add_sample_data():
     """Add sample data to the database if it's empty."""
     conn = get_db_connection()
@@ -72,8 +398,8 @@ def add_sample_data():
             INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
             VALUES (?, ?, ?, ?)
         ''', ('123456', 3, 
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
+              to_epoch(datetime.now() - timedelta(days=5)),
+              to_epoch(datetime.now() + timedelta(days=9))))
         
         # Update available copies for 1984
         conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
@@ -87,10 +413,57 @@ def add_sample_data():
 def get_all_books() -> List[Dict]:
     """Get all books from the database."""
     conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+    books = conn.execute('SELECT * FROM books ORDER BY title, id').fetchall()
     conn.close()
     return [dict(book) for book in books]
 
+def get_books_page(filters: Dict[str, str], limit: int, after_id: Optional[int] = None,
+                   before_id: Optional[int] = None) -> List[Dict]:
+    """
+    Get one page of books in title order matching facet filters (facet -> value),
+    starting after the book with ID after_id, or ending before the book with ID before_id.
+    """
+    where, params = [], []
+    for facet, value in filters.items():
+        where.append(f'{_facet_sql(facet)} = ?')
+        params.append(value)
+    if after_id is not None:
+        where.append('(title, id) > (SELECT title, id FROM books WHERE id = ?)')
+        params.append(after_id)
+    if before_id is not None:
+        where.append('(title, id) < (SELECT title, id FROM books WHERE id = ?)')
+        params.append(before_id)
+    clause = f"WHERE {' AND '.join(where)}" if where else ''
+    # Paging backwards reads the nearest rows first and flips them into title order
+    order = 'title DESC, id DESC' if before_id is not None and after_id is None else 'title, id'
+    
+    conn = get_db_connection()
+    books = conn.execute(f'''
+        SELECT * FROM books {clause} ORDER BY {order} LIMIT ?
+    ''', params + [limit]).fetchall()
+    conn.close()
+    books = [dict(book) for book in books]
+    return books[::-1] if order != 'title, id' else books
+
+def get_book_facets(top_authors: int = 20) -> Dict[str, List[Dict]]:
+    """Get precomputed facet counts: every availability, letter and copies value, and the top authors."""
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT facet, value, count FROM book_facets
+        WHERE facet != 'author' AND count > 0 ORDER BY facet, value
+    ''').fetchall()
+    authors = conn.execute('''
+        SELECT value, count FROM book_facets
+        WHERE facet = 'author' AND count > 0 ORDER BY count DESC, value LIMIT ?
+    ''', (top_authors,)).fetchall()
+    conn.close()
+    
+    facets = {facet: [] for facet in FACET_SQL}
+    for row in rows:
+        facets[row['facet']].append({'value': row['value'], 'count': row['count']})
+    facets['author'] = [{'value': row['value'], 'count': row['count']} for row in authors]
+    return facets
+
 def get_book_by_id(book_id: int) -> Optional[Dict]:
     """Get a specific book by ID."""
     conn = get_db_connection()
@@ -98,6 +471,16 @@ def get_book_by_id(book_id: int) -> Optional[Dict]:
     conn.close()
     return dict(book) if book else None
 
+def get_books_by_ids(book_ids: List[int]) -> Dict[int, Dict]:
+    """Get several books by ID in one query, keyed by ID."""
+    if not book_ids:
+        return {}
+    conn = get_db_connection()
+    placeholders = ', '.join('?' * len(book_ids))
+    books = conn.execute(f'SELECT * FROM books WHERE id IN ({placeholders})', list(book_ids)).fetchall()
+    conn.close()
+    return {book['id']: dict(book) for book in books}
+
 def get_book_by_isbn(isbn: str) -> Optional[Dict]:
     """Get a specific book by ISBN."""
     conn = get_db_connection()
@@ -105,16 +488,88 @@ def get_book_by_isbn(isbn: str) -> Optional[Dict]:
     conn.close()
     return dict(book) if book else None
 
+def get_books_by_isbns(isbns: List[str]) -> Dict[str, Dict]:
+    """Get the books stored under any of the given ISBNs, keyed by ISBN."""
+    if not isbns:
+        return {}
+    conn = get_db_connection()
+    books = {}
+    # Stay well under SQLite's bound-parameter limit
+    for start in range(0, len(isbns), 500):
+        chunk = isbns[start:start + 500]
+        rows = conn.execute(f'''
+            SELECT * FROM books WHERE isbn IN ({', '.join('?' * len(chunk))})
+        ''', chunk).fetchall()
+        books.update((row['isbn'], dict(row)) for row in rows)
+    conn.close()
+    return books
+
+def get_book_borrow_counts() -> Dict[int, int]:
+    """Get the total number of times each book has been borrowed (archive included)."""
+    conn, source = _history_source(True)
+    rows = conn.execute(f'''
+        SELECT book_id, COUNT(*) as count FROM {source} br GROUP BY book_id
+    ''').fetchall()
+    conn.close()
+    return {row['book_id']: row['count'] for row in rows}
+
+def get_max_borrow_record_id() -> int:
+    """Highest borrow record id handed out so far (0 if none)."""
+    conn = get_db_connection()
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'borrow_records'").fetchone()
+    conn.close()
+    return row['seq'] if row else 0
+
+def get_patron_baskets(after_patron_id: str, patron_limit: int, max_record_id: int) -> List[Tuple[str, List[int]]]:
+    """
+    Distinct borrowed books per patron for the next patron_limit patrons after
+    after_patron_id (archive included), ordered by patron, for batch jobs.
+    """
+    conn, source = _history_source(True)
+    patrons = [row['patron_id'] for row in conn.execute(f'''
+        SELECT DISTINCT patron_id FROM {source} br WHERE patron_id > ?
+        ORDER BY patron_id LIMIT ?
+    ''', (after_patron_id, patron_limit))]
+    if not patrons:
+        conn.close()
+        return []
+    rows = conn.execute(f'''
+        SELECT DISTINCT patron_id, book_id FROM {source} br
+        WHERE patron_id BETWEEN ? AND ? AND id <= ?
+        ORDER BY patron_id, book_id
+    ''', (patrons[0], patrons[-1], max_record_id)).fetchall()
+    conn.close()
+
+    baskets: Dict[str, List[int]] = {patron: [] for patron in patrons}
+    for row in rows:
+        baskets[row['patron_id']].append(row['book_id'])
+    return list(baskets.items())
+
+def get_patron_recent_book_ids(patron_id: str, limit: int, max_record_id: int) -> List[int]:
+    """
+    The patron's last `limit` distinct books (live loans up to max_record_id),
+    least recently borrowed first.
+    """
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT book_id FROM borrow_records
+        WHERE patron_id = ? AND id <= ?
+        GROUP BY book_id ORDER BY MAX(id) DESC LIMIT ?
+    ''', (patron_id, max_record_id, limit)).fetchall()
+    conn.close()
+    return [row['book_id'] for row in reversed(rows)]
+
 def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     """Get currently borrowed books for a patron."""
     conn = get_db_connection()
     records = conn.execute('''
-        SELECT br.*, b.title, b.author 
+        SELECT br.book_id, br.borrow_date, br.due_date, b.title, b.author,
+               br.due_date < ? AS is_overdue
         FROM borrow_records br 
         JOIN books b ON br.book_id = b.id 
         WHERE br.patron_id = ? AND br.return_date IS NULL
         ORDER BY br.borrow_date
-    ''', (patron_id,)).fetchall()
+    ''', (to_epoch(datetime.now()), patron_id)).fetchall()
     conn.close()
     
     borrowed_books = []
@@ -123,13 +578,50 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
             'book_id': record['book_id'],
             'title': record['title'],
             'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']),
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
+            'borrow_date': from_epoch(record['borrow_date']),
+            'due_date': from_epoch(record['due_date']),
+            'is_overdue': bool(record['is_overdue'])
         })
     
     return borrowed_books
 
+def get_overdue_borrow_records(now: Optional[datetime] = None) -> List[Dict]:
+    """Get all active borrow records whose due date has passed, most overdue first."""
+    now_epoch = to_epoch(now or datetime.now())
+    conn = get_db_connection()
+    records = conn.execute('''
+        SELECT id, patron_id, book_id, borrow_date, due_date,
+               (? - due_date) / ? AS days_overdue
+        FROM borrow_records
+        WHERE due_date < ? AND return_date IS NULL
+        ORDER BY due_date
+    ''', (now_epoch, SECONDS_PER_DAY, now_epoch)).fetchall()
+    conn.close()
+    return [{
+        'id': r['id'],
+        'patron_id': r['patron_id'],
+        'book_id': r['book_id'],
+        'borrow_date': from_epoch(r['borrow_date']),
+        'due_date': from_epoch(r['due_date']),
+        'days_overdue': r['days_overdue']
+    } for r in records]
+
+def get_active_loans_by_due_date(due_after: int, after_id: int, due_until: int, limit: int) -> List[Dict]:
+    """
+    Page through active loans in (due_date, id) order using the active-loan index.
+    Returns loans after the (due_after, after_id) key with due_date <= due_until.
+    """
+    conn = get_db_connection()
+    records = conn.execute('''
+        SELECT id, patron_id, book_id, due_date
+        FROM borrow_records
+        WHERE return_date IS NULL AND due_date <= ? AND (due_date, id) > (?, ?)
+        ORDER BY due_date, id
+        LIMIT ?
+    ''', (due_until, due_after, after_id, limit)).fetchall()
+    conn.close()
+    return [dict(r) for r in records]
+
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
     conn = get_db_connection()
@@ -144,27 +636,63 @@ def insert_book(title: str, author: str, isbn: str, total_copies: int, available
     """Insert a new book into the database."""
     conn = get_db_connection()
     try:
-        conn.execute('''
+        cursor = conn.execute('''
             INSERT INTO books (title, author, isbn, total_copies, available_copies)
             VALUES (?, ?, ?, ?, ?)
         ''', (title, author, isbn, total_copies, available_copies))
         conn.commit()
         conn.close()
+        _publish_change('book_added', {
+            'id': cursor.lastrowid, 'title': title, 'author': author, 'isbn': isbn,
+            'total_copies': total_copies, 'available_copies': available_copies
+        })
         return True
     except Exception as e:
         conn.close()
         return False
 
+def insert_books(books: List[Tuple[str, str, str, int, int]]) -> List[Dict]:
+    """
+    Insert (title, author, isbn, total_copies, available_copies) rows in one
+    transaction, skipping ISBNs that already exist. Returns the inserted books.
+    """
+    conn = get_db_connection()
+    inserted = []
+    try:
+        for title, author, isbn, total_copies, available_copies in books:
+            row = conn.execute('''
+                INSERT OR IGNORE INTO books (title, author, isbn, total_copies, available_copies)
+                VALUES (?, ?, ?, ?, ?)
+                RETURNING id
+            ''', (title, author, isbn, total_copies, available_copies)).fetchone()
+            if row is not None:
+                inserted.append({
+                    'id': row['id'], 'title': title, 'author': author, 'isbn': isbn,
+                    'total_copies': total_copies, 'available_copies': available_copies
+                })
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        conn.close()
+        return []
+    if inserted:
+        _publish_change('books_added', {'books': [dict(book) for book in inserted]})
+    return inserted
+
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
     conn = get_db_connection()
     try:
-        conn.execute('''
+        cursor = conn.execute('''
             INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
             VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+        ''', (patron_id, book_id, to_epoch(borrow_date), to_epoch(due_date)))
         conn.commit()
         conn.close()
+        _publish_change('loan_created', {
+            'id': cursor.lastrowid, 'patron_id': patron_id, 'book_id': book_id,
+            'due_date': to_epoch(due_date)
+        })
         return True
     except Exception as e:
         conn.close()
@@ -174,11 +702,17 @@ def update_book_availability(book_id: int, change: int) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
     conn = get_db_connection()
     try:
-        conn.execute('''
+        row = conn.execute('''
             UPDATE books SET available_copies = available_copies + ? WHERE id = ?
-        ''', (change, book_id))
+            RETURNING available_copies, total_copies
+        ''', (change, book_id)).fetchone()
         conn.commit()
         conn.close()
+        if row:
+            _publish_change('availability', {
+                'book_id': book_id, 'available_copies': row['available_copies'],
+                'total_copies': row['total_copies']
+            })
         return True
     except Exception as e:
         conn.close()
@@ -188,14 +722,273 @@ def update_borrow_record_return_date(patron_id: str, book_id: int, return_date:
     """Update the return date for a borrow record."""
     conn = get_db_connection()
     try:
-        conn.execute('''
+        rows = conn.execute('''
             UPDATE borrow_records 
             SET return_date = ? 
             WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-        ''', (return_date.isoformat(), patron_id, book_id))
+            RETURNING id
+        ''', (to_epoch(return_date), patron_id, book_id)).fetchall()
         conn.commit()
         conn.close()
+        for row in rows:
+            _publish_change('loan_returned', {
+                'id': row['id'], 'patron_id': patron_id, 'book_id': book_id,
+                'return_date': to_epoch(return_date)
+            })
         return True
     except Exception as e:
         conn.close()
         return False
+
+def get_patron_borrow_history(patron_id: str, limit: int, offset: int = 0,
+                              include_archived: bool = False) -> List[Dict]:
+    """Get one page of a patron's borrow history, oldest first, optionally including archived loans."""
+    conn, source = _history_source(include_archived)
+    records = conn.execute(f'''
+        SELECT br.*, b.title, b.author
+        FROM {source} br
+        JOIN books b ON br.book_id = b.id
+        WHERE br.patron_id = ?
+        ORDER BY br.borrow_date, br.id
+        LIMIT ? OFFSET ?
+    ''', (patron_id, limit, offset)).fetchall()
+    conn.close()
+    
+    history = [dict(r) for r in records]
+    for r in history:
+        for key in ('borrow_date', 'due_date', 'return_date'):
+            r[key] = from_epoch(r[key])
+    return history
+
+def get_patron_loans(patron_id: str, include_archived: bool = False) -> List[Dict]:
+    """Get every borrow record for a patron (dates left as epoch seconds)."""
+    conn, source = _history_source(include_archived)
+    records = conn.execute(f'''
+        SELECT id, book_id, borrow_date, due_date, return_date
+        FROM {source} br WHERE patron_id = ?
+    ''', (patron_id,)).fetchall()
+    conn.close()
+    return [dict(r) for r in records]
+
+def get_patron_summary(patron_id: str) -> Optional[Dict]:
+    """Get the materialized summary row for a patron, if one has been built."""
+    conn = get_db_connection()
+    row = conn.execute('SELECT * FROM patron_summary WHERE patron_id = ?', (patron_id,)).fetchone()
+    conn.close()
+    if not row:
+        return None
+    summary = dict(row)
+    summary['last_activity'] = from_epoch(summary['last_activity'])
+    return summary
+
+def materialize_patron_summary(patron_id: str, compute: Callable[[], Dict]) -> Dict:
+    """
+    Store the summary compute() derives for a patron, unless one already exists.
+
+    compute() runs while this connection holds the write lock, so no borrow,
+    return or payment can commit between reading the patron's records and
+    storing the row: each one either is in what compute() read, or finds
+    the row and applies its incremental update to it.
+    Returns the stored row, or compute()'s result if nothing was stored.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        if conn.execute('SELECT 1 FROM patron_summary WHERE patron_id = ?', (patron_id,)).fetchone():
+            conn.rollback()
+            conn.close()
+            return get_patron_summary(patron_id)
+        summary = compute()
+        if summary['last_activity'] is not None:
+            conn.execute('''
+                INSERT INTO patron_summary
+                    (patron_id, active_loans, fees_incurred, fees_paid, last_activity)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (patron_id, summary['active_loans'], summary['fees_incurred'], summary['fees_paid'],
+                  to_epoch(summary['last_activity'])))
+        conn.commit()
+        conn.close()
+        return summary
+    except Exception as e:
+        conn.close()
+        return compute()
+
+def update_patron_summary(patron_id: str, active_delta: int = 0, fees_incurred: float = 0.0,
+                          fees_paid: float = 0.0, activity_at: Optional[datetime] = None) -> bool:
+    """
+    Apply an incremental change to a patron's summary row.
+    Returns False when the patron has no summary yet (it is built on first read).
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            UPDATE patron_summary
+            SET active_loans = active_loans + ?,
+                fees_incurred = fees_incurred + ?,
+                fees_paid = fees_paid + ?,
+                last_activity = MAX(COALESCE(last_activity, 0), COALESCE(?, 0))
+            WHERE patron_id = ?
+        ''', (active_delta, fees_incurred, fees_paid,
+              to_epoch(activity_at) if activity_at else None, patron_id))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount > 0
+    except Exception as e:
+        conn.close()
+        return False
+
+# Payment outbox
+
+PAYMENT_PENDING = 'pending'
+PAYMENT_PROCESSING = 'processing'
+PAYMENT_SETTLED = 'settled'
+PAYMENT_FAILED = 'failed'
+PAYMENT_REFUNDED = 'refunded'
+
+def insert_payment(patron_id: str, book_id: int, borrow_record_id: Optional[int], amount: float,
+                   status: str = PAYMENT_PENDING, transaction_id: Optional[str] = None) -> Optional[int]:
+    """
+    Insert a payment row and return its ID.
+    Returns None on error, including when the loan already has an open
+    (pending or processing) payment.
+    """
+    now = to_epoch(datetime.now())
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            INSERT INTO payments (patron_id, book_id, borrow_record_id, amount, status,
+                                  next_attempt_at, transaction_id, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (patron_id, book_id, borrow_record_id, amount, status, now, transaction_id, now, now))
+        conn.commit()
+        conn.close()
+        return cursor.lastrowid
+    except Exception as e:
+        conn.close()
+        return None
+
+def get_payment(payment_id: int) -> Optional[Dict]:
+    """Get a payment by ID."""
+    conn = get_db_connection()
+    row = conn.execute('SELECT * FROM payments WHERE id = ?', (payment_id,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def has_open_payment(borrow_record_id: int) -> bool:
+    """Check whether a payment for a borrow record is still waiting to settle."""
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT 1 FROM payments WHERE borrow_record_id = ? AND status IN (?, ?) LIMIT 1
+    ''', (borrow_record_id, PAYMENT_PENDING, PAYMENT_PROCESSING)).fetchone()
+    conn.close()
+    return row is not None
+
+def get_patron_fees_paid(patron_id: str) -> float:
+    """Get the total of a patron's settled payments."""
+    conn = get_db_connection()
+    total = conn.execute('''
+        SELECT COALESCE(SUM(amount), 0) AS total FROM payments WHERE patron_id = ? AND status = ?
+    ''', (patron_id, PAYMENT_SETTLED)).fetchone()['total']
+    conn.close()
+    return total
+
+def claim_due_payments(limit: int, lease_seconds: int = 60) -> List[Dict]:
+    """
+    Atomically claim up to `limit` payments that are due for an attempt.
+    
+    Rows left in 'processing' longer than `lease_seconds` (e.g. by a crashed
+    worker) are claimed again. Each claimed row gets a fresh claim_token;
+    settle/retry/fail only apply while the row still carries that token, so a
+    worker whose lease expired cannot overwrite the outcome of a newer claim.
+    """
+    now = to_epoch(datetime.now())
+    conn = get_db_connection()
+    try:
+        rows = conn.execute('''
+            UPDATE payments SET status = ?, claimed_at = ?, updated_at = ?,
+                                claim_token = lower(hex(randomblob(16)))
+            WHERE id IN (
+                SELECT id FROM payments
+                WHERE (status = ? AND next_attempt_at <= ?)
+                   OR (status = ? AND claimed_at < ?)
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+            RETURNING *
+        ''', (PAYMENT_PROCESSING, now, now, PAYMENT_PENDING, now,
+              PAYMENT_PROCESSING, now - lease_seconds, limit)).fetchall()
+        conn.commit()
+        conn.close()
+        return [dict(r) for r in rows]
+    except Exception as e:
+        conn.close()
+        return []
+
+def settle_payment(payment_id: int, claim_token: str, transaction_id: str) -> bool:
+    """Mark a claimed payment as settled; False if the claim was lost."""
+    return _update_claimed_payment(payment_id, claim_token, status=PAYMENT_SETTLED,
+                                   transaction_id=transaction_id, last_error=None)
+
+def retry_payment(payment_id: int, claim_token: str, attempts: int, next_attempt_at: datetime,
+                  error: str) -> bool:
+    """Return a claimed payment to the queue for another attempt later."""
+    return _update_claimed_payment(payment_id, claim_token, status=PAYMENT_PENDING, attempts=attempts,
+                                   next_attempt_at=to_epoch(next_attempt_at), last_error=error)
+
+def fail_payment(payment_id: int, claim_token: str, attempts: int, error: str) -> bool:
+    """Give up on a payment after its final attempt."""
+    return _update_claimed_payment(payment_id, claim_token, status=PAYMENT_FAILED, attempts=attempts,
+                                   last_error=error)
+
+def settle_unclaimed_payment(payment_id: int, transaction_id: str) -> bool:
+    """
+    Record a successful charge made under a claim that has since been lost:
+    settle the payment unless it already settled (or was refunded).
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('''
+            UPDATE payments SET status = ?, transaction_id = ?, last_error = NULL,
+                                claim_token = NULL, updated_at = ?
+            WHERE id = ? AND status NOT IN (?, ?)
+        ''', (PAYMENT_SETTLED, transaction_id, to_epoch(datetime.now()),
+              payment_id, PAYMENT_SETTLED, PAYMENT_REFUNDED))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount > 0
+    except Exception as e:
+        conn.close()
+        return False
+
+def record_payment_refund(transaction_id: str, refund_id: str) -> Optional[Dict]:
+    """Mark the settled payment with this transaction ID as refunded and return it."""
+    conn = get_db_connection()
+    try:
+        row = conn.execute('''
+            UPDATE payments SET status = ?, refund_id = ?, updated_at = ?
+            WHERE transaction_id = ? AND status = ?
+            RETURNING *
+        ''', (PAYMENT_REFUNDED, refund_id, to_epoch(datetime.now()),
+              transaction_id, PAYMENT_SETTLED)).fetchone()
+        conn.commit()
+        conn.close()
+        return dict(row) if row else None
+    except Exception as e:
+        conn.close()
+        return None
+
+def _update_claimed_payment(payment_id: int, claim_token: str, **fields) -> bool:
+    fields['updated_at'] = to_epoch(datetime.now())
+    assignments = ', '.join(f'{name} = ?' for name in fields)
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(f'''
+            UPDATE payments SET {assignments}, claim_token = NULL
+            WHERE id = ? AND status = ? AND claim_token = ?
+        ''', (*fields.values(), payment_id, PAYMENT_PROCESSING, claim_token))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount > 0
+    except Exception as e:
+        conn.close()
+        return False
@@ -6,6 +6,8 @@ from .catalog_routes import catalog_bp
 from .borrowing_routes import borrowing_bp
 from .search_routes import search_bp
 from .api_routes import api_bp
+from services.rate_limit import init_rate_limiting
+from services.traffic_capture import init_traffic_capture
 
 def register_blueprints(app):
     """Register all route blueprints with the Flask app."""
@@ -13,3 +15,9 @@ def register_blueprints(app):
     app.register_blueprint(borrowing_bp)
     app.register_blueprint(search_bp)
     app.register_blueprint(api_bp)
+    
+    # Opt-in request capture for replay; installed first so it also times rejected requests
+    init_traffic_capture(app)
+    
+    # Rate limiting and load shedding around the write and polling endpoints
+    init_rate_limiting(app)
@@ -2,8 +2,16 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from library_service import calculate_late_fee_for_book, search_books_in_catalog
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from database import FACET_SQL, get_books_by_ids, get_payment
+from library_service import (
+    browse_catalog, calculate_late_fee_for_book, search_books_in_catalog, submit_late_fee_payment
+)
+from services.suggest_service import get_suggest_index
+from services.recommendation_service import get_recommendation_index
+from services.change_feed import get_availability_bus, stream_events
+from services.serialization import api_response, book_list_response
+from services.shard_router import current_router, spans_branches
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -14,7 +22,33 @@ def get_late_fee(patron_id, book_id):
     API endpoint for R4: Late Fee Calculation
     """
     result = calculate_late_fee_for_book(patron_id, book_id)
-    return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
+    return api_response(result, 501 if 'not implemented' in result.get('status', '') else 200)
+
+@api_bp.route('/pay_late_fee', methods=['POST'])
+def pay_late_fee_api():
+    """
+    Queue a late fee payment; it is settled in the background.
+    Returns 202 with the payment ID, which can be polled at /api/payments/<id>,
+    or 503 when this app runs no settlement worker (PAYMENT_WORKERS is 0).
+    """
+    if 'payment_worker' not in current_app.extensions:
+        return api_response({'success': False, 'message': 'Late fee payments are not being accepted right now.'}, 503)
+    patron_id = request.form.get('patron_id', '').strip()
+    try:
+        book_id = int(request.form.get('book_id', ''))
+    except (ValueError, TypeError):
+        return api_response({'success': False, 'message': 'Invalid book ID.'}, 400)
+
+    success, message = submit_late_fee_payment(patron_id, book_id)
+    return api_response({'success': success, 'message': message}, 202 if success else 400)
+
+@api_bp.route('/payments/<int:payment_id>')
+def get_payment_status(payment_id):
+    """Get the settlement status of a queued payment."""
+    payment = get_payment(payment_id)
+    if not payment:
+        return api_response({'error': 'Payment not found'}, 404)
+    return api_response(payment)
 
 @api_bp.route('/search')
 def search_books_api():
@@ -26,14 +60,91 @@ def search_books_api():
     search_type = request.args.get('type', 'title')
     
     if not search_term:
-        return jsonify({'error': 'Search term is required'}), 400
+        return api_response({'error': 'Search term is required'}, 400)
     
-    # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    # Use business logic function; searches naming no branch cover every branch
+    if spans_branches():
+        books = current_router().search_books(search_term, search_type)
+    else:
+        books = search_books_in_catalog(search_term, search_type)
     
-    return jsonify({
+    return book_list_response({
         'search_term': search_term,
         'search_type': search_type,
-        'results': books,
         'count': len(books)
+    }, 'results', books)
+
+@api_bp.route('/books')
+def books_api():
+    """
+    Browse the catalog as JSON: ?author=&availability=&letter=&copies=&after=&before=
+    Pages are in title order; pass next_after as after to get the next page,
+    or prev_before as before to get the previous one.
+    """
+    filters = {facet: request.args[facet] for facet in FACET_SQL if facet in request.args}
+    result = browse_catalog(filters, request.args.get('after', type=int),
+                            before_id=request.args.get('before', type=int))
+    if 'error' in result:
+        return api_response(result, 400)
+    books = result.pop('books')
+    return book_list_response(result, 'books', books)
+
+@api_bp.route('/suggest')
+def suggest_api():
+    """
+    Typeahead suggestions for titles and authors.
+    Returns the most borrowed matches for a prefix (default 10, max 50).
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return api_response({'error': 'Search term is required'}, 400)
+
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    suggestions = get_suggest_index().suggest(query, limit)
+
+    return api_response({
+        'query': query,
+        'suggestions': suggestions,
+        'count': len(suggestions)
     })
+
+@api_bp.route('/books/<int:book_id>/related')
+def related_books_api(book_id):
+    """
+    Books most often borrowed by patrons who also borrowed this one.
+    Returns up to `limit` books (default 10, max 20) with their co-borrow counts.
+    """
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 20)
+    related = get_recommendation_index().related(book_id, limit)
+
+    books = get_books_by_ids([book_id] + [other for other, _ in related])
+    if book_id not in books:
+        return api_response({'error': 'Book not found'}, 404)
+
+    results = []
+    for other, count in related:
+        if other in books:
+            results.append(dict(books[other], co_borrow_count=count))
+    return api_response({
+        'book_id': book_id,
+        'related': results,
+        'count': len(results)
+    })
+
+@api_bp.route('/stream/availability')
+def stream_availability():
+    """
+    Server-Sent Events feed of book additions and availability changes.
+    Clients resume with the Last-Event-ID header (or ?last_event_id=).
+    """
+    last_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_id = int(last_id) if last_id is not None else None
+    except ValueError:
+        last_id = None
+
+    response = Response(stream_with_context(stream_events(get_availability_bus(), last_id)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -4,6 +4,7 @@ Borrowing Routes - Book borrowing and returning endpoints
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from library_service import borrow_book_by_patron, return_book_by_patron
+from services.shard_router import current_router
 
 borrowing_bp = Blueprint('borrowing', __name__)
 
@@ -21,8 +22,10 @@ def borrow_book():
         flash('Invalid book ID.', 'error')
         return redirect(url_for('catalog.catalog'))
     
-    # Use business logic function
-    success, message = borrow_book_by_patron(patron_id, book_id)
+    # Use business logic function; with branches the limit is enforced across all of them
+    router = current_router()
+    borrow = router.borrow_book if router else borrow_book_by_patron
+    success, message = borrow(patron_id, book_id)
     
     flash(message, 'success' if success else 'error')
     return redirect(url_for('catalog.catalog'))
@@ -45,7 +48,9 @@ def return_book():
         return render_template('return_book.html')
     
     # Use business logic function
-    success, message = return_book_by_patron(patron_id, book_id)
+    router = current_router()
+    return_book = router.return_book if router else return_book_by_patron
+    success, message = return_book(patron_id, book_id)
     
     flash(message, 'success' if success else 'error')
     return render_template('return_book.html')
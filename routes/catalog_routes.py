@@ -3,8 +3,8 @@ Catalog Routes - Book catalog related endpoints
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
-from library_service import add_book_to_catalog
+from library_service import add_book_to_catalog, browse_catalog
+from database import FACET_SQL
 
 catalog_bp = Blueprint('catalog', __name__)
 
@@ -16,11 +16,18 @@ def index():
 @catalog_bp.route('/catalog')
 def catalog():
     """
-    Display all books in the catalog.
+    Display the catalog, one page at a time, with facet filters.
     Implements R2: Book Catalog Display
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    result = browse_catalog(_facet_filters(), request.args.get('after', type=int),
+                            before_id=request.args.get('before', type=int))
+    if 'error' in result:
+        flash(result['error'], 'error')
+        result = browse_catalog({})
+    return render_template('catalog.html', **result)
+
+def _facet_filters():
+    return {facet: request.args[facet] for facet in FACET_SQL if facet in request.args}
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
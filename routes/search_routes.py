@@ -4,6 +4,7 @@ Search Routes - Book search functionality
 
 from flask import Blueprint, render_template, request, flash
 from library_service import search_books_in_catalog
+from services.shard_router import current_router, spans_branches
 
 search_bp = Blueprint('search', __name__)
 
@@ -19,8 +20,11 @@ def search_books():
     if not search_term:
         return render_template('search.html', books=[], search_term='', search_type=search_type)
     
-    # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    # Use business logic function; searches naming no branch cover every branch
+    if spans_branches():
+        books = current_router().search_books(search_term, search_type)
+    else:
+        books = search_books_in_catalog(search_term, search_type)
     
     if not books:
         flash('Search functionality is not yet implemented.', 'error')
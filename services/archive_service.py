@@ -0,0 +1,107 @@
+"""
+Archive Service Module - Hot/cold partitioning of borrow_records
+Moves old returned loans into an attached archive database in small
+transactions so circulation queries only touch the live table.
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from database import get_archive_connection, to_epoch, PAYMENT_PENDING, PAYMENT_PROCESSING
+
+# Returned loans older than this many days are moved to the archive
+DEFAULT_ARCHIVE_AFTER_DAYS = 365
+DEFAULT_BATCH_SIZE = 1000
+
+
+def archive_returned_loans(older_than_days: int = DEFAULT_ARCHIVE_AFTER_DAYS,
+                           batch_size: int = DEFAULT_BATCH_SIZE,
+                           max_batches: Optional[int] = None,
+                           pause: float = 0.0,
+                           stop_event: Optional[threading.Event] = None) -> int:
+    """
+    Move returned loans older than the cutoff into the archive database.
+
+    Each batch is copied and deleted in its own short transaction so
+    borrow/return writers are only held up for one batch at a time.
+    Loans with a payment still in flight are left alone.
+
+    Returns:
+        int: number of loans archived
+    """
+    cutoff = to_epoch(datetime.now() - timedelta(days=older_than_days))
+    conn = get_archive_connection()
+    archived = 0
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            if stop_event is not None and stop_event.is_set():
+                break
+
+            conn.execute('BEGIN IMMEDIATE')
+            ids = [row['id'] for row in conn.execute('''
+                SELECT br.id FROM main.borrow_records br
+                WHERE br.return_date IS NOT NULL AND br.return_date < ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM main.payments p
+                      WHERE p.borrow_record_id = br.id AND p.status IN (?, ?)
+                  )
+                ORDER BY br.return_date
+                LIMIT ?
+            ''', (cutoff, PAYMENT_PENDING, PAYMENT_PROCESSING, batch_size))]
+            if not ids:
+                conn.rollback()
+                break
+
+            placeholders = ', '.join('?' * len(ids))
+            conn.execute(f'''
+                INSERT OR REPLACE INTO archive.borrow_records
+                    (id, patron_id, book_id, borrow_date, due_date, return_date)
+                SELECT id, patron_id, book_id, borrow_date, due_date, return_date
+                FROM main.borrow_records WHERE id IN ({placeholders})
+            ''', ids)
+            conn.execute(f'DELETE FROM main.borrow_records WHERE id IN ({placeholders})', ids)
+            conn.commit()
+
+            archived += len(ids)
+            batches += 1
+            if pause and stop_event is not None:
+                stop_event.wait(pause)
+    finally:
+        conn.close()
+    return archived
+
+
+class ArchiveWorker:
+    """Background thread that periodically archives old returned loans."""
+
+    def __init__(self, older_than_days: int = DEFAULT_ARCHIVE_AFTER_DAYS,
+                 batch_size: int = DEFAULT_BATCH_SIZE, interval: float = 3600.0,
+                 batch_pause: float = 0.05):
+        self.older_than_days = older_than_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.batch_pause = batch_pause
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start archiving in the background."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='loan-archiver', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop after the current batch."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            archive_returned_loans(self.older_than_days, self.batch_size,
+                                   pause=self.batch_pause, stop_event=self._stop)
+            self._stop.wait(self.interval)
@@ -0,0 +1,360 @@
+"""
+Backup Service Module - Online snapshots of the live database
+Copies the database with SQLite's online backup API a few pages at a time,
+keeps a rotating set of timestamped snapshots, restores from them, and
+opens read-only reporting connections on the latest one.
+
+The primary is switched to WAL journal mode on the first backup. The backup
+connection then holds one read transaction for the whole copy, which pins a
+consistent WAL snapshot: writers keep committing between steps without
+waiting on the backup, and their commits no longer force the copy to start
+over (in rollback-journal mode every concurrent commit restarts it).
+
+The loan archive (database.ARCHIVE_DATABASE) is snapshotted alongside the
+primary into a sibling file, library-<timestamp>-archive.db, from the same
+read transaction, and restored with it. A loan archived while the two read
+snapshots are being pinned can at worst appear in both copies; restore
+drops such duplicates from the archive.
+
+Usage: python -m services.backup_service backup BACKUP_DIR [--keep N]
+       python -m services.backup_service list BACKUP_DIR
+       python -m services.backup_service restore SNAPSHOT
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from database import current_archive_database, current_database, use_database
+
+# 256 pages is 1 MiB per step with the default 4 KiB page size
+DEFAULT_PAGES_PER_STEP = 256
+DEFAULT_STEP_PAUSE = 0.005
+DEFAULT_KEEP = 24
+
+SNAPSHOT_PREFIX = 'library-'
+SNAPSHOT_SUFFIX = '.db'
+ARCHIVE_SNAPSHOT_SUFFIX = '-archive.db'
+
+
+def backup_database(dest_path: str, pages: int = DEFAULT_PAGES_PER_STEP,
+                    pause: float = DEFAULT_STEP_PAUSE, progress=None,
+                    archive_dest_path: Optional[str] = None) -> Dict:
+    """
+    Copy the current database to dest_path without blocking writers.
+
+    Args:
+        pages: pages copied per step
+        pause: seconds to sleep between steps, leaving I/O for the primary
+        progress: optional callback(remaining_pages, total_pages) after each step
+        archive_dest_path: also copy the current archive database here, from
+            the same read transaction
+
+    Returns:
+        dict: path, page count, number of steps and elapsed seconds
+    """
+    copies = [('main', dest_path)]
+    if archive_dest_path is not None:
+        copies.append(('archive', archive_dest_path))
+    for _, path in copies:
+        if os.path.exists(f'{path}.partial'):
+            os.remove(f'{path}.partial')
+
+    started = time.perf_counter()
+    steps = 0
+    total_pages = 0
+
+    def on_step(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        if progress is not None:
+            progress(remaining, total)
+        if remaining and pause:
+            time.sleep(pause)
+
+    source = sqlite3.connect(current_database(), isolation_level=None)
+    try:
+        _enable_wal(source, 'main')
+        if archive_dest_path is not None:
+            source.execute('ATTACH DATABASE ? AS archive', (current_archive_database(),))
+            _enable_wal(source, 'archive')
+        source.execute('BEGIN')
+        # Pin the read snapshots, primary first: a loan archived in between shows up in both
+        for name, _ in copies:
+            source.execute(f'SELECT COUNT(*) FROM {name}.sqlite_master').fetchone()
+        for name, path in copies:
+            target = sqlite3.connect(f'{path}.partial')
+            try:
+                source.backup(target, pages=pages, progress=on_step, name=name)
+                total_pages += target.execute('PRAGMA page_count').fetchone()[0]
+                # Snapshots are single self-contained files
+                target.execute('PRAGMA journal_mode=DELETE')
+            finally:
+                target.close()
+        source.execute('COMMIT')
+    finally:
+        source.close()
+
+    for _, path in copies:
+        os.replace(f'{path}.partial', path)
+    return {'path': dest_path, 'pages': total_pages, 'steps': steps,
+            'seconds': time.perf_counter() - started}
+
+
+def _enable_wal(conn: sqlite3.Connection, schema: str, attempts: int = 100):
+    """
+    Switch a database to WAL mode. The switch needs a moment with no other
+    connection in a transaction and does not wait on the busy handler, so
+    retry briefly while writers are active.
+    """
+    for attempt in range(attempts):
+        try:
+            conn.execute(f'PRAGMA {schema}.journal_mode=WAL')
+            return
+        except sqlite3.OperationalError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.01)
+
+
+def archive_snapshot_path(snapshot_path: str) -> str:
+    """Where the archive copy belonging to a snapshot is kept."""
+    return snapshot_path[:-len(SNAPSHOT_SUFFIX)] + ARCHIVE_SNAPSHOT_SUFFIX
+
+
+def take_snapshot(backup_dir: str, pages: int = DEFAULT_PAGES_PER_STEP,
+                  pause: float = DEFAULT_STEP_PAUSE) -> str:
+    """
+    Back up the current database, and its archive if there is one, into a
+    new timestamped file (plus archive sibling) in backup_dir.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    name = f'{SNAPSHOT_PREFIX}{datetime.now():%Y%m%d-%H%M%S-%f}{SNAPSHOT_SUFFIX}'
+    path = os.path.join(backup_dir, name)
+    archive_path = archive_snapshot_path(path) if os.path.exists(current_archive_database()) else None
+    return backup_database(path, pages, pause, archive_dest_path=archive_path)['path']
+
+
+def list_snapshots(backup_dir: str) -> List[str]:
+    """Snapshot paths in backup_dir, oldest first (archive siblings are not listed)."""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = sorted(n for n in os.listdir(backup_dir)
+                   if n.startswith(SNAPSHOT_PREFIX) and n.endswith(SNAPSHOT_SUFFIX)
+                   and not n.endswith(ARCHIVE_SNAPSHOT_SUFFIX))
+    return [os.path.join(backup_dir, n) for n in names]
+
+
+def latest_snapshot(backup_dir: str) -> Optional[str]:
+    snapshots = list_snapshots(backup_dir)
+    return snapshots[-1] if snapshots else None
+
+
+def prune_snapshots(backup_dir: str, keep: int = DEFAULT_KEEP) -> List[str]:
+    """Delete all but the newest `keep` snapshots and their archives; returns the removed paths."""
+    snapshots = list_snapshots(backup_dir)
+    removed = snapshots[:-keep] if keep > 0 else snapshots
+    for path in removed:
+        os.remove(path)
+        if os.path.exists(archive_snapshot_path(path)):
+            os.remove(archive_snapshot_path(path))
+    return removed
+
+
+def restore_database(snapshot_path: str) -> Tuple[bool, str]:
+    """
+    Replace the contents of the current database and its archive with a snapshot.
+
+    Each copy happens in one step under the target's write lock, so other
+    connections see either the old or the restored database. A snapshot
+    taken before anything was archived empties the live archive. In-process
+    caches (search indexes, catalog snapshot) are not rebuilt; restart the
+    app after restoring.
+    """
+    if not os.path.exists(snapshot_path):
+        return False, "Snapshot not found."
+
+    archive_copy = archive_snapshot_path(snapshot_path)
+    try:
+        ok, message = _check_snapshot(snapshot_path)
+        if ok and os.path.exists(archive_copy):
+            ok, message = _check_snapshot(archive_copy)
+        if not ok:
+            return False, message
+        archive = current_archive_database()
+        _copy_database(snapshot_path, current_database())
+        if os.path.exists(archive_copy):
+            _copy_database(archive_copy, archive)
+            _drop_archived_duplicates(archive)
+        elif os.path.exists(archive):
+            _clear_archive(archive)
+    except sqlite3.Error as e:
+        return False, f"Restore failed: {e}"
+    return True, f"Database restored from {os.path.basename(snapshot_path)}."
+
+
+def _check_snapshot(path: str) -> Tuple[bool, str]:
+    snapshot = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        if snapshot.execute('PRAGMA quick_check').fetchone()[0] != 'ok':
+            return False, "Snapshot failed its integrity check."
+        return True, ""
+    finally:
+        snapshot.close()
+
+
+def _copy_database(source_path: str, dest_path: str):
+    source = sqlite3.connect(f'file:{source_path}?mode=ro', uri=True)
+    try:
+        dest = sqlite3.connect(dest_path, timeout=30)
+        try:
+            source.backup(dest)
+        finally:
+            dest.close()
+    finally:
+        source.close()
+
+
+def _drop_archived_duplicates(archive_path: str):
+    """Remove archive rows for loans the restored primary still holds."""
+    conn = sqlite3.connect(current_database(), timeout=30)
+    try:
+        conn.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+        conn.execute('''
+            DELETE FROM archive.borrow_records WHERE id IN (SELECT id FROM main.borrow_records)
+        ''')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _clear_archive(archive_path: str):
+    conn = sqlite3.connect(archive_path, timeout=30)
+    try:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'borrow_records'").fetchone():
+            conn.execute('DELETE FROM borrow_records')
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def reporting_connection(backup_dir: str) -> Optional[sqlite3.Connection]:
+    """Read-only connection to the latest snapshot for heavy report queries, if one exists."""
+    path = latest_snapshot(backup_dir)
+    if path is None:
+        return None
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _fingerprint(*paths: str) -> Tuple:
+    """Modification stamps of the databases and their WALs, which change on every commit."""
+    stamps = []
+    for candidate in (name for path in paths for name in (path, f'{path}-wal')):
+        try:
+            stat = os.stat(candidate)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+class BackupScheduler:
+    """
+    Background thread taking periodic snapshots of the database (and
+    archive) that was current when it was created, and pruning old ones.
+
+    A snapshot is only taken when the database files changed since the
+    previous one, so idle periods do not fill backup_dir with copies.
+    """
+
+    def __init__(self, backup_dir: str, interval: float = 3600.0, keep: int = DEFAULT_KEEP,
+                 pages: int = DEFAULT_PAGES_PER_STEP, pause: float = DEFAULT_STEP_PAUSE):
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep = keep
+        self.pages = pages
+        self.pause = pause
+        self.database_path = current_database()
+        self.archive_path = current_archive_database()
+        self._last_fingerprint = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start taking snapshots in the background."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='db-backup', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop after the snapshot in progress, if any."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> Optional[str]:
+        """Take a snapshot if the database changed; returns its path, or None if skipped."""
+        with use_database(self.database_path, self.archive_path):
+            fingerprint = _fingerprint(self.database_path, self.archive_path)
+            if fingerprint == self._last_fingerprint:
+                return None
+            path = take_snapshot(self.backup_dir, self.pages, self.pause)
+            # The backup itself may checkpoint the WAL; stamp the files as copied
+            self._last_fingerprint = _fingerprint(self.database_path, self.archive_path)
+            prune_snapshots(self.backup_dir, self.keep)
+            return path
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except sqlite3.Error:
+                pass
+            self._stop.wait(self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Back up or restore the library database.')
+    parser.add_argument('--database', help='primary database path (default: library.db)')
+    parser.add_argument('--archive', help='archive database path (default: next to the primary)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    backup = commands.add_parser('backup', help='take a snapshot and prune old ones')
+    backup.add_argument('backup_dir')
+    backup.add_argument('--keep', type=int, default=DEFAULT_KEEP)
+    backup.add_argument('--pages', type=int, default=DEFAULT_PAGES_PER_STEP)
+    backup.add_argument('--pause', type=float, default=DEFAULT_STEP_PAUSE)
+    listing = commands.add_parser('list', help='list snapshots, oldest first')
+    listing.add_argument('backup_dir')
+    restore = commands.add_parser('restore', help='restore the database from a snapshot')
+    restore.add_argument('snapshot')
+    args = parser.parse_args()
+
+    database = args.database or current_database()
+    archive = args.archive or (current_archive_database() if args.database is None else None)
+    with use_database(database, archive):
+        if args.command == 'backup':
+            path = take_snapshot(args.backup_dir, args.pages, args.pause)
+            prune_snapshots(args.backup_dir, args.keep)
+            print(path)
+        elif args.command == 'list':
+            for path in list_snapshots(args.backup_dir):
+                size = os.path.getsize(path)
+                if os.path.exists(archive_snapshot_path(path)):
+                    size += os.path.getsize(archive_snapshot_path(path))
+                print(f'{path}  {size / 1e6:.1f} MB')
+        else:
+            success, message = restore_database(args.snapshot)
+            print(message)
+            raise SystemExit(0 if success else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""
+Catalog Snapshot Module - Shared memory-mapped copy of the books table
+Writes the catalog to a compact binary file that every worker process maps
+read-only, so catalog reads neither query SQLite nor keep a private copy.
+
+File layout (little-endian):
+    header      magic, version, record count, section offsets
+    records     fixed-width book records, in title order
+    id index    (book id, record number) pairs sorted by id
+    heap        UTF-8 titles and authors referenced by offset/length
+
+A separate 8-byte generation file is bumped whenever the snapshot is
+replaced; readers compare it with the generation they mapped and remap
+when it changes. Availability changes are patched into the current
+snapshot in place and new books rewrite it before the insert returns, so
+both are visible to every reader immediately.
+"""
+
+import bisect
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+
+from database import (
+    add_change_listener, remove_change_listener, get_all_books, current_archive_database,
+    current_database, use_database
+)
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'LIBCAT01'
+HEADER = struct.Struct('<8sIIQQQQQ')        # magic, version, count, generation, records, index, heap, heap size
+RECORD = struct.Struct('<qiiIIII16s')       # id, total, available, title off/len, author off/len, isbn
+INDEX_ENTRY = struct.Struct('<qq')          # book id, record number
+GENERATION = struct.Struct('<Q')
+AVAILABLE_OFFSET = 12                       # byte offset of available_copies within a record
+
+
+def write_snapshot(path: str, books: List[Dict], generation: int) -> None:
+    """Write `books` (already in display order) to `path` atomically."""
+    heap = bytearray()
+    records = bytearray()
+    for book in books:
+        title = book['title'].encode('utf-8')
+        author = book['author'].encode('utf-8')
+        title_off = len(heap)
+        heap += title
+        author_off = len(heap)
+        heap += author
+        records += RECORD.pack(book['id'], book['total_copies'], book['available_copies'],
+                               title_off, len(title), author_off, len(author),
+                               book['isbn'].encode('ascii', 'replace')[:16])
+
+    index = sorted((book['id'], n) for n, book in enumerate(books))
+    index_bytes = b''.join(INDEX_ENTRY.pack(book_id, n) for book_id, n in index)
+
+    records_off = HEADER.size
+    index_off = records_off + len(records)
+    heap_off = index_off + len(index_bytes)
+    header = HEADER.pack(MAGIC, 1, len(books), generation, records_off, index_off, heap_off, len(heap))
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(records)
+        f.write(index_bytes)
+        f.write(heap)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CatalogSnapshot:
+    """Read-only view of a snapshot file that follows the generation file."""
+
+    def __init__(self, path: str, database: Optional[str] = None):
+        self.path = path
+        # Database the snapshot mirrors; reads routed elsewhere (other shards) bypass it
+        self.database = database or current_database()
+        self._lock = threading.Lock()
+        self._map = None
+        self._generation = None
+        self._gen_file = open(_generation_path(path), 'rb')
+        self._gen_map = mmap.mmap(self._gen_file.fileno(), GENERATION.size, access=mmap.ACCESS_READ)
+
+    def close(self):
+        with self._lock:
+            # Readers may still hold the data mapping; it is unmapped once the last one drops it
+            self._map = None
+            self._gen_map.close()
+            self._gen_file.close()
+
+    def _current(self):
+        """Return the mapping for the latest generation, remapping if it changed."""
+        generation = GENERATION.unpack_from(self._gen_map, 0)[0]
+        if self._map is not None and generation == self._generation:
+            return self._map
+        with self._lock:
+            if self._map is None or generation != self._generation:
+                with open(self.path, 'rb') as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                # The old mapping is not closed here: other threads may be decoding from
+                # it, and it is unmapped when the last reference goes away
+                self._map = mapped
+                self._generation = HEADER.unpack_from(mapped, 0)[3]
+            return self._map
+
+    @property
+    def generation(self) -> int:
+        self._current()
+        return self._generation
+
+    def __len__(self):
+        return HEADER.unpack_from(self._current(), 0)[2]
+
+    def all_books(self) -> List[Dict]:
+        """Decode every book, in title order (same shape as database.get_all_books)."""
+        data = self._current()
+        _, _, count, _, records_off, _, heap_off, _ = HEADER.unpack_from(data, 0)
+        return [self._decode(data, records_off + n * RECORD.size, heap_off) for n in range(count)]
+
+    def get_book(self, book_id: int) -> Optional[Dict]:
+        """Look up one book by ID with a binary search over the id index."""
+        data = self._current()
+        _, _, count, _, records_off, index_off, heap_off, _ = HEADER.unpack_from(data, 0)
+        record_no = self._record_number(data, index_off, count, book_id)
+        if record_no is None:
+            return None
+        return self._decode(data, records_off + record_no * RECORD.size, heap_off)
+
+    def books_page(self, limit: int, after_id: Optional[int] = None,
+                   before_id: Optional[int] = None) -> Optional[List[Dict]]:
+        """
+        Up to `limit` books in title order, after the book after_id or ending before
+        the book before_id (same rows as database.get_books_page with no filters).
+        Returns None when the cursor book is not in the snapshot yet.
+        """
+        data = self._current()
+        _, _, count, _, records_off, index_off, heap_off, _ = HEADER.unpack_from(data, 0)
+        start, end = 0, limit
+        cursor = after_id if after_id is not None else before_id
+        if cursor is not None:
+            record_no = self._record_number(data, index_off, count, cursor)
+            if record_no is None:
+                return None
+            if after_id is not None:
+                start, end = record_no + 1, record_no + 1 + limit
+            else:
+                start, end = max(record_no - limit, 0), record_no
+        return [self._decode(data, records_off + n * RECORD.size, heap_off) for n in range(start, min(end, count))]
+
+    @staticmethod
+    def _record_number(data, index_off: int, count: int, book_id: int) -> Optional[int]:
+        ids = _IndexView(data, index_off, count)
+        position = bisect.bisect_left(ids, book_id)
+        if position == count or ids[position] != book_id:
+            return None
+        return INDEX_ENTRY.unpack_from(data, index_off + position * INDEX_ENTRY.size)[1]
+
+    @staticmethod
+    def _decode(data, offset: int, heap_off: int) -> Dict:
+        book_id, total, available, t_off, t_len, a_off, a_len, isbn = RECORD.unpack_from(data, offset)
+        return {
+            'id': book_id,
+            'title': data[heap_off + t_off:heap_off + t_off + t_len].decode('utf-8'),
+            'author': data[heap_off + a_off:heap_off + a_off + a_len].decode('utf-8'),
+            'isbn': isbn.rstrip(b'\0').decode('ascii'),
+            'total_copies': total,
+            'available_copies': available
+        }
+
+
+class _IndexView:
+    """Sequence of book ids in the id index, for bisect."""
+
+    def __init__(self, data, offset: int, count: int):
+        self._data = data
+        self._offset = offset
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, position: int) -> int:
+        return INDEX_ENTRY.unpack_from(self._data, self._offset + position * INDEX_ENTRY.size)[0]
+
+
+class CatalogSnapshotWriter:
+    """
+    Keeps the snapshot in step with catalog writes made by this process
+    to the database that was current when the writer was created.
+
+    New books rewrite the snapshot with a new generation before the write
+    that added them returns, so every reader sees them as soon as the
+    insert is visible in SQLite; a bulk import rewrites it once.
+    Availability changes are patched into the mapped file. A file lock
+    serializes writers across processes, and patches carry absolute values
+    so a patch landing after a concurrent rewrite is still correct. If a
+    rewrite fails the snapshot is marked stale and reads in this process
+    go to SQLite until a later rewrite succeeds.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.database = current_database()
+        self._archive = current_archive_database()
+        self._lock_path = f'{path}.lock'
+        self.stale = False
+
+    def _locked(self):
+        return _FileLock(self._lock_path)
+
+    def rebuild(self) -> int:
+        """Rewrite the snapshot from the database and publish a new generation."""
+        with self._locked(), use_database(self.database, self._archive):
+            generation = time.time_ns()
+            write_snapshot(self.path, get_all_books(), generation)
+            _write_generation(self.path, generation)
+            self.stale = False
+            return generation
+
+    def patch_availability(self, book_id: int, available_copies: int) -> bool:
+        """Overwrite one book's available_copies in place."""
+        with self._locked():
+            with open(self.path, 'r+b') as f:
+                data = mmap.mmap(f.fileno(), 0)
+                try:
+                    _, _, count, _, records_off, index_off, _, _ = HEADER.unpack_from(data, 0)
+                    ids = _IndexView(data, index_off, count)
+                    position = bisect.bisect_left(ids, book_id)
+                    if position == count or ids[position] != book_id:
+                        return False
+                    record_no = INDEX_ENTRY.unpack_from(data, index_off + position * INDEX_ENTRY.size)[1]
+                    struct.pack_into('<i', data, records_off + record_no * RECORD.size + AVAILABLE_OFFSET,
+                                     available_copies)
+                    return True
+                finally:
+                    data.close()
+
+    def _rebuild_or_mark_stale(self):
+        try:
+            self.rebuild()
+        except Exception:
+            self.stale = True
+            logger.exception('Rewriting catalog snapshot %s failed', self.path)
+
+    def on_change(self, event_type: str, data: Dict):
+        if current_database() != self.database:
+            return
+        if event_type in ('book_added', 'books_added'):
+            self._rebuild_or_mark_stale()
+        elif event_type == 'availability':
+            # A book missing from the snapshot (e.g. added by another process mid-rewrite)
+            if not self.patch_availability(data['book_id'], data['available_copies']):
+                self._rebuild_or_mark_stale()
+
+
+class _FileLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+def _generation_path(path: str) -> str:
+    return f'{path}.gen'
+
+
+def _write_generation(path: str, generation: int):
+    """Update the generation file in place so existing reader mappings see it."""
+    gen_path = _generation_path(path)
+    if not os.path.exists(gen_path):
+        with open(gen_path, 'wb') as f:
+            f.write(GENERATION.pack(generation))
+        return
+    with open(gen_path, 'r+b') as f:
+        data = mmap.mmap(f.fileno(), GENERATION.size)
+        GENERATION.pack_into(data, 0, generation)
+        data.close()
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_writer: Optional[CatalogSnapshotWriter] = None
+
+
+def enable(path: str, rebuild: bool = True) -> CatalogSnapshot:
+    """
+    Serve catalog reads in this process from the snapshot at `path`.
+    With rebuild set, (re)write the snapshot first and keep it updated on writes.
+    """
+    global _snapshot, _writer
+    disable()
+    _writer = CatalogSnapshotWriter(path)
+    if rebuild or not os.path.exists(_generation_path(path)):
+        _writer.rebuild()
+    add_change_listener(_writer.on_change)
+    _snapshot = CatalogSnapshot(path)
+    return _snapshot
+
+
+def disable():
+    """Go back to reading the catalog from SQLite."""
+    global _snapshot, _writer
+    if _writer is not None:
+        remove_change_listener(_writer.on_change)
+        _writer = None
+    if _snapshot is not None:
+        _snapshot.close()
+        _snapshot = None
+
+
+def get_snapshot() -> Optional[CatalogSnapshot]:
+    """The snapshot serving reads of the current database in this process, if enabled."""
+    snapshot, writer = _snapshot, _writer
+    if snapshot is None or snapshot.database != current_database():
+        return None
+    if writer is not None and writer.stale:
+        return None
+    return snapshot
@@ -0,0 +1,134 @@
+"""
+Change Feed Module - In-process broadcast of catalog availability changes
+Write paths in database.py publish events; this module keeps the most recent
+ones in a bounded ring buffer so any number of SSE subscribers can follow
+(and resume) the feed without polling the database. Each database file has
+its own bus, so branch shards keep separate feeds and event IDs.
+"""
+
+import json
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from database import add_change_listener, current_database
+
+# Events forwarded to /api/stream/availability
+AVAILABILITY_EVENTS = ('book_added', 'books_added', 'availability')
+BUFFER_SIZE = 4096
+
+
+class ChangeBus:
+    """
+    Single-producer, many-subscriber event bus over a ring buffer.
+
+    Event IDs increase monotonically; a subscriber that falls further
+    behind than the buffer holds is told to resynchronize instead.
+    """
+
+    def __init__(self, capacity: int = BUFFER_SIZE):
+        self._events = deque(maxlen=capacity)
+        self._next_id = 1
+        self._condition = threading.Condition()
+
+    @property
+    def last_id(self) -> int:
+        """ID of the newest event; a subscriber starting from it misses nothing published later."""
+        with self._condition:
+            return self._next_id - 1
+
+    def publish(self, event_type: str, data: Dict) -> int:
+        """Append an event, wake every waiting subscriber and return the event ID."""
+        with self._condition:
+            event_id = self._next_id
+            self._next_id += 1
+            self._events.append((event_id, event_type, data))
+            self._condition.notify_all()
+            return event_id
+
+    def events_since(self, last_id: int) -> Tuple[List[Tuple[int, str, Dict]], bool]:
+        """
+        Get buffered events after `last_id`.
+
+        Returns:
+            tuple: (events, missed) where missed is True if older events were already dropped
+        """
+        with self._condition:
+            return self._since(last_id)
+
+    def wait(self, last_id: int, timeout: float) -> Tuple[List[Tuple[int, str, Dict]], bool]:
+        """Block until there are events after `last_id` or the timeout passes."""
+        with self._condition:
+            # An ID ahead of the bus (e.g. from before a restart) is answered at once as missed
+            self._condition.wait_for(lambda: self._next_id - 1 != last_id, timeout)
+            return self._since(last_id)
+
+    def _since(self, last_id: int):
+        if last_id > self._next_id - 1:
+            return [], True
+        if not self._events:
+            return [], False
+        oldest = self._events[0][0]
+        missed = last_id < oldest - 1
+        # IDs are contiguous, so the start position is computed instead of searched
+        start = max(0, last_id - oldest + 1)
+        return [self._events[i] for i in range(start, len(self._events))], missed
+
+
+_buses: Dict[str, ChangeBus] = {}
+_buses_lock = threading.Lock()
+
+
+def get_availability_bus() -> ChangeBus:
+    """The availability feed of the current database."""
+    path = current_database()
+    bus = _buses.get(path)
+    if bus is None:
+        with _buses_lock:
+            bus = _buses.setdefault(path, ChangeBus())
+    return bus
+
+
+def _forward_availability(event_type: str, data: Dict):
+    if event_type in AVAILABILITY_EVENTS:
+        get_availability_bus().publish(event_type, data)
+
+
+add_change_listener(_forward_availability)
+
+
+def format_sse(event_id: Optional[int], event_type: str, data: Dict) -> str:
+    """Encode one Server-Sent Events message."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_events(bus: ChangeBus, last_id: Optional[int], heartbeat: float = 15.0):
+    """
+    Generate SSE messages from `bus`, starting after `last_id`
+    (or from now when None). Sends a `reset` event if the client missed
+    events that have left the buffer, or resumes from an ID this bus never
+    issued (the process restarted), and comment heartbeats while idle.
+    """
+    if last_id is None:
+        last_id = bus.last_id
+    yield 'retry: 3000\n\n'
+    while True:
+        events, missed = bus.wait(last_id, heartbeat)
+        if missed:
+            reset_id = bus.last_id
+            yield format_sse(None, 'reset', {'last_event_id': reset_id})
+            if not events:
+                # Resumed from beyond the bus; continue from its current position
+                last_id = reset_id
+                continue
+        if not events:
+            yield ': keep-alive\n\n'
+            continue
+        for event_id, event_type, data in events:
+            yield format_sse(event_id, event_type, data)
+        last_id = events[-1][0]
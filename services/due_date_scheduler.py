@@ -0,0 +1,205 @@
+"""
+Due Date Scheduler Module - "due soon" and "now overdue" notifications
+Keeps upcoming due dates in a min-heap loaded window by window from the
+active-loan index and kept current by borrow/return events, so nothing
+ever scans the whole borrow_records table. A scheduler follows the
+database it was loaded from; events from other databases (branch shards)
+are ignored.
+"""
+
+import heapq
+import json
+import queue
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from database import (
+    add_change_listener, remove_change_listener, get_active_loans_by_due_date,
+    to_epoch, from_epoch, current_archive_database, current_database, use_database
+)
+
+DUE_SOON = 'due_soon'
+NOW_OVERDUE = 'now_overdue'
+
+
+class QueueNotifier:
+    """Notifier that puts (kind, loan) tuples on a queue; handy for tests and in-process consumers."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def notify(self, kind: str, loan: Dict):
+        self.queue.put((kind, loan))
+
+
+class FileNotifier:
+    """Notifier that appends one JSON line per notification to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def notify(self, kind: str, loan: Dict):
+        line = json.dumps({'kind': kind, **loan}, default=str)
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line + '\n')
+
+
+class DueDateScheduler:
+    """
+    Min-heap timer for loan due dates.
+
+    Only loans due within `lookahead` of now are held in memory; the window
+    is extended from the database as time passes. Returned loans are
+    dropped lazily when their timers come up.
+    """
+
+    def __init__(self, notifier, due_soon: timedelta = timedelta(days=2),
+                 lookahead: timedelta = timedelta(days=7), page_size: int = 5000,
+                 clock=datetime.now):
+        self.notifier = notifier
+        self.due_soon = due_soon
+        self.lookahead = lookahead
+        self.page_size = page_size
+        self._clock = clock
+        self.database = None
+        self._archive = None
+        self._heap = []
+        self._seq = 0
+        self._active: Dict[int, Dict] = {}
+        self._loaded_until = None
+        self._returned_while_loading = None
+        self._started_at = None
+        self._lock = threading.Lock()
+        # Serializes window extensions so two callers never page the same range
+        self._window_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._active)
+
+    def load(self, since: Optional[datetime] = None):
+        """Load the first window of loans and start following borrow/return events."""
+        since = since or self._clock()
+        self.database = current_database()
+        self._archive = current_archive_database()
+        with self._lock:
+            self._started_at = to_epoch(since)
+            self._loaded_until = self._started_at
+        add_change_listener(self._on_change)
+        self._extend_window(since)
+
+    def _extend_window(self, now: datetime):
+        """Pull loans due up to now + lookahead + due_soon from the index, a page at a time."""
+        target = to_epoch(now + self.lookahead + self.due_soon)
+        with self._window_lock:
+            with self._lock:
+                start = self._loaded_until
+                if target <= start:
+                    return
+                # Advance the bound first: loans created while paging are scheduled by
+                # their events, and loans returned while paging are not scheduled again
+                self._loaded_until = target
+                self._returned_while_loading = set()
+
+            due_after, after_id = start, -1
+            try:
+                while True:
+                    page = get_active_loans_by_due_date(due_after, after_id, target, self.page_size)
+                    with self._lock:
+                        for loan in page:
+                            if loan['id'] not in self._returned_while_loading:
+                                self._schedule(loan)
+                    if len(page) < self.page_size:
+                        break
+                    due_after, after_id = page[-1]['due_date'], page[-1]['id']
+            finally:
+                with self._lock:
+                    self._returned_while_loading = None
+
+    def _schedule(self, loan: Dict):
+        """Push timers for a loan (caller holds the lock)."""
+        if loan['id'] in self._active:
+            return
+        self._active[loan['id']] = loan
+        due = loan['due_date']
+        soon = due - int(self.due_soon.total_seconds())
+        if soon >= self._started_at:
+            self._push(soon, DUE_SOON, loan['id'])
+        if due >= self._started_at:
+            self._push(due, NOW_OVERDUE, loan['id'])
+
+    def _push(self, fire_at: int, kind: str, loan_id: int):
+        self._seq += 1
+        heapq.heappush(self._heap, (fire_at, self._seq, kind, loan_id))
+
+    def _on_change(self, event_type: str, data: Dict):
+        if current_database() != self.database:
+            return
+        if event_type == 'loan_created':
+            with self._lock:
+                # Loans beyond the loaded window are picked up when it advances
+                if data['due_date'] <= self._loaded_until:
+                    self._schedule(data)
+            self._wakeup.set()
+        elif event_type == 'loan_returned':
+            with self._lock:
+                self._active.pop(data['id'], None)
+                if self._returned_while_loading is not None:
+                    self._returned_while_loading.add(data['id'])
+
+    def tick(self, now: Optional[datetime] = None) -> int:
+        """Fire every timer due at `now`; returns the number of notifications sent."""
+        now = now or self._clock()
+        self._extend_window(now)
+        now_epoch = to_epoch(now)
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now_epoch:
+                _, _, kind, loan_id = heapq.heappop(self._heap)
+                loan = self._active.get(loan_id)
+                if loan is None:
+                    continue
+                if kind == NOW_OVERDUE:
+                    del self._active[loan_id]
+                due.append((kind, loan))
+
+        for kind, loan in due:
+            self.notifier.notify(kind, {**loan, 'due_date': from_epoch(loan['due_date'])})
+        return len(due)
+
+    def next_fire_time(self) -> Optional[datetime]:
+        """When the earliest pending timer is due, if any."""
+        with self._lock:
+            return from_epoch(self._heap[0][0]) if self._heap else None
+
+    def start(self, max_sleep: float = 60.0):
+        """Load and run timers on a background thread."""
+        if self._thread is not None:
+            return
+        self.load()
+        self._stop.clear()
+
+        def run():
+            with use_database(self.database, self._archive):
+                while not self._stop.is_set():
+                    self.tick()
+                    upcoming = self.next_fire_time()
+                    delay = max_sleep if upcoming is None else (upcoming - self._clock()).total_seconds()
+                    self._wakeup.wait(min(max(delay, 0.0), max_sleep))
+                    self._wakeup.clear()
+
+        self._thread = threading.Thread(target=run, name='due-date-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and unsubscribe from loan events."""
+        remove_change_listener(self._on_change)
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
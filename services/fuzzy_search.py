@@ -0,0 +1,162 @@
+"""
+Fuzzy Search Module - Typo-tolerant title and author search
+SymSpell-style deletion index over normalized title/author words: every word
+is indexed under the strings obtained by deleting up to MAX_DISTANCE
+characters, so a misspelled query word finds its candidates with a few
+dictionary lookups instead of comparing against the whole vocabulary.
+"""
+
+import re
+import threading
+from itertools import combinations
+from typing import Dict, List, Optional, Set, Tuple
+
+from database import add_change_listener, current_database
+
+MAX_DISTANCE = 2
+# Only the first PREFIX_LENGTH characters of a word are used for deletes (as in SymSpell)
+PREFIX_LENGTH = 7
+MAX_RESULTS = 50
+
+_WORD = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words with punctuation stripped ("F. Scott" -> ["f", "scott"])."""
+    return _WORD.findall(text.lower().replace("'", ""))
+
+
+def allowed_distance(word: str) -> int:
+    """Edit budget for a query word: none for very short words, 1 up to 4 letters, else 2."""
+    if len(word) <= 2:
+        return 0
+    return 1 if len(word) <= 4 else MAX_DISTANCE
+
+
+def _deletes(word: str, distance: int) -> Set[str]:
+    prefix = word[:PREFIX_LENGTH]
+    variants = {prefix}
+    for n in range(1, min(distance, len(prefix)) + 1):
+        for positions in combinations(range(len(prefix)), n):
+            variants.add(''.join(c for i, c in enumerate(prefix) if i not in positions))
+    return variants
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent transpositions count once); limit + 1 if above limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        best = current[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            best = min(best, value)
+        if best > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class FuzzyIndex:
+    """Deletion index from word variants to words, and from words to book ids."""
+
+    def __init__(self):
+        self._variants: Dict[str, Set[str]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, books: List[Dict]) -> 'FuzzyIndex':
+        index = cls()
+        for book in books:
+            index.add_book(book['id'], book['title'], book['author'])
+        return index
+
+    def add_book(self, book_id: int, title: str, author: str):
+        """Index a book's title and author words."""
+        with self._lock:
+            for word in set(tokenize(title) + tokenize(author)):
+                postings = self._postings.get(word)
+                if postings is None:
+                    postings = self._postings[word] = set()
+                    for variant in _deletes(word, MAX_DISTANCE):
+                        self._variants.setdefault(variant, set()).add(word)
+                postings.add(book_id)
+
+    def _matches(self, word: str) -> Dict[str, int]:
+        """Indexed words within the allowed distance of `word`, with their distances."""
+        limit = allowed_distance(word)
+        if limit == 0:
+            return {word: 0} if word in self._postings else {}
+        matches = {}
+        for variant in _deletes(word, limit):
+            for candidate in self._variants.get(variant, ()):
+                if candidate not in matches:
+                    distance = edit_distance(word, candidate, limit)
+                    if distance <= limit:
+                        matches[candidate] = distance
+        return matches
+
+    def search(self, query: str, limit: int = MAX_RESULTS) -> List[Tuple[int, int]]:
+        """
+        Find books matching every query word within its edit budget.
+
+        Returns:
+            list: (book_id, total edit distance) pairs, closest first
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+
+        with self._lock:
+            scores: Optional[Dict[int, int]] = None
+            for word in words:
+                best: Dict[int, int] = {}
+                for candidate, distance in self._matches(word).items():
+                    for book_id in self._postings[candidate]:
+                        if distance < best.get(book_id, MAX_DISTANCE + 1):
+                            best[book_id] = distance
+                if scores is None:
+                    scores = best
+                else:
+                    scores = {b: scores[b] + d for b, d in best.items() if b in scores}
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (item[1], item[0]))
+        return ranked[:limit]
+
+
+# One index per database file, so sharded deployments keep branches apart
+_indexes: Dict[str, FuzzyIndex] = {}
+_index_lock = threading.Lock()
+
+
+def get_fuzzy_index(load_books) -> FuzzyIndex:
+    """Return the index for the current database, building it with load_books() on first use."""
+    path = current_database()
+    index = _indexes.get(path)
+    if index is None:
+        with _index_lock:
+            index = _indexes.get(path)
+            if index is None:
+                index = FuzzyIndex.build(load_books())
+                add_change_listener(_on_change)
+                _indexes[path] = index
+    return index
+
+
+def _on_change(event_type: str, data: Dict):
+    if event_type in ('book_added', 'books_added'):
+        index = _indexes.get(current_database())
+        if index is not None:
+            for book in data['books'] if event_type == 'books_added' else [data]:
+                index.add_book(book['id'], book['title'], book['author'])
@@ -0,0 +1,246 @@
+"""
+ISBN Filter Module - Bloom filter over catalog ISBNs
+Answers "definitely not in the catalog" in memory so adding or importing
+new books skips the duplicate-ISBN query; only possible duplicates are
+checked against SQLite.
+
+ISBNs are keyed by their normalized ISBN-13 form, so "0-306-40615-2",
+"0306406152" and "9780306406157" are the same key. The filter is saved
+next to the database together with the highest book ID it covers; on load,
+books added since then (by this or any other process) are caught up from
+the books table, so a stale file never causes a missed duplicate.
+"""
+
+import hashlib
+import math
+import os
+import struct
+import threading
+from typing import Dict, List, Optional
+
+from database import add_change_listener, current_database, get_db_connection
+
+DEFAULT_CAPACITY = 100_000
+DEFAULT_ERROR_RATE = 0.01
+# Persist after this many additions (the catch-up on load covers anything unsaved)
+SAVE_EVERY = 1000
+
+MAGIC = b'ISBNBF01'
+# magic, bits, capacity, hashes, count, max book id, that book's ISBN, error rate
+HEADER = struct.Struct('<8sQQIQQ32sd')
+
+
+def _digits(raw: str) -> str:
+    return ''.join(c for c in raw.upper() if c.isdigit() or c == 'X')
+
+
+def isbn10_is_valid(isbn: str) -> bool:
+    if len(isbn) != 10 or not isbn[:9].isdigit() or not (isbn[9].isdigit() or isbn[9] == 'X'):
+        return False
+    total = sum((10 - i) * int(c) for i, c in enumerate(isbn[:9]))
+    total += 10 if isbn[9] == 'X' else int(isbn[9])
+    return total % 11 == 0
+
+
+def isbn13_is_valid(isbn: str) -> bool:
+    if len(isbn) != 13 or not isbn.isdigit():
+        return False
+    return sum((3 if i % 2 else 1) * int(c) for i, c in enumerate(isbn)) % 10 == 0
+
+
+def _isbn13_check_digit(first12: str) -> str:
+    return str(-sum((3 if i % 2 else 1) * int(c) for i, c in enumerate(first12)) % 10)
+
+
+def complete_isbn13(first12: str) -> str:
+    """Append the check digit to the first 12 digits of an ISBN-13."""
+    return first12 + _isbn13_check_digit(first12)
+
+
+def normalize_isbn(raw: str) -> Optional[str]:
+    """The ISBN-13 form of a valid ISBN-10 or ISBN-13 (hyphens/spaces ignored), else None."""
+    isbn = _digits(raw or '')
+    if isbn13_is_valid(isbn):
+        return isbn
+    if isbn10_is_valid(isbn):
+        first12 = '978' + isbn[:9]
+        return first12 + _isbn13_check_digit(first12)
+    return None
+
+
+def isbn_forms(raw: str) -> List[str]:
+    """Spellings an equivalent ISBN may be stored under: as given, ISBN-13 and ISBN-10."""
+    forms = [raw]
+    isbn13 = normalize_isbn(raw)
+    if isbn13:
+        forms.append(isbn13)
+        if isbn13.startswith('978'):
+            body = isbn13[3:12]
+            check = -sum((10 - i) * int(c) for i, c in enumerate(body)) % 11
+            forms.append(body + ('X' if check == 10 else str(check)))
+    return list(dict.fromkeys(forms))
+
+
+def filter_key(raw: str) -> str:
+    """Key used in the filter: the ISBN-13 form, or the bare characters of an invalid ISBN."""
+    return normalize_isbn(raw) or _digits(raw or '') or raw
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter with double hashing over a BLAKE2b digest."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE,
+                 bits: Optional[int] = None, hashes: Optional[int] = None, data: Optional[bytearray] = None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = bits or max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = hashes or max(1, round(self.bits / capacity * math.log(2)))
+        self.data = data if data is not None else bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.data[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        data = self.data
+        return all(data[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class IsbnFilter:
+    """Bloom filter of the ISBNs in one database's books table, persisted beside it."""
+
+    def __init__(self, path: str, bloom: BloomFilter, max_book_id: int = 0, last_isbn: str = ''):
+        self.path = path
+        self.bloom = bloom
+        self.max_book_id = max_book_id
+        self.last_isbn = last_isbn
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load_or_build(cls, path: str, capacity: Optional[int] = None) -> 'IsbnFilter':
+        """Load the saved filter and catch up on newer books, or build one from the books table."""
+        isbn_filter = cls._load(path)
+        if isbn_filter is None:
+            book_count = _book_count()
+            capacity = capacity or max(DEFAULT_CAPACITY, 2 * book_count)
+            isbn_filter = cls(path, BloomFilter(capacity))
+        isbn_filter._catch_up()
+        if isbn_filter.bloom.count > isbn_filter.bloom.capacity:
+            # Past capacity the error rate climbs; rebuild at twice the size
+            isbn_filter = cls(path, BloomFilter(2 * isbn_filter.bloom.count, isbn_filter.bloom.error_rate))
+            isbn_filter._catch_up()
+        isbn_filter.save()
+        return isbn_filter
+
+    @classmethod
+    def _load(cls, path: str) -> Optional['IsbnFilter']:
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(HEADER.size)
+                magic, bits, capacity, hashes, count, max_book_id, last_isbn, error_rate = HEADER.unpack(header)
+                data = bytearray(f.read())
+        except (OSError, struct.error):
+            return None
+        if magic != MAGIC or len(data) != (bits + 7) // 8:
+            return None
+        last_isbn = last_isbn.rstrip(b'\0').decode('utf-8', 'replace')
+        if max_book_id and _isbn_of_book(max_book_id) != last_isbn:
+            # The database was replaced or restored since the filter was saved
+            return None
+        bloom = BloomFilter(capacity, error_rate, bits, hashes, data)
+        bloom.count = count
+        return cls(path, bloom, max_book_id, last_isbn)
+
+    def _catch_up(self):
+        """Add books with IDs above max_book_id."""
+        conn = get_db_connection()
+        rows = conn.execute('SELECT id, isbn FROM books WHERE id > ? ORDER BY id', (self.max_book_id,))
+        for row in rows:
+            self.bloom.add(filter_key(row['isbn']))
+            self.max_book_id = row['id']
+            self.last_isbn = row['isbn']
+        conn.close()
+
+    def save(self):
+        """Write the filter atomically."""
+        with self._lock:
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, self.bloom.bits, self.bloom.capacity, self.bloom.hashes,
+                                    self.bloom.count, self.max_book_id, self.last_isbn.encode()[:32],
+                                    self.bloom.error_rate))
+                f.write(self.bloom.data)
+            os.replace(tmp_path, self.path)
+            self._unsaved = 0
+
+    def might_contain(self, isbn: str) -> bool:
+        """False means the ISBN is definitely not in the catalog."""
+        return filter_key(isbn) in self.bloom
+
+    def add(self, isbn: str):
+        """
+        Add an ISBN inserted by this process. max_book_id only advances on
+        catch-up, so books other processes inserted meanwhile are still
+        picked up the next time the filter is loaded.
+        """
+        with self._lock:
+            self.bloom.add(filter_key(isbn))
+            self._unsaved += 1
+            save = self._unsaved >= SAVE_EVERY
+        if save:
+            self.save()
+
+
+def _book_count() -> int:
+    conn = get_db_connection()
+    count = conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+    conn.close()
+    return count
+
+
+def _isbn_of_book(book_id: int) -> Optional[str]:
+    conn = get_db_connection()
+    row = conn.execute('SELECT isbn FROM books WHERE id = ?', (book_id,)).fetchone()
+    conn.close()
+    return row['isbn'] if row else None
+
+
+def filter_path(database_path: str) -> str:
+    """Where the filter for a database is saved: library.db -> library_isbn.bloom."""
+    return f'{os.path.splitext(database_path)[0]}_isbn.bloom'
+
+
+# One filter per database file, so sharded deployments keep branches apart
+_filters: Dict[str, IsbnFilter] = {}
+_filters_lock = threading.Lock()
+
+
+def get_isbn_filter() -> IsbnFilter:
+    """Return the filter for the current database, loading or building it on first use."""
+    path = current_database()
+    isbn_filter = _filters.get(path)
+    if isbn_filter is None:
+        with _filters_lock:
+            isbn_filter = _filters.get(path)
+            if isbn_filter is None:
+                isbn_filter = IsbnFilter.load_or_build(filter_path(path))
+                add_change_listener(_on_change)
+                _filters[path] = isbn_filter
+    return isbn_filter
+
+
+def _on_change(event_type: str, data: Dict):
+    if event_type in ('book_added', 'books_added'):
+        isbn_filter = _filters.get(current_database())
+        if isbn_filter is not None:
+            for book in data['books'] if event_type == 'books_added' else [data]:
+                isbn_filter.add(book['isbn'])
@@ -3,20 +3,38 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from database import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
     insert_book, insert_borrow_record, update_book_availability,
     update_borrow_record_return_date, get_all_books, get_patron_borrowed_books,
-    get_db_connection, init_database 
+    get_db_connection, init_database, to_epoch, from_epoch, SECONDS_PER_DAY,
+    get_patron_borrow_history, get_patron_loans, get_patron_summary,
+    materialize_patron_summary, update_patron_summary, insert_payment, has_open_payment,
+    get_patron_fees_paid, record_payment_refund, PAYMENT_SETTLED, get_books_by_ids,
+    get_books_page, get_book_facets, FACET_SQL, get_books_by_isbns, insert_books
 )
+from services import catalog_snapshot, fuzzy_search, suggest_service
+from services.isbn_filter import get_isbn_filter, isbn_forms, normalize_isbn
+from services.loan_policy import get_loan_policy
 import os
 
 # Ensure DB exists before any operations
 if not os.path.exists("library.db"):
     init_database()
 
+# Number of history rows included in the patron status report
+HISTORY_PAGE_SIZE = 20
+
+# Books per page when browsing the catalog, and the values each facet filter accepts
+CATALOG_PAGE_SIZE = 50
+FACET_VALUES = {
+    "availability": {"available", "unavailable"},
+    "letter": set("ABCDEFGHIJKLMNOPQRSTUVWXYZ#"),
+    "copies": {"1", "2-4", "5-9", "10+"},
+}
+
 def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
     """
     Add a new book to the catalog.
@@ -25,7 +43,7 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
     Args:
         title: Book title (max 200 chars)
         author: Book author (max 100 chars)
-        isbn: 13-digit ISBN
+        isbn: ISBN-10 or ISBN-13 (hyphens and spaces ignored), stored in ISBN-13 form
         total_copies: Number of copies (positive integer)
         
     Returns:
@@ -44,25 +62,75 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
     if len(author.strip()) > 100:
         return False, "Author must be less than 100 characters."
     
-    if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
+    isbn = normalize_isbn(isbn)
+    if isbn is None:
+        return False, "ISBN must be 13 digits (or an ISBN-10) with a valid check digit."
     
     if not isinstance(total_copies, int) or total_copies <= 0:
         return False, "Total copies must be a positive integer."
     
-    # Check for duplicate ISBN
-    existing = get_book_by_isbn(isbn)
-    if existing:
+    # Check for duplicate ISBN; the ISBN filter rules out most new ISBNs
+    # without a query, and catches equivalent ISBN-10/13 spellings
+    maybe_duplicate = get_isbn_filter().might_contain(isbn)
+    if maybe_duplicate and get_books_by_isbns(isbn_forms(isbn)):
         return False, "A book with this ISBN already exists."
     
-    # Insert new book
     # Insert new book
     inserted = insert_book(title.strip(), author.strip(), isbn, total_copies, total_copies)
     if inserted:
+        suggest_service.note_book_added(isbn)
         return True, "Book successfully added to the catalog."
+    # Another process may have added it since this process's filter was loaded
+    if not maybe_duplicate and get_book_by_isbn(isbn):
+        return False, "A book with this ISBN already exists."
     return False, "Database error occurred while adding the book."
 
 
+def import_books(rows: List[Dict]) -> Dict:
+    """
+    Bulk-add books from a vendor feed (dicts with title, author, isbn, total_copies).
+    
+    ISBNs must be valid ISBN-10 or ISBN-13 and are stored in ISBN-13 form.
+    Only ISBNs the filter cannot rule out are looked up in the database,
+    in batches; the rest are inserted in one transaction.
+    
+    Returns:
+        dict: counts of added, duplicate and invalid rows, plus the invalid row numbers
+    """
+    isbn_filter = get_isbn_filter()
+    candidates = []
+    invalid = []
+    seen = set()
+    possible_duplicates = []
+    for n, row in enumerate(rows):
+        title = (row.get("title") or "").strip()
+        author = (row.get("author") or "").strip()
+        isbn = normalize_isbn(str(row.get("isbn") or ""))
+        copies = row.get("total_copies")
+        if (not title or len(title) > 200 or not author or len(author) > 100 or isbn is None
+                or not isinstance(copies, int) or copies <= 0):
+            invalid.append(n)
+            continue
+        if isbn in seen:
+            continue
+        seen.add(isbn)
+        candidates.append((title, author, isbn, copies, copies))
+        if isbn_filter.might_contain(isbn):
+            possible_duplicates.extend(isbn_forms(isbn))
+
+    existing = get_books_by_isbns(possible_duplicates)
+    existing_isbns = {normalize_isbn(isbn) or isbn for isbn in existing}
+    new_books = [book for book in candidates if book[2] not in existing_isbns]
+    added = insert_books(new_books)
+    suggest_service.note_books_added(added)
+    return {
+        "added": len(added),
+        "duplicates": len(rows) - len(invalid) - len(added),
+        "invalid": len(invalid),
+        "invalid_rows": invalid
+    }
+
+
 def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Allow a patron to borrow a book.
@@ -77,10 +145,11 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not book:
         return False, "Book not found."
 
-    # Check patron's borrow limit first
+    # Check patron's borrow limit first (limit and loan period come from the loan policy)
+    rule = get_loan_policy().rule_for(patron_id, book_id)
     current_borrowed = get_patron_borrow_count(patron_id)
-    if current_borrowed >= 5:
-        return False, "You have reached the maximum borrowing limit of 5 books."
+    if current_borrowed >= rule.max_loans:
+        return False, f"You have reached the maximum borrowing limit of {rule.max_loans} books."
 
     # Check availability
     if book.get("available_copies", 0) <= 0:
@@ -88,7 +157,7 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
 
     # Create borrow record
     borrow_date = datetime.now()
-    due_date = borrow_date + timedelta(days=14)
+    due_date = rule.due_date(borrow_date)
 
     borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
     if not borrow_success:
@@ -98,6 +167,8 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not availability_success:
         return False, "Database error occurred while updating book availability."
 
+    update_patron_summary(patron_id, active_delta=1, activity_at=borrow_date)
+    suggest_service.note_book_borrowed(book_id)
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
 
@@ -123,50 +194,117 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
 
     # Calculate fee
     fee_info = calculate_late_fee_for_book(patron_id, book_id)
+    # The summary tracks fees incurred and paid separately, so record the full
+    # fee; payments made before the return are already counted in fees_paid
+    fee_incurred = round(fee_info["fee_amount"] + fee_info.get("amount_paid", 0.0), 2)
+    update_patron_summary(patron_id, active_delta=-1, fees_incurred=fee_incurred,
+                          activity_at=return_date)
     if fee_info["fee_amount"] > 0:
         return True, f'Book "{book["title"]}" returned. Late fee: ${fee_info["fee_amount"]:.2f}'
     else:
         return True, f'Book "{book["title"]}" returned successfully. No late fees.'
 
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
-    """Calculate late fees for a specific book. Implements R5."""
+    """
+    Calculate late fees for a specific book. Implements R5.
+    The returned fee_amount is what is still owed after settled payments.
+    """
     conn = get_db_connection()
     record = conn.execute('''
-        SELECT borrow_date, due_date, return_date 
-        FROM borrow_records 
-        WHERE patron_id = ? AND book_id = ?
-        ORDER BY id DESC LIMIT 1
-    ''', (patron_id, book_id)).fetchone()
+        SELECT br.id, br.borrow_date, br.due_date, br.return_date,
+               (COALESCE(br.return_date, ?) - br.due_date) / ? AS days_overdue,
+               (SELECT COALESCE(SUM(p.amount), 0) FROM payments p
+                WHERE p.borrow_record_id = br.id AND p.status = ?) AS amount_paid
+        FROM borrow_records br
+        WHERE br.patron_id = ? AND br.book_id = ?
+        ORDER BY br.id DESC LIMIT 1
+    ''', (to_epoch(datetime.now()), SECONDS_PER_DAY, PAYMENT_SETTLED, patron_id, book_id)).fetchone()
     conn.close()
 
     if not record:
         return {"fee_amount": 0.0, "days_overdue": 0, "status": "No borrow record found"}
 
-    due_date = datetime.fromisoformat(record["due_date"])
-    return_date = datetime.fromisoformat(record["return_date"]) if record["return_date"] else datetime.now()
-
-    overdue_days = (return_date - due_date).days
+    # Whole days late, computed by SQLite from the integer date columns
+    overdue_days = record["days_overdue"]
     if overdue_days <= 0:
         return {"fee_amount": 0.0, "days_overdue": 0, "status": "On time"}
 
-    fee = 0.0
-    
-    if overdue_days <= 7:
-        fee = 0.5 * overdue_days
-    else:
-        fee = (0.5 * 7) + (1.0 * (overdue_days - 7))
+    fee = get_loan_policy().late_fee(patron_id, book_id, overdue_days)
+    outstanding = round(max(fee - record["amount_paid"], 0.0), 2)
+    return {
+        "fee_amount": outstanding,
+        "days_overdue": overdue_days,
+        "status": "Overdue" if outstanding > 0 else "Paid",
+        "amount_paid": round(record["amount_paid"], 2),
+        "borrow_record_id": record["id"]
+    }
 
-    fee = min(fee, 15.0)
+def get_catalog_books() -> List[Dict]:
+    """All books in title order, from the shared catalog snapshot when one is enabled."""
+    snapshot = catalog_snapshot.get_snapshot()
+    if snapshot is not None:
+        return snapshot.all_books()
+    return get_all_books()
 
+def browse_catalog(filters: Dict[str, str], after_id: Optional[int] = None,
+                   page_size: int = CATALOG_PAGE_SIZE, before_id: Optional[int] = None) -> Dict:
+    """
+    Browse the catalog in title order with facet filters
+    (author, availability, letter, copies).
+    
+    Returns one page of books, the precomputed facet counts for the sidebar
+    and the cursors for the following page (next_after) and the preceding
+    page (prev_before), if any. Unfiltered pages come from the shared catalog
+    snapshot when one is enabled.
+    """
+    active = {}
+    for facet, value in filters.items():
+        value = (value or "").strip()
+        if not value:
+            continue
+        if facet not in FACET_SQL:
+            return {"error": f"Unknown filter: {facet}"}
+        if facet == "letter":
+            value = value.upper()
+        if facet in FACET_VALUES and value not in FACET_VALUES[facet]:
+            return {"error": f"Invalid value for {facet}: {value}"}
+        active[facet] = value
+
+    # One extra row tells whether there is another page in the direction of travel
+    books = None
+    snapshot = catalog_snapshot.get_snapshot()
+    if snapshot is not None and not active:
+        books = snapshot.books_page(page_size + 1, after_id, before_id)
+    if books is None:
+        books = get_books_page(active, page_size + 1, after_id, before_id)
+    if before_id is not None and after_id is None:
+        more_before = len(books) > page_size
+        books = books[-page_size:] if more_before else books
+        next_after = books[-1]["id"] if books else None
+        prev_before = books[0]["id"] if books and more_before else None
+    else:
+        next_after = books[page_size - 1]["id"] if len(books) > page_size else None
+        books = books[:page_size]
+        prev_before = books[0]["id"] if books and after_id is not None else None
     return {
-        "fee_amount": round(fee, 2),
-        "days_overdue": overdue_days,
-        "status": "Overdue"
+        "books": books,
+        "filters": active,
+        "facets": get_book_facets(),
+        "next_after": next_after,
+        "prev_before": prev_before
     }
 
 def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
-    """Search for books in the catalog. Implements R6."""
-    books = get_all_books()
+    """
+    Search for books in the catalog. Implements R6.
+    search_type "fuzzy" matches title/author words allowing small typos, closest first.
+    """
+    if search_type == "fuzzy":
+        matches = fuzzy_search.get_fuzzy_index(get_catalog_books).search(search_term)
+        books_by_id = get_books_by_ids([book_id for book_id, _ in matches])
+        return [books_by_id[book_id] for book_id, _ in matches if book_id in books_by_id]
+
+    books = get_catalog_books()
     term = search_term.lower().strip()
 
     if search_type == "title":
@@ -178,44 +316,79 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     else:
         return []
 
-def get_patron_status_report(patron_id: str) -> Dict:
-    """Get status report for a patron. Implements R7."""
+def get_patron_status_report(patron_id: str, include_archived: bool = False) -> Dict:
+    """
+    Get status report for a patron. Implements R7.
+    
+    Reads the materialized patron summary (built on first access) and adds
+    fees still accruing on current loans. Only the first page of history is
+    included; use get_patron_borrow_history for the rest. Archived loans are
+    left out of the history unless include_archived is set.
+    """
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return {"error": "Invalid patron ID"}
 
-    # Current borrowed
+    summary = get_patron_summary(patron_id) or _materialize_patron_summary(patron_id)
     current = get_patron_borrowed_books(patron_id)
-    count = get_patron_borrow_count(patron_id)
 
-        # Borrow history
-    conn = get_db_connection()
-    result = conn.execute('''
-        SELECT br.*, b.title, b.author
-        FROM borrow_records br
-        JOIN books b ON br.book_id = b.id
-        WHERE br.patron_id = ?
-        ORDER BY br.borrow_date
-    ''', (patron_id,))
+    # Fees on loans still out grow daily, so they are applied at read time
+    now = datetime.now()
+    accrued = sum(get_loan_policy().late_fees(
+        (patron_id, b["book_id"], (now - b["due_date"]).days) for b in current))
+    total_fee = summary["fees_incurred"] + accrued - summary["fees_paid"]
 
-    # ✅ handle both list and sqlite cursor
-    history = result if isinstance(result, list) else result.fetchall()
+    return {
+        "currently_borrowed": current,
+        "borrow_count": summary["active_loans"],
+        "total_late_fees": round(max(total_fee, 0.0), 2),
+        "last_activity": summary["last_activity"],
+        "borrow_history": get_patron_borrow_history(patron_id, HISTORY_PAGE_SIZE,
+                                                    include_archived=include_archived)
+    }
 
-    conn.close()
-    history = [dict(r) for r in history]
 
-    total_fee = 0.0
-    for r in history:
-        fee_info = calculate_late_fee_for_book(patron_id, r["book_id"])
-        total_fee += fee_info["fee_amount"]
+def compute_patron_summary(patron_id: str) -> Dict:
+    """Derive a patron's summary from scratch out of their borrow records."""
+    loans = get_patron_loans(patron_id, include_archived=True)
+    returned = [r for r in loans if r["return_date"] is not None]
+    fees = sum(get_loan_policy().late_fees(
+        (patron_id, r["book_id"], (r["return_date"] - r["due_date"]) // SECONDS_PER_DAY) for r in returned))
+    timestamps = [r["borrow_date"] for r in loans] + [r["return_date"] for r in returned]
 
     return {
-        "currently_borrowed": current,
-        "borrow_count": count,
-        "total_late_fees": round(total_fee, 2),
-        "borrow_history": history
+        "patron_id": patron_id,
+        "active_loans": len(loans) - len(returned),
+        "fees_incurred": round(fees, 2),
+        "fees_paid": round(get_patron_fees_paid(patron_id), 2),
+        "last_activity": from_epoch(max(timestamps)) if timestamps else None
     }
 
 
+def _materialize_patron_summary(patron_id: str) -> Dict:
+    """Build and store a patron's summary row so later updates are incremental."""
+    return materialize_patron_summary(patron_id, lambda: compute_patron_summary(patron_id))
+
+
+def verify_patron_summary(patron_id: str) -> Dict:
+    """
+    Compare the stored summary with a from-scratch computation.
+    
+    Returns:
+        dict: field -> (stored, expected) for every mismatch; empty when consistent
+    """
+    stored = get_patron_summary(patron_id)
+    if stored is None:
+        return {}
+
+    expected = compute_patron_summary(patron_id)
+    mismatches = {}
+    for field in ("active_loans", "fees_incurred", "fees_paid", "last_activity"):
+        value = round(stored[field], 2) if field.startswith("fees_") else stored[field]
+        if value != expected[field]:
+            mismatches[field] = (stored[field], expected[field])
+    return mismatches
+
+
 def pay_late_fees(patron_id: str, book_id: int, payment_gateway) -> Tuple[bool, str]:
     """
     Process a late fee payment for a specific book.
@@ -244,15 +417,57 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway) -> Tuple[bool,
     # Attempt to process payment using external gateway
     try:
         response = payment_gateway.process_payment(patron_id, amount)
-        if response.get("status") == "success":
-            transaction_id = response.get("transaction_id", "UNKNOWN")
-            return True, f"Late fee of ${amount:.2f} paid successfully. Transaction ID: {transaction_id}"
-        else:
-            return False, f"Payment failed: {response.get('error', 'Unknown error')}"
+        success, message = _payment_outcome(response, amount)
+        if success:
+            record_settled_payment(patron_id, book_id, fee_info.get("borrow_record_id"),
+                                   amount, response.get("transaction_id"))
+        return success, message
     except Exception as e:
         return False, f"Payment processing error: {str(e)}"
 
 
+def submit_late_fee_payment(patron_id: str, book_id: int) -> Tuple[bool, str]:
+    """
+    Queue a late fee payment in the payments outbox without waiting for the gateway.
+    The settlement worker (services.payment_worker) charges it in the background.
+
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits."
+
+    fee_info = calculate_late_fee_for_book(patron_id, book_id)
+    if fee_info["fee_amount"] <= 0:
+        return False, "No outstanding late fee for this book."
+
+    record_id = fee_info["borrow_record_id"]
+    amount = fee_info["fee_amount"]
+    # A unique index allows one open payment per loan, so concurrent submits cannot both queue
+    payment_id = insert_payment(patron_id, book_id, record_id, amount)
+    if payment_id is None:
+        if has_open_payment(record_id):
+            return False, "A payment for this late fee is already being processed."
+        return False, "Database error occurred while recording the payment."
+    return True, f"Payment of ${amount:.2f} queued. Payment ID: {payment_id}"
+
+
+def record_settled_payment(patron_id: str, book_id: int, borrow_record_id: Optional[int],
+                           amount: float, transaction_id: Optional[str]):
+    """Persist a payment the gateway has already accepted and credit the patron."""
+    insert_payment(patron_id, book_id, borrow_record_id, amount, PAYMENT_SETTLED, transaction_id)
+    update_patron_summary(patron_id, fees_paid=amount)
+
+
+def _payment_outcome(response: Dict, amount: float) -> Tuple[bool, str]:
+    """Turn a gateway payment response into the (success, message) result."""
+    if response.get("status") == "success":
+        transaction_id = response.get("transaction_id", "UNKNOWN")
+        return True, f"Late fee of ${amount:.2f} paid successfully. Transaction ID: {transaction_id}"
+    else:
+        return False, f"Payment failed: {response.get('error', 'Unknown error')}"
+
+
 def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway) -> Tuple[bool, str]:
     """
     Refund a previously paid late fee.
@@ -277,6 +492,9 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway)
         response = payment_gateway.refund_payment(transaction_id, amount)
         if response.get("status") == "success":
             refund_id = response.get("refund_id", "UNKNOWN")
+            refunded = record_payment_refund(transaction_id, refund_id)
+            if refunded:
+                update_patron_summary(refunded["patron_id"], fees_paid=-refunded["amount"])
             return True, f"Refund of ${amount:.2f} issued successfully. Refund ID: {refund_id}"
         else:
             return False, f"Refund failed: {response.get('error', 'Unknown error')}"
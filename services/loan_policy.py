@@ -0,0 +1,209 @@
+"""
+Loan Policy Module - Borrowing limits, loan periods and late fee rules
+Rules come from a JSON policy (or the built-in default, which is the
+library's original policy: 5 books, 14 days, $0.50/day for the first 7
+days overdue, $1.00/day after that, capped at $15.00).
+
+A policy is compiled once into a table of LoanRule objects keyed by
+(patron class, collection). Each rule carries its late fees precomputed
+per overdue day up to the cap, so evaluating a loan is at most two dict
+lookups and a list index, whether per call or in bulk over many loans.
+
+Policy format (every section except "default" is optional):
+
+    {
+        "default": {"max_loans": 5, "loan_days": 14,
+                    "fee_tiers": [[7, 0.50], [null, 1.00]], "fee_cap": 15.00},
+        "patron_classes": {"faculty": {"patrons": ["100001"], "max_loans": 10, "loan_days": 28}},
+        "collections": {"reserve": {"books": [1, 2], "loan_days": 3}},
+        "rules": [{"patron_class": "faculty", "collection": "reserve", "loan_days": 7}]
+    }
+
+fee_tiers are [up to overdue day, rate per day]; null means no upper end.
+Settings apply in order of precedence: "rules" entries, then the
+collection, then the patron class, then "default". Patrons and books not
+listed belong to the "default" class and collection.
+"""
+
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from database import SECONDS_PER_DAY
+
+DEFAULT = 'default'
+RULE_SETTINGS = ('max_loans', 'loan_days', 'fee_tiers', 'fee_cap')
+
+DEFAULT_POLICY = {
+    'default': {
+        'max_loans': 5,
+        'loan_days': 14,
+        'fee_tiers': [[7, 0.50], [None, 1.00]],
+        'fee_cap': 15.00,
+    }
+}
+
+# Fee tables stop here if the cap is not reached first; later days are computed from the tiers
+MAX_FEE_TABLE_DAYS = 3650
+
+
+class LoanRule:
+    """Compiled settings for one (patron class, collection) pair."""
+
+    __slots__ = ('max_loans', 'loan_days', 'fee_tiers', 'fee_cap', '_fees', '_capped')
+
+    def __init__(self, max_loans: int, loan_days: int, fee_tiers: Sequence, fee_cap: Optional[float]):
+        self.max_loans = max_loans
+        self.loan_days = loan_days
+        self.fee_tiers = tuple((upto, rate) for upto, rate in fee_tiers)
+        self.fee_cap = fee_cap
+        self._fees = self._fee_table()
+        # Past the end of a table that reached the cap, every fee is the cap
+        self._capped = fee_cap is not None and self._fees[-1] >= fee_cap
+
+    def _tiered_fee(self, overdue_days: int) -> float:
+        fee = 0.0
+        start = 0
+        for upto, rate in self.fee_tiers:
+            end = overdue_days if upto is None else min(upto, overdue_days)
+            if end > start:
+                fee += rate * (end - start)
+            if upto is None or upto >= overdue_days:
+                break
+            start = upto
+        if self.fee_cap is not None:
+            fee = min(fee, self.fee_cap)
+        return round(fee, 2)
+
+    def _fee_table(self) -> List[float]:
+        """Fee for 0, 1, 2, ... days overdue, ending at the first day that reaches the cap."""
+        table = [0.0]
+        for days in range(1, MAX_FEE_TABLE_DAYS + 1):
+            table.append(self._tiered_fee(days))
+            if self.fee_cap is not None and table[-1] >= self.fee_cap:
+                break
+        return table
+
+    def due_date(self, borrow_date: datetime) -> datetime:
+        return borrow_date + timedelta(days=self.loan_days)
+
+    def late_fee(self, overdue_days: int) -> float:
+        """Late fee for a loan returned (or still out) overdue_days whole days late."""
+        if overdue_days <= 0:
+            return 0.0
+        fees = self._fees
+        if overdue_days < len(fees):
+            return fees[overdue_days]
+        if self._capped:
+            return fees[-1]
+        return self._tiered_fee(overdue_days)
+
+    def late_fees(self, overdue_days: Iterable[int]) -> List[float]:
+        """late_fee over many loans with the same rule."""
+        fees = self._fees
+        last = len(fees) - 1
+        if self._capped:
+            return [fees[d if d < last else last] if d > 0 else 0.0 for d in overdue_days]
+        return [self.late_fee(d) for d in overdue_days]
+
+
+class LoanPolicy:
+    """A compiled policy: rule lookup by patron and book."""
+
+    def __init__(self, rules: Dict[Tuple[str, str], LoanRule], patron_classes: Dict[str, str],
+                 collections: Dict[int, str]):
+        self._rules = rules
+        self._patron_classes = patron_classes
+        self._collections = collections
+        self.default_rule = rules[(DEFAULT, DEFAULT)]
+
+    @classmethod
+    def compile(cls, policy: Dict) -> 'LoanPolicy':
+        """Validate a policy and build the (patron class, collection) rule table."""
+        if DEFAULT not in policy:
+            raise ValueError("Loan policy needs a 'default' section.")
+        default = dict(DEFAULT_POLICY[DEFAULT], **policy[DEFAULT])
+        classes = policy.get('patron_classes', {})
+        collections = policy.get('collections', {})
+
+        patron_classes = {}
+        for name, section in classes.items():
+            for patron_id in section.get('patrons', []):
+                patron_classes[str(patron_id)] = name
+        book_collections = {}
+        for name, section in collections.items():
+            for book_id in section.get('books', []):
+                book_collections[int(book_id)] = name
+
+        overrides = {}
+        for rule in policy.get('rules', []):
+            key = (rule.get('patron_class', DEFAULT), rule.get('collection', DEFAULT))
+            if (key[0] != DEFAULT and key[0] not in classes) or (key[1] != DEFAULT and key[1] not in collections):
+                raise ValueError(f"Loan policy rule refers to an unknown class or collection: {key}")
+            overrides[key] = rule
+
+        rules = {}
+        for class_name in [DEFAULT, *classes]:
+            for collection in [DEFAULT, *collections]:
+                settings = dict(default)
+                for section in (classes.get(class_name, {}), collections.get(collection, {}),
+                                overrides.get((class_name, collection), {})):
+                    settings.update((k, section[k]) for k in RULE_SETTINGS if k in section)
+                rules[(class_name, collection)] = _compile_rule(settings)
+        return cls(rules, patron_classes, book_collections)
+
+    def rule_for(self, patron_id: str, book_id: int) -> LoanRule:
+        return self._rules[(self._patron_classes.get(patron_id, DEFAULT),
+                            self._collections.get(book_id, DEFAULT))]
+
+    def late_fee(self, patron_id: str, book_id: int, overdue_days: int) -> float:
+        return self.rule_for(patron_id, book_id).late_fee(overdue_days)
+
+    def late_fees(self, loans: Iterable[Tuple[str, int, int]]) -> List[float]:
+        """Late fees for (patron_id, book_id, overdue_days) triples, in order."""
+        if len(self._rules) == 1:
+            # No classes or collections: one pass over the default rule's fee table
+            return self.default_rule.late_fees([days for _, _, days in loans])
+        rules = self._rules
+        classes = self._patron_classes
+        collections = self._collections
+        return [rules[(classes.get(patron_id, DEFAULT), collections.get(book_id, DEFAULT))].late_fee(days)
+                for patron_id, book_id, days in loans]
+
+    def due_dates(self, loans: Iterable[Tuple[str, int, int]]) -> List[int]:
+        """Due dates (epoch seconds) for (patron_id, book_id, borrow epoch) triples."""
+        return [borrowed + self.rule_for(patron_id, book_id).loan_days * SECONDS_PER_DAY
+                for patron_id, book_id, borrowed in loans]
+
+
+def _compile_rule(settings: Dict) -> LoanRule:
+    tiers = settings['fee_tiers']
+    bounds = [upto for upto, _ in tiers]
+    if not tiers or None in bounds[:-1] or any(b <= a for a, b in zip([0] + bounds, bounds) if b is not None):
+        raise ValueError("fee_tiers must be [up to day, rate] pairs with increasing days; only the last may be null.")
+    if int(settings['max_loans']) < 0 or int(settings['loan_days']) <= 0:
+        raise ValueError("max_loans must be non-negative and loan_days positive.")
+    return LoanRule(int(settings['max_loans']), int(settings['loan_days']), tiers,
+                    None if settings['fee_cap'] is None else float(settings['fee_cap']))
+
+
+_policy: LoanPolicy = LoanPolicy.compile(DEFAULT_POLICY)
+
+
+def get_loan_policy() -> LoanPolicy:
+    """Return the active policy."""
+    return _policy
+
+
+def configure_loan_policy(source: Union[str, Dict, None]) -> LoanPolicy:
+    """Compile and activate a policy from a JSON file path or dict; None restores the default."""
+    global _policy
+    if source is None:
+        policy = DEFAULT_POLICY
+    elif isinstance(source, str):
+        with open(source, encoding='utf-8') as f:
+            policy = json.load(f)
+    else:
+        policy = source
+    _policy = LoanPolicy.compile(policy)
+    return _policy
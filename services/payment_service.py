@@ -3,40 +3,75 @@ Mockable Payment Service
 Simulates external payment processing (for testing with mocks/stubs).
 """
 
+import asyncio
 import random
 import string
 import time
+from typing import Dict, Optional
 
 class PaymentGateway:
     """A mockable external payment gateway class."""
 
-    def process_payment(self, patron_id: str, amount: float) -> dict:
+    def __init__(self):
+        self._charges = {}
+
+    def process_payment(self, patron_id: str, amount: float, idempotency_key: Optional[str] = None) -> dict:
         """
         Simulates sending a payment request to an external service.
-        In a real system, this would call an API.
+        In a real system, this would call an API. A repeated idempotency_key
+        returns the first successful charge instead of charging again.
         """
         # Simulate network latency
         time.sleep(0.1)
-
-        # Fake success or failure randomly for realism
-        if amount <= 0:
-            return {"status": "failed", "error": "Invalid amount"}
-
-        if random.random() < 0.9:
-            transaction_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
-            return {"status": "success", "transaction_id": transaction_id}
-        else:
-            return {"status": "failed", "error": "Network error"}
+        return _simulated_payment(amount, idempotency_key, self._charges)
 
     def refund_payment(self, transaction_id: str, amount: float) -> dict:
         """Simulates refund processing."""
         time.sleep(0.1)
+        return _simulated_refund(transaction_id, amount)
+
+
+class AsyncPaymentGateway:
+    """Asyncio variant of PaymentGateway; waits on the network without holding a thread."""
+
+    def __init__(self, latency: float = 0.1):
+        self.latency = latency
+        self._charges = {}
+
+    async def process_payment(self, patron_id: str, amount: float, idempotency_key: Optional[str] = None) -> dict:
+        """Simulates an awaitable payment request to an external service."""
+        await asyncio.sleep(self.latency)
+        return _simulated_payment(amount, idempotency_key, self._charges)
+
+    async def refund_payment(self, transaction_id: str, amount: float) -> dict:
+        """Simulates awaitable refund processing."""
+        await asyncio.sleep(self.latency)
+        return _simulated_refund(transaction_id, amount)
+
+
+def _simulated_payment(amount: float, idempotency_key: Optional[str], charges: Dict[str, dict]) -> dict:
+    # Fake success or failure randomly for realism
+    if amount <= 0:
+        return {"status": "failed", "error": "Invalid amount"}
+    if idempotency_key in charges:
+        return charges[idempotency_key]
+
+    if random.random() < 0.9:
+        transaction_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+        response = {"status": "success", "transaction_id": transaction_id}
+        if idempotency_key is not None:
+            charges[idempotency_key] = response
+        return response
+    else:
+        return {"status": "failed", "error": "Network error"}
+
 
-        if not transaction_id:
-            return {"status": "failed", "error": "Missing transaction ID"}
+def _simulated_refund(transaction_id: str, amount: float) -> dict:
+    if not transaction_id:
+        return {"status": "failed", "error": "Missing transaction ID"}
 
-        if amount <= 0:
-            return {"status": "failed", "error": "Invalid refund amount"}
+    if amount <= 0:
+        return {"status": "failed", "error": "Invalid refund amount"}
 
-        refund_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-        return {"status": "success", "refund_id": refund_id}
+    refund_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+    return {"status": "success", "refund_id": refund_id}
@@ -0,0 +1,251 @@
+"""
+Payment Worker Module - Background settlement of the payments outbox
+Drains pending late fee payments against the PaymentGateway with retries
+and exponential backoff, recording transaction IDs as payments settle.
+
+Each charge carries the payment's idempotency key, so a payment claimed
+again after its lease expired (while the first gateway call was still
+running) is not charged twice by a gateway that honours the key. A charge
+that succeeds after its claim was lost is still recorded; if the payment
+had meanwhile settled under a different transaction, that charge is
+refunded.
+
+PaymentSettlementWorker charges from a pool of threads; the ASGI app uses
+AsyncPaymentSettlementWorker, which awaits an AsyncPaymentGateway on the
+event loop so a charge in flight holds no thread.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from database import (
+    claim_due_payments, settle_payment, settle_unclaimed_payment, retry_payment, fail_payment,
+    get_payment, update_patron_summary
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentSettlementWorker:
+    """
+    Pool of threads settling queued payments.
+
+    Each thread claims one due payment at a time, immediately before charging
+    it, so a claim's lease only has to cover a single gateway call. Failed
+    attempts are rescheduled with jittered exponential backoff until
+    max_attempts is reached.
+    """
+
+    def __init__(self, payment_gateway, workers: int = 4, max_attempts: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 300.0,
+                 poll_interval: float = 0.5, lease_seconds: int = 60):
+        self.payment_gateway = payment_gateway
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def start(self):
+        """Start the worker threads."""
+        if self._threads:
+            return
+        self._stop.clear()
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'payment-worker-{n}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, wait: bool = True):
+        """Stop claiming new payments; optionally wait for in-flight ones."""
+        self._stop.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.settle_next():
+                self._stop.wait(self.poll_interval)
+
+    def settle_next(self) -> bool:
+        """Claim and attempt the next due payment; False when none is due."""
+        claimed = claim_due_payments(1, self.lease_seconds)
+        for payment in claimed:
+            self.process(payment)
+        return bool(claimed)
+
+    def drain(self) -> int:
+        """Settle everything currently due on the calling thread; returns payments attempted."""
+        attempted = 0
+        while self.settle_next():
+            attempted += 1
+        return attempted
+
+    def process(self, payment: Dict) -> bool:
+        """Attempt one claimed payment; returns True when it settled."""
+        try:
+            response = self.payment_gateway.process_payment(payment['patron_id'], payment['amount'],
+                                                            idempotency_key=idempotency_key(payment))
+        except Exception as e:
+            response = {'status': 'failed', 'error': str(e)}
+
+        outcome = record_attempt(payment, response, self.max_attempts,
+                                 retry_at(payment, self.base_delay, self.max_delay))
+        if outcome == DUPLICATE_CHARGE:
+            try:
+                refund = self.payment_gateway.refund_payment(response['transaction_id'], payment['amount'])
+            except Exception as e:
+                refund = {'status': 'failed', 'error': str(e)}
+            log_duplicate_refund(payment, response['transaction_id'], refund)
+        return outcome == SETTLED
+
+
+class AsyncPaymentSettlementWorker:
+    """
+    Event-loop counterpart of PaymentSettlementWorker.
+
+    `workers` tasks each claim one due payment at a time through run_db (a
+    coroutine function running blocking calls off the loop) and await the
+    gateway's process_payment coroutine. start() and stop() must be called
+    from the loop that runs the tasks, e.g. in an ASGI lifespan.
+    """
+
+    def __init__(self, payment_gateway, run_db, workers: int = 4, max_attempts: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 300.0,
+                 poll_interval: float = 0.5, lease_seconds: int = 60):
+        self.payment_gateway = payment_gateway
+        self.run_db = run_db
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._stop = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        """Start the worker tasks on the running event loop."""
+        if self._tasks:
+            return
+        self._stop = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(), name=f'payment-worker-{n}')
+                       for n in range(self.workers)]
+
+    async def stop(self):
+        """Stop claiming new payments and wait for in-flight ones."""
+        if self._stop is not None:
+            self._stop.set()
+        tasks, self._tasks = self._tasks, []
+        await asyncio.gather(*tasks)
+
+    async def _run(self):
+        while not self._stop.is_set():
+            if not await self.settle_next():
+                try:
+                    await asyncio.wait_for(self._stop.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def settle_next(self) -> bool:
+        """Claim and attempt the next due payment; False when none is due."""
+        claimed = await self.run_db(claim_due_payments, 1, self.lease_seconds)
+        for payment in claimed:
+            await self.process(payment)
+        return bool(claimed)
+
+    async def drain(self) -> int:
+        """Settle everything currently due on the calling task; returns payments attempted."""
+        attempted = 0
+        while await self.settle_next():
+            attempted += 1
+        return attempted
+
+    async def process(self, payment: Dict) -> bool:
+        """Attempt one claimed payment; returns True when it settled."""
+        try:
+            response = await self.payment_gateway.process_payment(payment['patron_id'], payment['amount'],
+                                                                  idempotency_key=idempotency_key(payment))
+        except Exception as e:
+            response = {'status': 'failed', 'error': str(e)}
+
+        outcome = await self.run_db(record_attempt, payment, response, self.max_attempts,
+                                    retry_at(payment, self.base_delay, self.max_delay))
+        if outcome == DUPLICATE_CHARGE:
+            try:
+                refund = await self.payment_gateway.refund_payment(response['transaction_id'], payment['amount'])
+            except Exception as e:
+                refund = {'status': 'failed', 'error': str(e)}
+            log_duplicate_refund(payment, response['transaction_id'], refund)
+        return outcome == SETTLED
+
+
+SETTLED = 'settled'
+DUPLICATE_CHARGE = 'duplicate'
+
+
+def retry_at(payment: Dict, base_delay: float, max_delay: float) -> datetime:
+    """When to try a payment again if this attempt fails: jittered exponential backoff."""
+    delay = min(max_delay, base_delay * 2 ** payment['attempts'])
+    return datetime.now() + timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def idempotency_key(payment: Dict) -> str:
+    """Gateway idempotency key for a payment, the same across every attempt and claim."""
+    return f"late-fee-payment-{payment['id']}"
+
+
+def record_attempt(payment: Dict, response: Dict, max_attempts: int, retry_at: datetime) -> Optional[str]:
+    """
+    Store the outcome of one gateway attempt for a claimed payment.
+    Returns SETTLED when the payment settled, DUPLICATE_CHARGE when the
+    charge succeeded but the payment had already settled under another
+    transaction (the caller refunds it), else None.
+    """
+    token = payment['claim_token']
+    attempts = payment['attempts'] + 1
+    if response.get('status') == 'success':
+        transaction_id = response.get('transaction_id', 'UNKNOWN')
+        # The patron was charged even if this worker's claim expired meanwhile,
+        # so record the transaction unless the payment has already settled
+        if settle_payment(payment['id'], token, transaction_id) or \
+                settle_unclaimed_payment(payment['id'], transaction_id):
+            update_patron_summary(payment['patron_id'], fees_paid=payment['amount'])
+            return SETTLED
+        current = get_payment(payment['id'])
+        if current is not None and current['transaction_id'] != transaction_id:
+            return DUPLICATE_CHARGE
+        return None
+
+    error = response.get('error', 'Unknown error')
+    if attempts >= max_attempts:
+        fail_payment(payment['id'], token, attempts, error)
+    else:
+        retry_payment(payment['id'], token, attempts, retry_at, error)
+    return None
+
+
+def log_duplicate_refund(payment: Dict, transaction_id: str, refund: Dict):
+    if refund.get('status') == 'success':
+        logger.warning('Payment %s was charged twice; refunded transaction %s (refund %s)',
+                       payment['id'], transaction_id, refund.get('refund_id'))
+    else:
+        logger.error('Payment %s was charged twice; refunding transaction %s failed: %s',
+                     payment['id'], transaction_id, refund.get('error', 'Unknown error'))
@@ -0,0 +1,247 @@
+"""
+Rate Limiting Module - Token buckets and admission control for write endpoints
+Protects the single SQLite writer from bursts of borrow/return POSTs and from
+clients polling the late fee API. API clients get 429/503 JSON errors;
+HTML form submissions are redirected back to their form with a flash
+message. Both carry Retry-After.
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+
+from flask import flash, g, jsonify, redirect, request, url_for
+
+# Endpoints guarded by the limiter; borrowing routes only for POST
+LIMITED_ENDPOINTS = {'borrowing.borrow_book', 'borrowing.return_book', 'api.get_late_fee',
+                     'api.pay_late_fee_api'}
+WRITE_ENDPOINTS = {'borrowing.borrow_book', 'borrowing.return_book', 'api.pay_late_fee_api'}
+# HTML form endpoints and the page holding their form; refused submissions flash and go back there
+FORM_PAGES = {'borrowing.borrow_book': 'catalog.catalog', 'borrowing.return_book': 'borrowing.return_book'}
+
+DEFAULT_CONFIG = {
+    'RATE_LIMIT_ENABLED': True,
+    'RATE_LIMIT_IP': (10.0, 20),        # (tokens per second, burst capacity)
+    'RATE_LIMIT_PATRON': (1.0, 5),
+    'RATE_LIMIT_STORAGE': None,         # None for in-memory, or a SQLite path shared by workers
+    'RATE_LIMIT_MAX_KEYS': 10000,       # in-memory buckets kept before evicting the least recently used
+    'MAX_IN_FLIGHT_WRITES': 16,
+    'WRITE_LATENCY_SLO_MS': 500,
+    'WRITE_LATENCY_WINDOW': 50,
+    'SHED_COOLDOWN_SECONDS': 5,
+}
+
+
+class MemoryBucketStore:
+    """
+    Token buckets held in process memory, bounded to max_keys. The least
+    recently used bucket is evicted first; a client that comes back after
+    eviction simply starts with a full bucket again.
+    """
+
+    def __init__(self, max_keys: int = DEFAULT_CONFIG['RATE_LIMIT_MAX_KEYS']):
+        self.max_keys = max_keys
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, capacity: int, now: float) -> Tuple[bool, float]:
+        """
+        Take one token from the bucket for `key`.
+        
+        Returns:
+            tuple: (allowed: bool, retry_after: seconds until a token is available)
+        """
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens, allowed, retry_after = _refill_and_take(tokens, updated, rate, capacity, now)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed, retry_after
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBucketStore:
+    """Token buckets in a SQLite file, so several worker processes share limits."""
+
+    def __init__(self, path: str):
+        self.path = path
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        return conn
+
+    def take(self, key: str, rate: float, capacity: int, now: float) -> Tuple[bool, float]:
+        """
+        Take one token inside an IMMEDIATE transaction (see MemoryBucketStore.take).
+        If the bucket file stays locked past the timeout the request is let
+        through: the admission controller still bounds writes, and a busy
+        limiter should not turn into 500s.
+        """
+        try:
+            conn = self._connect()
+        except sqlite3.OperationalError:
+            return True, 0.0
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens, allowed, retry_after = _refill_and_take(tokens, updated, rate, capacity, now)
+            conn.execute('''
+                INSERT INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+            ''', (key, tokens, now))
+            conn.execute('COMMIT')
+            return allowed, retry_after
+        except sqlite3.OperationalError:
+            return True, 0.0
+        finally:
+            conn.close()
+
+
+def _refill_and_take(tokens: float, updated: float, rate: float, capacity: int, now: float):
+    """Refill a bucket for the elapsed time and try to take one token."""
+    tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, True, 0.0
+    return tokens, False, (1 - tokens) / rate
+
+
+class AdmissionController:
+    """
+    Bounds concurrent write requests and sheds load once write latency
+    breaches its SLO, backing off for a cooldown period before re-admitting.
+    """
+
+    def __init__(self, max_in_flight: int, slo_ms: float, window: int, cooldown: float,
+                 clock=time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.slo = slo_ms / 1000.0
+        self.cooldown = cooldown
+        self._clock = clock
+        self._latencies = deque(maxlen=window)
+        self._in_flight = 0
+        self._shed_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_enter(self) -> Tuple[bool, float]:
+        """Reserve a write slot; returns (admitted, retry_after)."""
+        with self._lock:
+            now = self._clock()
+            if now < self._shed_until:
+                return False, self._shed_until - now
+            if self._in_flight >= self.max_in_flight:
+                return False, 1.0
+            self._in_flight += 1
+            return True, 0.0
+
+    def leave(self, latency: float):
+        """Release a write slot and record how long the request took."""
+        with self._lock:
+            self._in_flight -= 1
+            self._latencies.append(latency)
+            if len(self._latencies) == self._latencies.maxlen and self._p95() > self.slo:
+                self._shed_until = self._clock() + self.cooldown
+                self._latencies.clear()
+
+    def _p95(self) -> float:
+        ordered = sorted(self._latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+
+class RateLimiter:
+    """Applies the per-IP and per-patron buckets plus write admission control."""
+
+    def __init__(self, config: Dict, clock=time.time):
+        self.config = config
+        self._clock = clock
+        storage = config['RATE_LIMIT_STORAGE']
+        self.store = SQLiteBucketStore(storage) if storage else MemoryBucketStore(config['RATE_LIMIT_MAX_KEYS'])
+        self.admission = AdmissionController(
+            config['MAX_IN_FLIGHT_WRITES'], config['WRITE_LATENCY_SLO_MS'],
+            config['WRITE_LATENCY_WINDOW'], config['SHED_COOLDOWN_SECONDS'])
+
+    def check_buckets(self, client_ip: str, patron_id: Optional[str]) -> Tuple[bool, float]:
+        """Take a token for the client IP and, if known, the patron."""
+        now = self._clock()
+        allowed, retry_after = self.store.take(f'ip:{client_ip}', *self.config['RATE_LIMIT_IP'], now)
+        if allowed and patron_id:
+            allowed, retry_after = self.store.take(f'patron:{patron_id}', *self.config['RATE_LIMIT_PATRON'], now)
+        return allowed, retry_after
+
+
+def _valid_patron_id(patron_id: Optional[str]) -> bool:
+    return bool(patron_id) and patron_id.isdigit() and len(patron_id) == 6
+
+
+def _too_busy(status: int, message: str, retry_after: float):
+    """JSON error for API clients; for form submissions, a flash message and a redirect to the form."""
+    seconds = max(1, math.ceil(retry_after))
+    page = FORM_PAGES.get(request.endpoint)
+    if page is not None:
+        flash(f'{message} Try again in {seconds} second{"s" if seconds != 1 else ""}.', 'error')
+        response = redirect(url_for(page), 303)
+    else:
+        response = jsonify({'error': message})
+        response.status_code = status
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+
+def init_rate_limiting(app):
+    """Install the rate limiter as before/after-request hooks on the Flask app."""
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    if not app.config['RATE_LIMIT_ENABLED']:
+        return
+
+    limiter = RateLimiter(app.config)
+    app.extensions['rate_limiter'] = limiter
+
+    @app.before_request
+    def _limit_request():
+        endpoint = request.endpoint
+        if endpoint not in LIMITED_ENDPOINTS:
+            return None
+        if endpoint in WRITE_ENDPOINTS and request.method != 'POST':
+            return None
+
+        patron_id = request.form.get('patron_id') or (request.view_args or {}).get('patron_id')
+        if not _valid_patron_id(patron_id):
+            # Malformed IDs are rejected by the route; don't give each one its own bucket
+            patron_id = None
+        allowed, retry_after = limiter.check_buckets(request.remote_addr or 'unknown', patron_id)
+        if not allowed:
+            return _too_busy(429, 'Too many requests. Please slow down.', retry_after)
+
+        if endpoint in WRITE_ENDPOINTS:
+            admitted, retry_after = limiter.admission.try_enter()
+            if not admitted:
+                return _too_busy(503, 'Service busy. Please retry shortly.', retry_after)
+            g.write_started = time.monotonic()
+        return None
+
+    @app.teardown_request
+    def _release_write_slot(exc):
+        started = g.pop('write_started', None)
+        if started is not None:
+            limiter.admission.leave(time.monotonic() - started)
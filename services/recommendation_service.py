@@ -0,0 +1,238 @@
+"""
+Recommendation Service Module - "Patrons who borrowed this also borrowed"
+Keeps a sparse co-occurrence index of book pairs borrowed by the same
+patron. Each book holds a bounded candidate table of neighbour counts,
+pruned to the strongest TOP_K * CANDIDATE_FACTOR entries, so memory grows
+with the catalog rather than with the number of pairs.
+
+The index is updated on every new loan (a patron's first borrow of a book
+pairs it with each book they borrowed before) and can be rebuilt from the
+full history in patron chunks, counting each chunk's pairs with one
+Counter.update over all baskets.
+
+For live updates the index keeps the recent baskets of recently active
+patrons: each patron's last RECENT_BOOKS distinct books, for at most
+RECENT_PATRONS patrons, least recently active evicted first. A loan by a
+patron already held is applied from the event payload alone; otherwise
+their recent books are read once from the live loans table. New loans pair
+only with the patron's recent books, and the periodic rebuild counts the
+full history again.
+"""
+
+import heapq
+import threading
+from collections import Counter, OrderedDict
+from itertools import chain, combinations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database import (
+    add_change_listener, current_database, get_max_borrow_record_id, get_patron_baskets,
+    get_patron_recent_book_ids
+)
+
+TOP_K = 20
+# Candidates kept per book beyond TOP_K, so neighbours can climb into the top
+CANDIDATE_FACTOR = 5
+REBUILD_CHUNK_PATRONS = 2000
+# Live updates pair a new loan with the patron's last RECENT_BOOKS distinct books,
+# kept for the RECENT_PATRONS most recently active patrons
+RECENT_BOOKS = 50
+RECENT_PATRONS = 10000
+
+
+class CoBorrowIndex:
+    """Per-book neighbour counts, bounded by top-k pruning."""
+
+    def __init__(self, top_k: int = TOP_K, candidate_factor: int = CANDIDATE_FACTOR,
+                 recent_books: int = RECENT_BOOKS, recent_patrons: int = RECENT_PATRONS):
+        self.top_k = top_k
+        self.capacity = top_k * candidate_factor
+        self.recent_books = recent_books
+        self.recent_patrons = recent_patrons
+        self._neighbors: Dict[int, Dict[int, int]] = {}
+        self._top: Dict[int, List[Tuple[int, int]]] = {}
+        # patron -> their recent books in borrow order (dict keys), most recently active patron last
+        self._baskets: 'OrderedDict[str, Dict[int, None]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Number of (book, neighbour) entries held."""
+        return sum(len(n) for n in self._neighbors.values())
+
+    def add_pair_counts(self, pair_counts: Iterable[Tuple[Tuple[int, int], int]]):
+        """Add co-borrow counts for unordered book pairs."""
+        with self._lock:
+            self._add_pair_counts(pair_counts)
+
+    def _add_pair_counts(self, pair_counts: Iterable[Tuple[Tuple[int, int], int]]):
+        touched = set()
+        for (a, b), count in pair_counts:
+            self._bump(a, b, count)
+            self._bump(b, a, count)
+            touched.add(a)
+            touched.add(b)
+        for book_id in touched:
+            self._prune(book_id)
+            self._top.pop(book_id, None)
+
+    def add_baskets(self, baskets: Iterable[List[int]]):
+        """Add patrons' histories (distinct books each) counted in bulk, as in a rebuild."""
+        pair_counts = count_basket_pairs(baskets)
+        with self._lock:
+            self._add_pair_counts(pair_counts.items())
+
+    def has_recent_books(self, patron_id: str) -> bool:
+        return patron_id in self._baskets
+
+    def set_recent_books(self, patron_id: str, book_ids: List[int]):
+        """Seed a patron's recent books (oldest first) unless a loan already did."""
+        with self._lock:
+            if patron_id not in self._baskets:
+                self._baskets[patron_id] = dict.fromkeys(book_ids[-self.recent_books:])
+                self._evict_patrons()
+
+    def record_loan(self, patron_id: str, book_id: int):
+        """Record a loan; a patron's first borrow of a book pairs it with their recent books."""
+        with self._lock:
+            basket = self._baskets.get(patron_id)
+            if basket is None:
+                basket = self._baskets[patron_id] = {}
+                self._evict_patrons()
+            else:
+                self._baskets.move_to_end(patron_id)
+            if book_id in basket:
+                return
+            self._add_pair_counts(((book_id, other), 1) for other in basket)
+            basket[book_id] = None
+            if len(basket) > self.recent_books:
+                del basket[next(iter(basket))]
+
+    def _evict_patrons(self):
+        while len(self._baskets) > self.recent_patrons:
+            self._baskets.popitem(last=False)
+
+    def _bump(self, book_id: int, neighbor: int, count: int):
+        counts = self._neighbors.get(book_id)
+        if counts is None:
+            counts = self._neighbors[book_id] = {}
+        counts[neighbor] = counts.get(neighbor, 0) + count
+
+    def _prune(self, book_id: int):
+        # Let the table grow to twice its capacity so pruning is amortized
+        counts = self._neighbors[book_id]
+        if len(counts) > 2 * self.capacity:
+            kept = heapq.nlargest(self.capacity, counts.items(), key=lambda item: (item[1], -item[0]))
+            self._neighbors[book_id] = dict(kept)
+
+    def related(self, book_id: int, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        """Top neighbours of a book as (book_id, co-borrow count), strongest first."""
+        limit = self.top_k if limit is None else min(limit, self.top_k)
+        top = self._top.get(book_id)
+        if top is None:
+            with self._lock:
+                counts = self._neighbors.get(book_id, {})
+                top = heapq.nlargest(self.top_k, counts.items(), key=lambda item: (item[1], -item[0]))
+                self._top[book_id] = top
+        return top[:limit]
+
+
+def count_basket_pairs(baskets: Iterable[List[int]]) -> Counter:
+    """Count every unordered pair of books that share a basket (baskets sorted, distinct)."""
+    counts = Counter()
+    counts.update(chain.from_iterable(combinations(books, 2) for books in baskets))
+    return counts
+
+
+def build_index(chunk_patrons: int = REBUILD_CHUNK_PATRONS,
+                max_record_id: Optional[int] = None) -> CoBorrowIndex:
+    """Build an index from the borrow history (up to max_record_id), a chunk of patrons at a time."""
+    if max_record_id is None:
+        max_record_id = get_max_borrow_record_id()
+    index = CoBorrowIndex()
+    after = ''
+    while True:
+        chunk = get_patron_baskets(after, chunk_patrons, max_record_id)
+        if not chunk:
+            return index
+        index.add_baskets(books for _, books in chunk)
+        after = chunk[-1][0]
+
+
+# One index per database file, so sharded deployments keep branches apart
+_indexes: Dict[str, CoBorrowIndex] = {}
+_index_lock = threading.RLock()
+_rebuild_lock = threading.Lock()
+# Per database, loans seen while a rebuild runs, replayed onto the new index before it is swapped in
+_pending: Dict[str, List[Dict]] = {}
+
+
+def get_recommendation_index() -> CoBorrowIndex:
+    """Return the index for the current database, building it from the history on first use."""
+    path = current_database()
+    index = _indexes.get(path)
+    if index is None:
+        with _index_lock:
+            index = _indexes.get(path) or rebuild_index()
+    return index
+
+
+def rebuild_index(chunk_patrons: int = REBUILD_CHUNK_PATRONS) -> CoBorrowIndex:
+    """Rebuild from the full history and swap the new index in without losing concurrent loans."""
+    path = current_database()
+    with _index_lock:
+        with _rebuild_lock:
+            _pending[path] = []
+        add_change_listener(_on_change)
+        max_record_id = get_max_borrow_record_id()
+        index = build_index(chunk_patrons, max_record_id)
+        with _rebuild_lock:
+            for loan in _pending.pop(path):
+                if loan['id'] > max_record_id:
+                    _apply_loan(index, loan)
+            _indexes[path] = index
+        return index
+
+
+def _apply_loan(index: CoBorrowIndex, loan: Dict):
+    patron_id = loan['patron_id']
+    if not index.has_recent_books(patron_id):
+        index.set_recent_books(patron_id, get_patron_recent_book_ids(patron_id, index.recent_books, loan['id'] - 1))
+    index.record_loan(patron_id, loan['book_id'])
+
+
+def _on_change(event_type: str, data: Dict):
+    if event_type != 'loan_created':
+        return
+    path = current_database()
+    with _rebuild_lock:
+        if path in _pending:
+            _pending[path].append(data)
+            return
+        index = _indexes.get(path)
+    if index is not None:
+        _apply_loan(index, data)
+
+
+class RebuildWorker:
+    """Background thread that periodically rebuilds the index from history."""
+
+    def __init__(self, interval: float = 24 * 3600.0):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='recommendation-rebuild', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rebuild_index()
@@ -0,0 +1,58 @@
+"""
+Rendering Module - Compiled template and table row caching
+Stores compiled Jinja templates in a bytecode cache on disk, so new
+workers skip parsing and compiling templates, and renders catalog and
+search table rows through book_rows(), which reuses each book's rendered
+row until its copy counts change.
+
+Rows are cached in a FragmentCache keyed by (database, id,
+available_copies, total_copies) per row variant and script root. Title,
+author and ISBN never change after a book is added, and the borrow form's
+URL only depends on the script root, so a cached row is always current.
+"""
+
+import os
+
+from flask import request
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+from services.serialization import FRAGMENT_CACHE_SIZE, FragmentCache
+
+DEFAULT_CONFIG = {
+    'TEMPLATE_BYTECODE_CACHE': True,    # True for a per-user temp directory, a path, or False
+    'TEMPLATE_ROW_CACHE_SIZE': FRAGMENT_CACHE_SIZE,
+}
+
+# Row variant -> (patron ID placeholder, input width in px)
+ROW_VARIANTS = {
+    'catalog': ('Patron ID (6 digits)', 120),
+    'search': ('Patron ID', 100),
+}
+
+ROW_TEMPLATE = '_book_row.html'
+
+
+def init_rendering(app):
+    """Install the bytecode cache and the book_rows template global."""
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+
+    cache_dir = app.config['TEMPLATE_BYTECODE_CACHE']
+    if cache_dir is True:
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+    elif cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+    row_cache = FragmentCache(app.config['TEMPLATE_ROW_CACHE_SIZE'])
+    app.extensions['row_cache'] = row_cache
+
+    @app.template_global()
+    def book_rows(books, variant='catalog'):
+        """Table rows for books, rendering only those not already cached."""
+        placeholder, input_width = ROW_VARIANTS[variant]
+        book_row = app.jinja_env.get_template(ROW_TEMPLATE).module.book_row
+        rows = row_cache.fragments(books, f'{variant}:{request.script_root}',
+                                   lambda book: str(book_row(book, placeholder, input_width)))
+        return Markup('\n'.join(rows))
@@ -0,0 +1,236 @@
+"""
+Serialization Module - Content-negotiated API responses
+Encodes API payloads as JSON (orjson when installed) or MessagePack,
+chosen from the Accept header. Book lists are assembled from cached,
+pre-encoded per-book fragments joined by concatenation, so a large search
+result does not re-encode every row on every request.
+
+A book fragment is keyed by its database, id, available_copies and
+total_copies: the copy counts are the only columns that change after a
+book is inserted, so the key doubles as the row's version. With orjson
+installed, JSON lists skip the cache: orjson encodes a whole list faster
+than the cache can be probed (see benchmarks/bench_serialization.py).
+"""
+
+import json
+import struct
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from flask import Response, request
+
+from database import current_database
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # the built-in encoder below is used instead
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+_MSGPACK_ALIASES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+BOOK_FIELDS = frozenset(('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies'))
+FRAGMENT_CACHE_SIZE = 100_000
+
+
+def dumps_json(obj) -> bytes:
+    """Compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+
+def _pack(obj, out: bytearray):
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xff)
+        elif 0 <= obj <= 0xffffffff:
+            out += struct.pack('>BI', 0xce, obj) if obj > 0xffff else struct.pack('>BH', 0xcd, obj)
+        elif 0 <= obj <= 0xffffffffffffffff:
+            out += struct.pack('>BQ', 0xcf, obj)
+        else:
+            out += struct.pack('>Bq', 0xd3, obj)
+    elif isinstance(obj, float):
+        out += struct.pack('>Bd', 0xcb, obj)
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        size = len(data)
+        if size < 32:
+            out.append(0xa0 | size)
+        elif size < 0x100:
+            out += struct.pack('>BB', 0xd9, size)
+        elif size < 0x10000:
+            out += struct.pack('>BH', 0xda, size)
+        else:
+            out += struct.pack('>BI', 0xdb, size)
+        out += data
+    elif isinstance(obj, (list, tuple)):
+        out += _array_header(len(obj))
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        out += _map_header(len(obj))
+        for key, value in obj.items():
+            _pack(str(key), out)
+            _pack(value, out)
+    else:
+        _pack(str(obj), out)
+
+
+def _array_header(size: int) -> bytes:
+    if size < 16:
+        return bytes((0x90 | size,))
+    if size < 0x10000:
+        return struct.pack('>BH', 0xdc, size)
+    return struct.pack('>BI', 0xdd, size)
+
+
+def _map_header(size: int) -> bytes:
+    if size < 16:
+        return bytes((0x80 | size,))
+    if size < 0x10000:
+        return struct.pack('>BH', 0xde, size)
+    return struct.pack('>BI', 0xdf, size)
+
+
+def dumps_msgpack(obj) -> bytes:
+    """MessagePack encoding (the msgpack package when installed)."""
+    if msgpack is not None:
+        return msgpack.packb(obj, default=str)
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+_ENCODERS = {JSON: dumps_json, MSGPACK: dumps_msgpack}
+
+
+class FragmentCache:
+    """
+    LRU cache of per-book fragments, keyed by (database, id, available_copies,
+    total_copies) within each kind (an encoding format, or a rendered row variant).
+    """
+
+    def __init__(self, max_entries: int = FRAGMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: Dict[str, OrderedDict] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fragments(self, books: List[Dict], kind: str, encode: Optional[Callable] = None) -> List:
+        """Fragments for books in order, producing missing ones with encode(book)."""
+        encode = encode or _ENCODERS[kind]
+        database = current_database()
+        result = []
+        misses = []
+        with self._lock:
+            entries = self._entries.setdefault(kind, OrderedDict())
+            for book in books:
+                if book.keys() == BOOK_FIELDS:
+                    key = (database, book['id'], book['available_copies'], book['total_copies'])
+                    fragment = entries.get(key)
+                    if fragment is not None:
+                        entries.move_to_end(key)
+                        result.append(fragment)
+                        continue
+                else:
+                    key = None      # extra fields (e.g. scores): not cacheable
+                result.append(None)
+                misses.append((len(result) - 1, key, book))
+            self.hits += len(books) - len(misses)
+            self.misses += len(misses)
+
+        for position, key, book in misses:
+            result[position] = encode(book)
+        with self._lock:
+            for position, key, _ in misses:
+                if key is not None:
+                    entries[key] = result[position]
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            for entries in self._entries.values():
+                entries.clear()
+
+
+fragment_cache = FragmentCache()
+
+
+def negotiate() -> Optional[str]:
+    """Pick JSON or MessagePack from the request's Accept header; None if neither is acceptable."""
+    accept = request.accept_mimetypes
+    if not accept:
+        return JSON
+    best = accept.best_match((JSON,) + _MSGPACK_ALIASES)
+    if best is None:
+        return None
+    return JSON if best == JSON else MSGPACK
+
+
+def _not_acceptable() -> Response:
+    body = dumps_json({'error': 'Not acceptable', 'supported': [JSON, MSGPACK]})
+    return Response(body, status=406, mimetype=JSON)
+
+
+def api_response(payload, status: int = 200) -> Response:
+    """Encode a payload in the negotiated format."""
+    fmt = negotiate()
+    if fmt is None:
+        return _not_acceptable()
+    body = dumps_json(payload) if fmt == JSON else dumps_msgpack(payload)
+    return _response(body, status, fmt)
+
+
+def book_list_response(envelope: Dict, key: str, books: List[Dict], status: int = 200) -> Response:
+    """
+    Encode envelope plus envelope[key] = books, splicing the books' cached
+    fragments into the encoded envelope instead of re-encoding them.
+    """
+    fmt = negotiate()
+    if fmt is None:
+        return _not_acceptable()
+    if fmt == JSON and orjson is not None:
+        payload = dict(envelope)
+        payload[key] = books
+        return _response(dumps_json(payload), status, fmt)
+    fragments = fragment_cache.fragments(books, fmt)
+
+    if fmt == JSON:
+        head = dumps_json(envelope)
+        separator = b',' if envelope else b''
+        body = b''.join((head[:-1], separator, dumps_json(key), b':[', b','.join(fragments), b']}'))
+    else:
+        parts = [_map_header(len(envelope) + 1)]
+        for name, value in envelope.items():
+            parts.append(dumps_msgpack(name))
+            parts.append(dumps_msgpack(value))
+        parts.append(dumps_msgpack(key))
+        parts.append(_array_header(len(fragments)))
+        parts.extend(fragments)
+        body = b''.join(parts)
+    return _response(body, status, fmt)
+
+
+def _response(body: bytes, status: int, fmt: str) -> Response:
+    response = Response(body, status=status, mimetype=fmt)
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,317 @@
+"""
+Shard Router Module - One SQLite database per library branch
+Routes catalog and circulation calls to the branch database that owns the
+book, and fans patron reports and catalog searches out to every branch in
+parallel, so branches no longer contend for a single writer lock.
+
+create_app({'BRANCHES': {name: path}}) routes every HTTP request to one
+branch (init_branch_routing): the branch named by the X-Library-Branch
+header or a `branch` parameter, else the branch owning the book IDs in the
+request (book_id, or the after/before catalog cursors), else the first
+branch. Borrowing and returning go through the router so the borrowing
+limit spans branches, and searches that name no branch fan out to all of
+them. Per-database state (suggest, fuzzy and recommendation indexes, cached
+book fragments, the catalog snapshot, the availability feed, due date
+timers) is keyed by or bound to a database path, so routing calls through
+use_database never mixes branches.
+
+Routing rules:
+    book IDs    each shard's books start at shard_index * ID_SPAN, so the
+                owning shard is book_id // ID_SPAN
+    patrons     a patron's home shard is a stable hash of the patron ID; it
+                holds the patron's loan quota counter
+    loans       live in the shard that owns the book
+
+Cross-shard borrowing limit:
+    A loan slot is reserved on the patron's home shard (one atomic
+    conditional upsert) before the borrow is written to the book's shard,
+    and released if the borrow fails without writing a loan, or after the
+    book is returned. The counter therefore never undercounts active loans:
+    a crash between the two steps can only leave the patron blocked early,
+    which reconcile_patron_quota repairs by recounting across all shards.
+"""
+
+import heapq
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, g, request
+
+from database import (
+    get_book_by_id, get_books_by_ids, get_db_connection, get_patron_borrow_count,
+    init_database, use_database
+)
+from services import fuzzy_search, library_service
+from services.loan_policy import get_loan_policy
+
+# Book IDs of shard n are allocated from n * ID_SPAN + 1 upwards
+ID_SPAN = 10 ** 9
+# Request header naming the branch a request is for
+BRANCH_HEADER = 'X-Library-Branch'
+# Request parameters holding book IDs, which also pick the branch that owns them
+BOOK_ID_PARAMS = ('book_id', 'after', 'before')
+
+
+class ShardRouter:
+    """Maps branches, books and patrons to per-branch database files."""
+
+    def __init__(self, branches: Dict[str, str], max_workers: Optional[int] = None):
+        """
+        Args:
+            branches: branch name -> database path; the order fixes each branch's
+                shard index, so append new branches rather than reordering
+        """
+        if not branches:
+            raise ValueError("At least one branch is required.")
+        self.branches = list(branches)
+        self.paths = [branches[name] for name in self.branches]
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or len(self.paths),
+                                        thread_name_prefix='shard')
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def init_shards(self):
+        """Create every branch database and reserve its book ID range."""
+        for shard in range(len(self.paths)):
+            self.run(shard, _init_shard, shard)
+
+    # Routing
+
+    def shard_for_branch(self, branch: str) -> int:
+        try:
+            return self.branches.index(branch)
+        except ValueError:
+            raise KeyError(f"Unknown branch: {branch}")
+
+    def shard_for_book(self, book_id: int) -> Optional[int]:
+        """Shard that owns a book ID, or None if the ID is outside every shard's range."""
+        shard = book_id // ID_SPAN
+        if book_id <= 0 or shard >= len(self.paths):
+            return None
+        return shard
+
+    def home_shard(self, patron_id: str) -> int:
+        """Shard holding a patron's loan quota (stable across processes)."""
+        return zlib.crc32(patron_id.encode()) % len(self.paths)
+
+    def run(self, shard: int, func, *args):
+        """Call func(*args) with database access routed to one shard."""
+        with use_database(self.paths[shard]):
+            return func(*args)
+
+    def fan_out(self, func, *args) -> List:
+        """Call func(*args) on every shard in parallel; results in shard order."""
+        futures = [self._pool.submit(self.run, shard, func, *args) for shard in range(len(self.paths))]
+        return [future.result() for future in futures]
+
+    # Catalog
+
+    def add_book(self, branch: str, title: str, author: str, isbn: str,
+                 total_copies: int) -> Tuple[bool, str]:
+        """Add a book to one branch's catalog (ISBNs are unique per branch)."""
+        return self.run(self.shard_for_branch(branch), library_service.add_book_to_catalog,
+                        title, author, isbn, total_copies)
+
+    def get_book(self, book_id: int) -> Optional[Dict]:
+        shard = self.shard_for_book(book_id)
+        if shard is None:
+            return None
+        return self.run(shard, get_book_by_id, book_id)
+
+    def search_books(self, search_term: str, search_type: str) -> List[Dict]:
+        """Search every branch in parallel; each result is tagged with its branch."""
+        if search_type == "fuzzy":
+            per_shard = self.fan_out(_fuzzy_matches, search_term)
+            ranked = heapq.merge(*per_shard, key=lambda match: (match[0], match[1]['id']))
+            return [self._tag(book) for _, book in ranked][:fuzzy_search.MAX_RESULTS]
+
+        per_shard = self.fan_out(library_service.search_books_in_catalog, search_term, search_type)
+        if search_type in ("title", "author"):
+            # Each shard returns title order, so a k-way merge keeps it
+            merged = heapq.merge(*per_shard, key=lambda b: b["title"])
+        else:
+            merged = (book for books in per_shard for book in books)
+        return [self._tag(book) for book in merged]
+
+    def _tag(self, book: Dict) -> Dict:
+        book = dict(book)
+        book["branch"] = self.branches[self.shard_for_book(book["id"])]
+        return book
+
+    # Circulation
+
+    def borrow_book(self, patron_id: str, book_id: int) -> Tuple[bool, str]:
+        """Borrow from the owning branch, enforcing the limit across all branches."""
+        if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+            return False, "Invalid patron ID. Must be exactly 6 digits."
+        shard = self.shard_for_book(book_id)
+        if shard is None:
+            return False, "Book not found."
+
+        home = self.home_shard(patron_id)
+        limit = get_loan_policy().rule_for(patron_id, book_id).max_loans
+        if not self.run(home, _reserve_loan_slot, patron_id, limit):
+            return False, f"You have reached the maximum borrowing limit of {limit} books."
+
+        active = self.run(shard, get_patron_borrow_count, patron_id)
+        success, message = self.run(shard, library_service.borrow_book_by_patron, patron_id, book_id)
+        # A borrow can fail after its loan row was written; that loan keeps its slot
+        if not success and self.run(shard, get_patron_borrow_count, patron_id) <= active:
+            self.run(home, _release_loan_slot, patron_id)
+        return success, message
+
+    def return_book(self, patron_id: str, book_id: int) -> Tuple[bool, str]:
+        """Return to the owning branch, then free the patron's loan slot."""
+        if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+            return False, "Invalid patron ID. Must be exactly 6 digits."
+        shard = self.shard_for_book(book_id)
+        if shard is None:
+            return False, "Book not found."
+
+        success, message = self.run(shard, library_service.return_book_by_patron, patron_id, book_id)
+        if success:
+            self.run(self.home_shard(patron_id), _release_loan_slot, patron_id)
+        return success, message
+
+    def reconcile_patron_quota(self, patron_id: str) -> int:
+        """Reset a patron's quota counter to their active loans across all shards."""
+        active = sum(self.fan_out(get_patron_borrow_count, patron_id))
+        self.run(self.home_shard(patron_id), _set_loan_slots, patron_id, active)
+        return active
+
+    # Reports
+
+    def get_patron_status_report(self, patron_id: str) -> Dict:
+        """Merge the patron's status report from every branch."""
+        reports = self.fan_out(library_service.get_patron_status_report, patron_id)
+        if "error" in reports[0]:
+            return reports[0]
+
+        activity = [r["last_activity"] for r in reports if r["last_activity"] is not None]
+        history = heapq.merge(*(r["borrow_history"] for r in reports),
+                              key=lambda r: (r["borrow_date"], r["id"]))
+        return {
+            "currently_borrowed": sorted((b for r in reports for b in r["currently_borrowed"]),
+                                         key=lambda b: b["due_date"]),
+            "borrow_count": sum(r["borrow_count"] for r in reports),
+            "total_late_fees": round(sum(r["total_late_fees"] for r in reports), 2),
+            "last_activity": max(activity) if activity else None,
+            "borrow_history": list(history)[:library_service.HISTORY_PAGE_SIZE]
+        }
+
+
+def init_branch_routing(app, branches: Dict[str, str]) -> ShardRouter:
+    """Serve each request of `app` from one branch database (see the module docstring)."""
+    router = ShardRouter(branches)
+    router.init_shards()
+    app.extensions['shard_router'] = router
+
+    @app.before_request
+    def route_to_branch():
+        branch = request.headers.get(BRANCH_HEADER) or request.values.get('branch')
+        if branch:
+            if branch not in router.branches:
+                return {'error': f'Unknown branch: {branch}'}, 400
+            shard = router.shard_for_branch(branch)
+        else:
+            shard = _shard_for_request_books(router)
+        stack = ExitStack()
+        stack.enter_context(use_database(router.paths[shard]))
+        g.branch_database = stack
+        g.branch = router.branches[shard]
+        g.branch_requested = bool(branch)
+
+    @app.teardown_request
+    def leave_branch(exc):
+        stack = g.pop('branch_database', None)
+        if stack is not None:
+            stack.close()
+
+    return router
+
+
+def current_router() -> Optional[ShardRouter]:
+    """The router of the app serving this request, when it has branches."""
+    return current_app.extensions.get('shard_router')
+
+
+def spans_branches() -> bool:
+    """Whether a search in this request should fan out to every branch (none was named)."""
+    return current_router() is not None and not g.get('branch_requested', False)
+
+
+def _shard_for_request_books(router: ShardRouter) -> int:
+    values = dict(request.values.items())
+    values.update(request.view_args or {})
+    for name in BOOK_ID_PARAMS:
+        try:
+            shard = router.shard_for_book(int(values[name]))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if shard is not None:
+            return shard
+    return 0
+
+
+def _init_shard(shard: int):
+    init_database()
+    conn = get_db_connection()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS patron_loan_quota (
+            patron_id TEXT PRIMARY KEY,
+            active_loans INTEGER NOT NULL
+        )
+    ''')
+    # Start this shard's AUTOINCREMENT sequence at the bottom of its ID range
+    floor = shard * ID_SPAN
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'books'").fetchone()
+    if row is None:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('books', ?)", (floor,))
+    elif row['seq'] < floor:
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'books'", (floor,))
+    conn.commit()
+    conn.close()
+
+
+def _reserve_loan_slot(patron_id: str, limit: int) -> bool:
+    """Atomically take one of the patron's loan slots; False when all are in use."""
+    conn = get_db_connection()
+    cursor = conn.execute('''
+        INSERT INTO patron_loan_quota (patron_id, active_loans) VALUES (?, 1)
+        ON CONFLICT (patron_id) DO UPDATE SET active_loans = active_loans + 1
+        WHERE active_loans < ?
+    ''', (patron_id, limit))
+    conn.commit()
+    conn.close()
+    return cursor.rowcount == 1
+
+
+def _release_loan_slot(patron_id: str):
+    conn = get_db_connection()
+    conn.execute('''
+        UPDATE patron_loan_quota SET active_loans = MAX(active_loans - 1, 0)
+        WHERE patron_id = ?
+    ''', (patron_id,))
+    conn.commit()
+    conn.close()
+
+
+def _set_loan_slots(patron_id: str, active_loans: int):
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT INTO patron_loan_quota (patron_id, active_loans) VALUES (?, ?)
+        ON CONFLICT (patron_id) DO UPDATE SET active_loans = excluded.active_loans
+    ''', (patron_id, active_loans))
+    conn.commit()
+    conn.close()
+
+
+def _fuzzy_matches(search_term: str) -> List[Tuple[int, Dict]]:
+    """(edit distance, book) pairs from this shard's fuzzy index, closest first."""
+    index = fuzzy_search.get_fuzzy_index(library_service.get_catalog_books)
+    matches = index.search(search_term)
+    books_by_id = get_books_by_ids([book_id for book_id, _ in matches])
+    return [(distance, books_by_id[book_id]) for book_id, distance in matches if book_id in books_by_id]
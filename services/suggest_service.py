@@ -0,0 +1,237 @@
+"""
+Suggest Service Module - Typeahead suggestions for titles and authors
+Keeps a sorted prefix index in memory so each keystroke is a bisect range
+lookup instead of a scan of the whole catalog.
+
+Short prefixes (up to TOP_PREFIX_LENGTH characters) match too many keys
+to rank per keystroke, so each keeps a precomputed list of its TOP_K most
+borrowed entries. Borrow counts only grow, so promoting the borrowed book
+and its author in their prefixes' lists keeps every list exact.
+"""
+
+import bisect
+import heapq
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+from database import current_database, get_all_books, get_book_by_isbn, get_book_borrow_counts
+
+# Prefixes up to this length answer from precomputed top lists; longer
+# prefixes rank every match in their (much narrower) key range
+TOP_PREFIX_LENGTH = 3
+# Entries kept per short prefix: the largest limit a query may ask for
+TOP_K = 50
+# Newly added keys are buffered and merged into the sorted lists in bulk
+MERGE_EVERY = 1024
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse whitespace so lookups are case-insensitive."""
+    return ' '.join(text.lower().split())
+
+
+def _word_suffixes(text: str) -> List[str]:
+    """Every word-aligned suffix, so "gats" matches "The Great Gatsby"."""
+    words = normalize(text).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+def _short_prefixes(keys: Iterable[str]) -> Set[str]:
+    return {key[:n] for key in keys for n in range(1, min(len(key), TOP_PREFIX_LENGTH) + 1)}
+
+
+class SuggestIndex:
+    """
+    Sorted prefix index over normalized titles and authors.
+    
+    Keys live in one sorted list with a parallel list of entry ids.
+    A positive entry is a book id (title suggestion); a negative entry
+    -(n + 1) points at the n-th distinct author.
+    """
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._entries: List[int] = []
+        self._pending: List[tuple] = []
+        self._top: Dict[str, List[int]] = {}
+        self._titles: Dict[int, str] = {}
+        self._authors: List[str] = []
+        self._author_ids: Dict[str, int] = {}
+        self._book_author: Dict[int, int] = {}
+        self._popularity: Dict[int, int] = {}
+        self._author_popularity: List[int] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, books: List[Dict], borrow_counts: Optional[Dict[int, int]] = None) -> 'SuggestIndex':
+        """Build an index in one pass, sorting all keys once."""
+        index = cls()
+        pairs = []
+        for book in books:
+            for key, entry in index._register(book['id'], book['title'], book['author']):
+                pairs.append((key, entry))
+        pairs.sort()
+        index._keys = [key for key, _ in pairs]
+        index._entries = [entry for _, entry in pairs]
+        for book_id, count in (borrow_counts or {}).items():
+            index._count_borrows(book_id, count)
+        index._build_top()
+        return index
+
+    def _build_top(self):
+        """Rank every short prefix's key range once."""
+        keys, entries = self._keys, self._entries
+        for n in range(1, TOP_PREFIX_LENGTH + 1):
+            start = 0
+            while start < len(keys):
+                prefix = keys[start][:n]
+                if len(prefix) < n:
+                    start += 1      # a shorter key; its prefix was ranked at a smaller n
+                    continue
+                end = bisect.bisect_left(keys, prefix + '\uffff', start)
+                self._top[prefix] = heapq.nlargest(TOP_K, set(entries[start:end]), key=self._rank)
+                start = end
+
+    def _register(self, book_id: int, title: str, author: str):
+        """Record display text for a book and return its (key, entry) pairs."""
+        self._titles[book_id] = title
+        pairs = [(key, book_id) for key in _word_suffixes(title)]
+
+        author_key = normalize(author)
+        author_id = self._author_ids.get(author_key)
+        if author_id is None:
+            author_id = len(self._authors)
+            self._author_ids[author_key] = author_id
+            self._authors.append(author)
+            self._author_popularity.append(0)
+            pairs.extend((key, -(author_id + 1)) for key in _word_suffixes(author))
+        self._book_author[book_id] = author_id
+        return pairs
+
+    def _count_borrows(self, book_id: int, count: int):
+        self._popularity[book_id] = self._popularity.get(book_id, 0) + count
+        author_id = self._book_author.get(book_id)
+        if author_id is not None:
+            self._author_popularity[author_id] += count
+
+    def _promote(self, entry: int, keys: Iterable[str]):
+        """Place an entry whose score grew (or that is new) in its short prefixes' top lists."""
+        rank = self._rank(entry)
+        for prefix in _short_prefixes(keys):
+            top = self._top.setdefault(prefix, [])
+            if entry in top:
+                top.remove(entry)
+            elif len(top) >= TOP_K and rank <= self._rank(top[-1]):
+                continue
+            top.append(entry)
+            top.sort(key=self._rank, reverse=True)
+            del top[TOP_K:]
+
+    def add_book(self, book_id: int, title: str, author: str):
+        """Insert a newly added book without rebuilding the index."""
+        with self._lock:
+            pairs = self._register(book_id, title, author)
+            for pair in pairs:
+                bisect.insort(self._pending, pair)
+            for entry in {entry for _, entry in pairs}:
+                self._promote(entry, [key for key, e in pairs if e == entry])
+            if len(self._pending) >= MERGE_EVERY:
+                merged = list(heapq.merge(zip(self._keys, self._entries), self._pending))
+                self._keys = [key for key, _ in merged]
+                self._entries = [entry for _, entry in merged]
+                self._pending = []
+
+    def record_borrow(self, book_id: int):
+        """Bump a book's popularity after a successful borrow."""
+        with self._lock:
+            self._count_borrows(book_id, 1)
+            if book_id in self._titles:
+                self._promote(book_id, _word_suffixes(self._titles[book_id]))
+                author_id = self._book_author[book_id]
+                self._promote(-(author_id + 1), _word_suffixes(self._authors[author_id]))
+
+    def _score(self, entry: int) -> int:
+        if entry > 0:
+            return self._popularity.get(entry, 0)
+        return self._author_popularity[-entry - 1]
+
+    def _rank(self, entry: int):
+        """Most borrowed first; ties go to the lower id."""
+        return self._score(entry), -abs(entry)
+
+    def _matches(self, prefix: str) -> Set[int]:
+        """Every entry with a key starting with prefix."""
+        end_key = prefix + '\uffff'
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, end_key, start)
+        candidates = set(self._entries[start:end])
+        start = bisect.bisect_left(self._pending, (prefix,))
+        end = bisect.bisect_left(self._pending, (end_key,), start)
+        candidates.update(entry for _, entry in self._pending[start:end])
+        return candidates
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """Return up to `limit` suggestions starting with `prefix`, most borrowed first."""
+        prefix = normalize(prefix)
+        if not prefix or limit <= 0:
+            return []
+
+        with self._lock:
+            if len(prefix) <= TOP_PREFIX_LENGTH and limit <= TOP_K:
+                ranked = self._top.get(prefix, [])[:limit]
+            else:
+                ranked = heapq.nlargest(limit, self._matches(prefix), key=self._rank)
+
+            suggestions = []
+            for entry in ranked:
+                if entry > 0:
+                    suggestions.append({'type': 'title', 'text': self._titles[entry],
+                                        'book_id': entry, 'borrow_count': self._score(entry)})
+                else:
+                    suggestions.append({'type': 'author', 'text': self._authors[-entry - 1],
+                                        'borrow_count': self._score(entry)})
+            return suggestions
+
+
+# One index per database file, so sharded deployments keep branches apart
+_indexes: Dict[str, SuggestIndex] = {}
+_index_lock = threading.Lock()
+
+
+def get_suggest_index() -> SuggestIndex:
+    """Return the index for the current database, building it on first use."""
+    path = current_database()
+    index = _indexes.get(path)
+    if index is None:
+        with _index_lock:
+            index = _indexes.get(path)
+            if index is None:
+                index = SuggestIndex.build(get_all_books(), get_book_borrow_counts())
+                _indexes[path] = index
+    return index
+
+
+def note_book_added(isbn: str):
+    """Add a freshly inserted book to the current database's index, if it has been built."""
+    index = _indexes.get(current_database())
+    if index is None:
+        return
+    book = get_book_by_isbn(isbn)
+    if book:
+        index.add_book(book['id'], book['title'], book['author'])
+
+
+def note_books_added(books: List[Dict]):
+    """Add freshly inserted books (dicts with id, title, author) to the current database's index, if built."""
+    index = _indexes.get(current_database())
+    if index is None:
+        return
+    for book in books:
+        index.add_book(book['id'], book['title'], book['author'])
+
+
+def note_book_borrowed(book_id: int):
+    """Count a borrow towards popularity, if the current database's index has been built."""
+    index = _indexes.get(current_database())
+    if index is not None:
+        index.record_borrow(book_id)
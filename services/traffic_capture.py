@@ -0,0 +1,145 @@
+"""
+Traffic Capture Module - Opt-in request log for replaying production load
+Appends one compact JSON line per request (method, path, query string,
+form or JSON body, Accept header, endpoint, status, duration and the
+number of SQL statements it ran) to a size-rotated file.
+
+When capture starts, the database is snapshotted next to the log
+(capture.jsonl -> capture.jsonl.seed.db), so services/traffic_replay.py
+can replay the stream against the same starting state. Rotation drops the
+oldest requests; size TRAFFIC_CAPTURE_MAX_BYTES * TRAFFIC_CAPTURE_BACKUPS
+to cover the whole window of interest. Use one capture file per process.
+
+Enable with create_app({'TRAFFIC_CAPTURE': 'capture.jsonl'}).
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+from flask import g, request
+
+from database import count_queries, current_archive_database
+from services.backup_service import backup_database
+from services.serialization import dumps_json
+
+DEFAULT_CONFIG = {
+    'TRAFFIC_CAPTURE': None,                    # log path; None disables capture
+    'TRAFFIC_CAPTURE_MAX_BYTES': 50 * 1024 * 1024,
+    'TRAFFIC_CAPTURE_BACKUPS': 5,
+    'TRAFFIC_CAPTURE_SEED': True,               # snapshot the database when capture starts
+}
+
+# Long-lived streams cannot be replayed as single requests
+SKIPPED_ENDPOINTS = {'static', 'api.stream_availability'}
+
+
+def seed_paths(capture_path: str):
+    """Where the database and archive snapshots for a capture are kept."""
+    return f'{capture_path}.seed.db', f'{capture_path}.seed_archive.db'
+
+
+def capture_files(capture_path: str) -> List[str]:
+    """The capture and its rotated files, oldest first."""
+    rotated = []
+    for n in itertools.count(1):
+        path = f'{capture_path}.{n}'
+        if not os.path.exists(path):
+            break
+        rotated.append(path)
+    files = list(reversed(rotated))
+    if os.path.exists(capture_path):
+        files.append(capture_path)
+    return files
+
+
+class TrafficRecorder:
+    """Writes request records to a rotating file."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                            encoding='utf-8', delay=True)
+        self._logger = logging.Logger(f'traffic_capture:{path}', logging.INFO)
+        self._logger.addHandler(self._handler)
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def seed(self):
+        """Snapshot the current database (and archive, if any) as the replay starting state."""
+        seed_db, seed_archive = seed_paths(self.path)
+        if os.path.exists(current_archive_database()):
+            backup_database(seed_db, archive_dest_path=seed_archive)
+        else:
+            backup_database(seed_db)
+            if os.path.exists(seed_archive):
+                os.remove(seed_archive)
+
+    def record(self, entry: Dict):
+        with self._lock:
+            entry['n'] = next(self._sequence)
+            self._logger.info(dumps_json(entry).decode('utf-8'))
+
+    def close(self):
+        self._handler.close()
+
+
+def _request_entry() -> Dict:
+    entry = {'ts': g.capture_wall_time, 'method': request.method, 'path': request.path}
+    if request.query_string:
+        entry['query'] = request.query_string.decode('latin-1')
+    if request.form:
+        entry['form'] = request.form.to_dict()
+    elif request.is_json:
+        entry['json'] = request.get_json(silent=True)
+    accept = request.headers.get('Accept')
+    if accept:
+        entry['accept'] = accept
+    return entry
+
+
+def init_traffic_capture(app) -> Optional[TrafficRecorder]:
+    """Install request capture as before/after-request hooks if TRAFFIC_CAPTURE is set."""
+    for key, value in DEFAULT_CONFIG.items():
+        app.config.setdefault(key, value)
+    path = app.config['TRAFFIC_CAPTURE']
+    if not path:
+        return None
+
+    recorder = TrafficRecorder(path, app.config['TRAFFIC_CAPTURE_MAX_BYTES'],
+                               app.config['TRAFFIC_CAPTURE_BACKUPS'])
+    if app.config['TRAFFIC_CAPTURE_SEED']:
+        recorder.seed()
+    app.extensions['traffic_recorder'] = recorder
+
+    @app.before_request
+    def _start_capture():
+        if request.endpoint in SKIPPED_ENDPOINTS:
+            return
+        g.capture_stack = ExitStack()
+        g.capture_queries = g.capture_stack.enter_context(count_queries())
+        g.capture_wall_time = time.time()
+        g.capture_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        if 'capture_started' in g:
+            entry = _request_entry()
+            entry.update(endpoint=request.endpoint, status=response.status_code,
+                         ms=round((time.perf_counter() - g.capture_started) * 1000, 3),
+                         queries=g.capture_queries.count)
+            recorder.record(entry)
+        return response
+
+    @app.teardown_request
+    def _stop_capture(exc):
+        stack = g.pop('capture_stack', None)
+        if stack is not None:
+            stack.close()
+
+    return recorder
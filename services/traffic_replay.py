@@ -0,0 +1,214 @@
+"""
+Traffic Replay Module - Re-issue a captured request stream against a fresh copy
+Copies the capture's seed snapshot into a scratch directory, builds the app
+on that copy, and replays the requests recorded by services/traffic_capture.py
+through the Flask test client. Reports latency percentiles, SQL statement
+counts and status mismatches per endpoint, next to the captured figures.
+
+Speed:
+    1       original pacing (requests start at their captured offsets)
+    N       N times faster
+    max     back to back, as fast as the workers allow
+
+With one worker the requests run in captured order, so a replay at any
+speed is repeatable; more workers overlap requests as production did, at
+the cost of ordering. Rate limiting is off unless --rate-limit is given,
+since accelerated replays would otherwise measure the limiter. Fees and
+due dates are computed from the replay's clock, not the capture's.
+
+Usage: python -m services.traffic_replay CAPTURE [--speed 1|N|max] [--concurrency N]
+       e.g. python -m services.traffic_replay capture.jsonl --speed max --concurrency 4
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from app import create_app
+from database import count_queries, use_database
+from services.traffic_capture import capture_files, seed_paths
+
+
+def load_capture(capture_path: str) -> List[Dict]:
+    """Captured requests from the capture and its rotated files, in sequence order."""
+    entries = []
+    for path in capture_files(capture_path):
+        with open(path, encoding='utf-8') as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    entries.sort(key=lambda entry: entry['n'])
+    return entries
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    return ordered[max(0, min(len(ordered) - 1, int(round(q * len(ordered))) - 1))]
+
+
+def _schedule(entries: List[Dict], speed: float) -> Iterator[Dict]:
+    """Yield entries when they are due: at their captured offset / speed, or at once for speed 0."""
+    if not entries:
+        return
+    first = entries[0]['ts']
+    started = time.perf_counter()
+    for entry in entries:
+        if speed:
+            delay = (entry['ts'] - first) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        yield entry
+
+
+class _Replayer:
+    """Issues requests on per-thread test clients with database access routed to the copy."""
+
+    def __init__(self, app, database_path: str, archive_path: str):
+        self.app = app
+        self.database_path = database_path
+        self.archive_path = archive_path
+        self._local = threading.local()
+
+    def issue(self, entry: Dict) -> Dict:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        kwargs = {'method': entry['method'], 'query_string': entry.get('query', '')}
+        if 'form' in entry:
+            kwargs['data'] = entry['form']
+        elif 'json' in entry:
+            kwargs['json'] = entry['json']
+        if 'accept' in entry:
+            kwargs['headers'] = {'Accept': entry['accept']}
+
+        with use_database(self.database_path, self.archive_path), count_queries() as counter:
+            started = time.perf_counter()
+            response = client.open(entry['path'], **kwargs)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            response.close()
+        return {'entry': entry, 'ms': elapsed * 1000, 'status': response.status_code,
+                'queries': counter.count}
+
+
+def replay(capture_path: str, speed: float = 1.0, concurrency: int = 1,
+           config: Optional[Dict] = None, workdir: Optional[str] = None) -> Dict:
+    """
+    Replay a capture against a fresh copy of its seed database.
+
+    Args:
+        speed: pacing multiplier; 0 replays back to back
+        concurrency: number of requests in flight at once
+        config: extra create_app settings (rate limiting is off by default)
+        workdir: directory for the scratch database copy (default: a temp dir)
+
+    Returns:
+        dict: per-endpoint report (see summarize), plus request count and wall time
+    """
+    seed_db, seed_archive = seed_paths(capture_path)
+    if not os.path.exists(seed_db):
+        raise FileNotFoundError(f"No seed snapshot for {capture_path} (expected {seed_db})")
+    entries = load_capture(capture_path)
+
+    scratch = tempfile.mkdtemp(prefix='replay-', dir=workdir)
+    try:
+        database_path = os.path.join(scratch, 'library.db')
+        archive_path = os.path.join(scratch, 'library_archive.db')
+        shutil.copyfile(seed_db, database_path)
+        if os.path.exists(seed_archive):
+            shutil.copyfile(seed_archive, archive_path)
+
+        settings = {'RATE_LIMIT_ENABLED': False}
+        settings.update(config or {})
+        with use_database(database_path, archive_path):
+            app = create_app(settings)
+        replayer = _Replayer(app, database_path, archive_path)
+
+        started = time.perf_counter()
+        if concurrency <= 1:
+            results = [replayer.issue(entry) for entry in _schedule(entries, speed)]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay') as pool:
+                futures = [pool.submit(replayer.issue, entry) for entry in _schedule(entries, speed)]
+                results = [future.result() for future in futures]
+        wall = time.perf_counter() - started
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = summarize(results)
+    report['requests'] = len(results)
+    report['seconds'] = wall
+    report['complete'] = not entries or entries[0]['n'] == 1
+    return report
+
+
+def summarize(results: List[Dict]) -> Dict:
+    """Group replay results by captured endpoint into latency and query statistics."""
+    by_endpoint = defaultdict(list)
+    for result in results:
+        by_endpoint[result['entry'].get('endpoint') or result['entry']['path']].append(result)
+
+    endpoints = {}
+    for endpoint, group in sorted(by_endpoint.items()):
+        replayed = sorted(r['ms'] for r in group)
+        captured = sorted(r['entry']['ms'] for r in group)
+        endpoints[endpoint] = {
+            'count': len(group),
+            'p50_ms': _percentile(replayed, 0.50),
+            'p90_ms': _percentile(replayed, 0.90),
+            'p99_ms': _percentile(replayed, 0.99),
+            'max_ms': replayed[-1],
+            'captured_p50_ms': _percentile(captured, 0.50),
+            'captured_p99_ms': _percentile(captured, 0.99),
+            'queries': sum(r['queries'] for r in group) / len(group),
+            'captured_queries': sum(r['entry']['queries'] for r in group) / len(group),
+            'status_mismatches': sum(r['status'] != r['entry']['status'] for r in group),
+        }
+    return {'endpoints': endpoints}
+
+
+def print_report(report: Dict):
+    print(f"{report['requests']} requests in {report['seconds']:.2f}s")
+    if not report['complete']:
+        print('warning: the oldest captured requests were rotated away; '
+              'the seed state does not match the first remaining request')
+    print(f"{'endpoint':<32} {'count':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} "
+          f"{'cap p50':>8} {'cap p99':>8} {'queries':>11} {'status!=':>8}")
+    for endpoint, stats in report['endpoints'].items():
+        print(f"{endpoint:<32} {stats['count']:>6} {stats['p50_ms']:>8.2f} {stats['p90_ms']:>8.2f} "
+              f"{stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f} {stats['captured_p50_ms']:>8.2f} "
+              f"{stats['captured_p99_ms']:>8.2f} "
+              f"{stats['queries']:>5.1f}/{stats['captured_queries']:<5.1f} {stats['status_mismatches']:>8}")
+    print('latencies in ms; queries are replayed/captured SQL statements per request')
+
+
+def _speed(value: str) -> float:
+    if value == 'max':
+        return 0.0
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captured traffic against a fresh database.')
+    parser.add_argument('capture', help='capture file written with TRAFFIC_CAPTURE')
+    parser.add_argument('--speed', type=_speed, default=1.0, help="pacing multiplier, or 'max'")
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--rate-limit', action='store_true', help='keep rate limiting enabled')
+    parser.add_argument('--dir', help='directory for the scratch database copy')
+    args = parser.parse_args()
+
+    report = replay(args.capture, args.speed, args.concurrency,
+                    {'RATE_LIMIT_ENABLED': args.rate_limit}, args.dir)
+    print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+import pytest
+import database
+
+
+@pytest.fixture
+def library_db(tmp_path, monkeypatch):
+    """Point the database module at a fresh, initialized SQLite file."""
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "library.db"))
+    monkeypatch.setattr(database, "ARCHIVE_DATABASE", str(tmp_path / "library_archive.db"))
+    database.init_database()
+    return database.DATABASE
@@ -0,0 +1,64 @@
+import sqlite3
+from datetime import datetime, timedelta
+import database
+from library_service import get_patron_status_report, verify_patron_summary
+from services.archive_service import archive_returned_loans
+
+
+def _seed_history():
+    now = datetime.now()
+    database.insert_book("Book", "Author", "0000000000001", 3, 2)
+    for days_ago in (800, 600, 400):
+        database.insert_borrow_record("123456", 1, now - timedelta(days=days_ago), now - timedelta(days=days_ago - 14))
+        database.update_borrow_record_return_date("123456", 1, now - timedelta(days=days_ago - 20))
+    database.insert_borrow_record("123456", 1, now - timedelta(days=2), now + timedelta(days=12))
+
+
+def _live_count(path):
+    conn = sqlite3.connect(path)
+    count = conn.execute("SELECT COUNT(*) FROM borrow_records").fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_archives_old_returned_loans_in_batches(library_db):
+    _seed_history()
+    get_patron_status_report("123456")
+
+    assert archive_returned_loans(older_than_days=365, batch_size=2) == 3
+    assert _live_count(library_db) == 1
+    assert archive_returned_loans(older_than_days=365) == 0
+
+
+def test_history_unions_archive_only_when_asked(library_db):
+    _seed_history()
+    archive_returned_loans(older_than_days=365)
+
+    assert len(get_patron_status_report("123456")["borrow_history"]) == 1
+    report = get_patron_status_report("123456", include_archived=True)
+    assert len(report["borrow_history"]) == 4
+    assert report["borrow_count"] == 1
+    assert verify_patron_summary("123456") == {}
+
+
+def test_suggest_popularity_counts_archived_loans(library_db, monkeypatch):
+    from services import suggest_service
+    _seed_history()
+    archive_returned_loans(older_than_days=365)
+    monkeypatch.setattr(suggest_service, "_indexes", {})
+
+    assert suggest_service.get_suggest_index().suggest("boo")[0]["borrow_count"] == 4
+
+
+def test_create_app_runs_archive_worker(library_db):
+    import time
+    from app import create_app
+    _seed_history()
+    app = create_app({"ARCHIVE_INTERVAL": 3600})
+    try:
+        deadline = time.monotonic() + 5
+        while _live_count(library_db) > 1 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert _live_count(library_db) == 1
+    finally:
+        app.extensions["archive_worker"].stop()
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+import database
+from asgi import AsyncLibraryAPI
+
+
+class FakeGateway:
+    def __init__(self):
+        self.calls = []
+
+    async def process_payment(self, patron_id, amount, idempotency_key=None):
+        self.calls.append((patron_id, amount, idempotency_key))
+        await asyncio.sleep(0)
+        return {"status": "success", "transaction_id": "TX1"}
+
+
+def _request(app, method, path, query=b"", body=None, content_type=b"application/json"):
+    sent = []
+    encoded = body if isinstance(body, bytes) else json.dumps(body).encode() if body is not None else b""
+
+    async def receive():
+        return {"type": "http.request", "body": encoded, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query,
+             "headers": [(b"content-type", content_type)]}
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+def test_search_and_borrow_return(library_db):
+    database.add_sample_data()
+    app = AsyncLibraryAPI()
+
+    status, payload = _request(app, "GET", "/api/search", b"q=gatsby&type=title")
+    assert status == 200 and payload["count"] == 1
+
+    status, payload = _request(app, "POST", "/api/borrow", body={"patron_id": "654321", "book_id": 1})
+    assert status == 200 and payload["success"]
+    status, payload = _request(app, "POST", "/api/return", body={"patron_id": "654321", "book_id": 1})
+    assert status == 200 and "returned" in payload["message"]
+
+    assert _request(app, "POST", "/api/borrow", body={"patron_id": "654321"})[0] == 400
+    assert _request(app, "GET", "/api/borrow")[0] == 405
+    assert _request(app, "GET", "/api/nope")[0] == 404
+
+
+async def _serve(app, scenario):
+    """Run `scenario` between the app's lifespan startup and shutdown on one event loop."""
+    messages = asyncio.Queue()
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    lifespan = asyncio.create_task(app({"type": "lifespan"}, messages.get, send))
+    await messages.put({"type": "lifespan.startup"})
+    while not sent:
+        await asyncio.sleep(0.01)
+    try:
+        return await scenario()
+    finally:
+        await messages.put({"type": "lifespan.shutdown"})
+        await lifespan
+
+
+def test_pay_late_fee_settles_on_the_event_loop(library_db):
+    now = datetime.now()
+    database.insert_book("Book", "Author", "0000000000001", 1, 0)
+    database.insert_borrow_record("123456", 1, now - timedelta(days=20), now - timedelta(days=4, hours=1))
+    gateway = FakeGateway()
+    app = AsyncLibraryAPI(payment_gateway=gateway)
+    body = json.dumps({"patron_id": "123456", "book_id": 1}).encode()
+
+    # Nothing would settle the payment without the lifespan's worker
+    status, payload = _request(app, "POST", "/api/pay_late_fee", body=body)
+    assert status == 503 and database.get_payment(1) is None
+    assert _request(app, "GET", "/api/late_fee/123456/1")[1]["fee_amount"] == 2.0
+
+    async def pay():
+        status, payload = await app.dispatch("POST", "/api/pay_late_fee", b"", body, b"application/json")
+        assert status == 202 and "queued" in payload["message"]
+        for _ in range(500):
+            if database.get_payment(1)["status"] == "settled":
+                break
+            await asyncio.sleep(0.01)
+        return await app.dispatch("GET", "/api/late_fee/123456/1", b"", b"")
+
+    status, payload = asyncio.run(_serve(app, pay))
+    assert payload["fee_amount"] == 0.0
+    assert gateway.calls == [("123456", 2.0, "late-fee-payment-1")]
+    assert not app.payment_worker.running
+
+
+def test_bad_bodies_and_handler_errors(library_db, monkeypatch):
+    app = AsyncLibraryAPI()
+    status, payload = _request(app, "POST", "/api/borrow", body=b"patron_id=\xff\xfe",
+                               content_type=b"application/x-www-form-urlencoded")
+    assert status == 400 and payload == {"error": "Request is not valid UTF-8"}
+    # Non-UTF-8 JSON is treated as an empty body
+    assert _request(app, "POST", "/api/borrow", body=b"\xff")[0] == 400
+
+    def broken(*args):
+        raise RuntimeError("boom")
+    monkeypatch.setattr("asgi.search_books_in_catalog", broken)
+    status, payload = _request(app, "GET", "/api/search", b"q=x")
+    assert status == 500 and payload == {"error": "Internal server error"}
@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+import time
+import database
+from library_service import borrow_book_by_patron, return_book_by_patron
+from services.archive_service import archive_returned_loans
+from services.backup_service import (
+    BackupScheduler, archive_snapshot_path, backup_database, list_snapshots, prune_snapshots,
+    reporting_connection, restore_database
+)
+
+
+def _count(path, table):
+    conn = sqlite3.connect(path)
+    count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return count
+
+
+def _fill_history(rows):
+    conn = database.get_db_connection()
+    conn.executemany(
+        "INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date) "
+        "VALUES (?, 1, ?, ?, ?)",
+        [(f"{100000 + i % 5000}", i, i + 1209600, i + 864000) for i in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+def test_p99_borrow_latency_while_backup_runs(library_db, tmp_path):
+    database.insert_book("Book", "Author", "0000000000001", 1000, 1000)
+    _fill_history(200000)
+    history_rows = _count(library_db, "borrow_records")
+
+    latencies = []
+    failures = []
+    stop = threading.Event()
+
+    def circulate():
+        while not stop.is_set():
+            started = time.perf_counter()
+            ok = borrow_book_by_patron("654321", 1)[0] and return_book_by_patron("654321", 1)[0]
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                failures.append(1)
+
+    writer = threading.Thread(target=circulate)
+    writer.start()
+    try:
+        result = backup_database(str(tmp_path / "snapshot.db"), pages=64, pause=0.001)
+    finally:
+        stop.set()
+        writer.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    assert not failures
+    assert result["steps"] > 1
+    assert p99 < 1.0, f"p99 borrow+return latency {p99 * 1000:.1f} ms during backup"
+    # The snapshot is the database as of the start of the copy, unaffected by later writes
+    assert _count(result["path"], "borrow_records") >= history_rows
+    conn = sqlite3.connect(result["path"])
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    conn.close()
+
+
+def test_scheduler_skips_unchanged_database_and_prunes(library_db, tmp_path):
+    backup_dir = str(tmp_path / "backups")
+    scheduler = BackupScheduler(backup_dir, keep=2, pause=0)
+
+    assert scheduler.run_once() is not None
+    assert scheduler.run_once() is None
+
+    for n in range(3):
+        database.insert_book(f"Book {n}", "Author", f"{n:013d}", 1, 1)
+        assert scheduler.run_once() is not None
+    snapshots = list_snapshots(backup_dir)
+    assert len(snapshots) == 2
+    assert _count(snapshots[-1], "books") == 3
+
+
+def test_restore_and_reporting_connection(library_db, tmp_path):
+    backup_dir = str(tmp_path / "backups")
+    database.insert_book("Keep Me", "Author", "0000000000001", 1, 1)
+    BackupScheduler(backup_dir, pause=0).run_once()
+    database.insert_book("Lose Me", "Author", "0000000000002", 1, 1)
+
+    report = reporting_connection(backup_dir)
+    assert [r["title"] for r in report.execute("SELECT title FROM books")] == ["Keep Me"]
+    try:
+        report.execute("DELETE FROM books")
+        assert False, "reporting connection should be read-only"
+    except sqlite3.OperationalError:
+        pass
+    report.close()
+
+    assert restore_database(list_snapshots(backup_dir)[-1])[0]
+    assert [b["title"] for b in database.get_all_books()] == ["Keep Me"]
+    assert restore_database(str(tmp_path / "missing.db")) == (False, "Snapshot not found.")
+    assert reporting_connection(str(tmp_path / "empty")) is None
+
+
+def test_archive_backed_up_and_restored_with_primary(library_db, tmp_path):
+    from datetime import datetime, timedelta
+    backup_dir = str(tmp_path / "backups")
+    now = datetime.now()
+    database.insert_book("Book", "Author", "0000000000001", 1, 1)
+    for days_ago in (800, 600):
+        database.insert_borrow_record("123456", 1, now - timedelta(days=days_ago), now - timedelta(days=days_ago - 14))
+        database.update_borrow_record_return_date("123456", 1, now - timedelta(days=days_ago - 20))
+    assert archive_returned_loans(older_than_days=700) == 1
+
+    scheduler = BackupScheduler(backup_dir, pause=0)
+    snapshot = scheduler.run_once()
+    assert list_snapshots(backup_dir) == [snapshot]
+    assert _count(archive_snapshot_path(snapshot), "borrow_records") == 1
+
+    # Archiving changes only the archive file, which still triggers a new snapshot
+    assert archive_returned_loans(older_than_days=365) == 1
+    assert scheduler.run_once() is not None
+
+    assert restore_database(snapshot)[0]
+    assert _count(library_db, "borrow_records") == 1
+    assert _count(database.ARCHIVE_DATABASE, "borrow_records") == 1
+    history = database.get_patron_loans("123456", include_archived=True)
+    assert len(history) == 2
+
+    # Pruning removes each snapshot's archive copy too
+    prune_snapshots(backup_dir, keep=0)
+    assert list((tmp_path / "backups").iterdir()) == []
@@ -0,0 +1,100 @@
+import database
+from app import create_app
+from library_service import browse_catalog, borrow_book_by_patron, return_book_by_patron
+from services import catalog_snapshot
+import library_service
+
+
+def _seed():
+    database.insert_book("Animal Farm", "George Orwell", "0000000000001", 1, 1)
+    database.insert_book("1984", "George Orwell", "0000000000002", 12, 12)
+    database.insert_book("Brave New World", "Aldous Huxley", "0000000000003", 3, 0)
+    database.insert_book("Beloved", "Toni Morrison", "0000000000004", 6, 6)
+
+
+def _counts(facet):
+    return {item["value"]: item["count"] for item in database.get_book_facets()[facet]}
+
+
+def test_facet_counts_follow_inserts_and_circulation(library_db):
+    _seed()
+    assert _counts("availability") == {"available": 3, "unavailable": 1}
+    assert _counts("letter") == {"#": 1, "A": 1, "B": 2}
+    assert _counts("copies") == {"1": 1, "10+": 1, "2-4": 1, "5-9": 1}
+    assert _counts("author") == {"George Orwell": 2, "Aldous Huxley": 1, "Toni Morrison": 1}
+
+    assert borrow_book_by_patron("123456", 1)[0]
+    assert _counts("availability") == {"available": 2, "unavailable": 2}
+    assert return_book_by_patron("123456", 1)[0]
+    assert _counts("availability") == {"available": 3, "unavailable": 1}
+
+
+def test_counts_are_backfilled_for_existing_catalogs(library_db):
+    _seed()
+    conn = database.get_db_connection()
+    conn.execute("DROP TABLE book_facets")
+    conn.commit()
+    conn.close()
+    database.init_database()
+    assert _counts("letter") == {"#": 1, "A": 1, "B": 2}
+
+
+def test_browse_filters_and_pages(library_db):
+    _seed()
+    result = browse_catalog({"author": "George Orwell", "availability": "available"})
+    assert [b["title"] for b in result["books"]] == ["1984", "Animal Farm"]
+
+    assert [b["title"] for b in browse_catalog({"letter": "b"})["books"]] == ["Beloved", "Brave New World"]
+    assert [b["title"] for b in browse_catalog({"copies": "10+"})["books"]] == ["1984"]
+
+    first = browse_catalog({}, page_size=3)
+    assert [b["title"] for b in first["books"]] == ["1984", "Animal Farm", "Beloved"]
+    second = browse_catalog({}, after_id=first["next_after"], page_size=3)
+    assert [b["title"] for b in second["books"]] == ["Brave New World"]
+    assert second["next_after"] is None
+    assert second["prev_before"] == second["books"][0]["id"]
+
+    back = browse_catalog({}, before_id=second["prev_before"], page_size=3)
+    assert back["books"] == first["books"]
+    assert back["prev_before"] is None and back["next_after"] == first["next_after"]
+    back = browse_catalog({}, before_id=second["prev_before"], page_size=2)
+    assert [b["title"] for b in back["books"]] == ["Animal Farm", "Beloved"]
+    assert back["prev_before"] == back["books"][0]["id"]
+
+    assert browse_catalog({"copies": "3"}) == {"error": "Invalid value for copies: 3"}
+    assert "error" in browse_catalog({"shelf": "x"})
+
+
+def test_unfiltered_pages_served_from_snapshot(library_db, tmp_path, monkeypatch):
+    _seed()
+    expected = [browse_catalog({}, page_size=2), browse_catalog({}, page_size=2, after_id=1)]
+    catalog_snapshot.enable(str(tmp_path / "catalog.snapshot"))
+    try:
+        def no_query(filters, *args):
+            assert filters, "unfiltered pages should come from the snapshot"
+            return database.get_books_page(filters, *args)
+        monkeypatch.setattr(library_service, "get_books_page", no_query)
+        assert browse_catalog({}, page_size=2) == expected[0]
+        assert browse_catalog({}, page_size=2, after_id=1) == expected[1]
+        assert browse_catalog({}, page_size=2, before_id=expected[1]["prev_before"]) == dict(
+            expected[0], prev_before=None)
+        assert [b["title"] for b in browse_catalog({"letter": "B"})["books"]] == ["Beloved", "Brave New World"]
+    finally:
+        catalog_snapshot.disable()
+
+
+def test_catalog_and_api_routes(library_db):
+    client = create_app().test_client()
+    _seed()
+    page = client.get("/catalog?author=George+Orwell").get_data(as_text=True)
+    assert "Animal Farm" in page and "Beloved" not in page
+    assert "Clear filters" in page
+    assert "Previous page" not in client.get("/catalog").get_data(as_text=True)
+    page = client.get("/catalog?after=1").get_data(as_text=True)
+    assert "Previous page" in page and "before=" in page
+
+    data = client.get("/api/books?availability=unavailable").get_json()
+    # Sample data from create_app includes an unavailable copy of 1984
+    assert [b["title"] for b in data["books"]] == ["1984", "Brave New World"]
+    assert data["filters"] == {"availability": "unavailable"}
+    assert client.get("/api/books?letter=%3F").status_code == 400
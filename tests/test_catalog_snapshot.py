@@ -0,0 +1,93 @@
+import pytest
+import database
+from services import catalog_snapshot
+from services.catalog_snapshot import CatalogSnapshot, CatalogSnapshotWriter
+from library_service import add_book_to_catalog, browse_catalog, import_books, search_books_in_catalog
+
+
+@pytest.fixture
+def snapshot(library_db, tmp_path):
+    database.add_sample_data()
+    snap = catalog_snapshot.enable(str(tmp_path / "catalog.snapshot"))
+    yield snap
+    catalog_snapshot.disable()
+
+
+def test_snapshot_matches_database(snapshot):
+    assert snapshot.all_books() == database.get_all_books()
+    assert snapshot.get_book(2)["title"] == "To Kill a Mockingbird"
+    assert snapshot.get_book(99) is None
+
+
+def test_availability_patched_in_place(snapshot, tmp_path):
+    other_worker = CatalogSnapshot(str(tmp_path / "catalog.snapshot"))
+    generation = other_worker.generation
+
+    database.update_book_availability(1, -1)
+    assert other_worker.get_book(1)["available_copies"] == 2
+    assert other_worker.generation == generation
+    other_worker.close()
+
+
+def test_new_book_bumps_generation(snapshot, tmp_path):
+    other_worker = CatalogSnapshot(str(tmp_path / "catalog.snapshot"))
+    generation = other_worker.generation
+
+    database.insert_book("Brave New World", "Aldous Huxley", "9780060850524", 2, 2)
+    assert other_worker.generation != generation
+    assert len(other_worker) == 4
+    assert [b["title"] for b in search_books_in_catalog("brave", "title")] == ["Brave New World"]
+    other_worker.close()
+
+
+def test_added_book_is_found_immediately(snapshot):
+    assert add_book_to_catalog("Anathem", "Neal Stephenson", "9780061474095", 1)[0]
+
+    assert "Anathem" in [b["title"] for b in browse_catalog({})["books"]]
+    assert [b["title"] for b in search_books_in_catalog("anathem", "title")] == ["Anathem"]
+    assert [b["title"] for b in search_books_in_catalog("stephenson", "author")] == ["Anathem"]
+    assert [b["title"] for b in search_books_in_catalog("9780061474095", "isbn")] == ["Anathem"]
+
+
+def test_bulk_import_rebuilds_once(snapshot, monkeypatch):
+    writer = catalog_snapshot._writer
+    rebuilds = []
+    rebuild = writer.rebuild
+    monkeypatch.setattr(writer, "rebuild", lambda: rebuilds.append(1) or rebuild())
+
+    import_books([{"title": f"Zebra Book {n}", "author": "Z", "isbn": isbn, "total_copies": 1}
+                  for n, isbn in enumerate(["9780306406157", "9780804429573", "9781861972712"])])
+    assert len(rebuilds) == 1
+    assert len(snapshot) == 6
+
+
+def test_failed_rebuild_falls_back_to_sqlite(snapshot, monkeypatch):
+    writer = catalog_snapshot._writer
+    write_snapshot = catalog_snapshot.write_snapshot
+    monkeypatch.setattr(catalog_snapshot, "write_snapshot", lambda *args: 1 / 0)
+
+    database.insert_book("Brave New World", "Aldous Huxley", "9780060850524", 2, 2)
+    assert catalog_snapshot.get_snapshot() is None
+    assert [b["title"] for b in search_books_in_catalog("brave", "title")] == ["Brave New World"]
+
+    monkeypatch.setattr(catalog_snapshot, "write_snapshot", write_snapshot)
+    writer.rebuild()
+    assert catalog_snapshot.get_snapshot() is snapshot
+    assert len(snapshot) == 4
+
+
+def test_remap_keeps_old_mapping_for_readers(snapshot):
+    held = snapshot._current()
+    CatalogSnapshotWriter(snapshot.path).rebuild()
+    assert snapshot._current() is not held
+    # A reader still decoding from the previous generation can keep going
+    assert held[:8] == b"LIBCAT01"
+
+
+def test_unicode_titles_round_trip(library_db, tmp_path):
+    database.insert_book("Cien años de soledad", "Gabriel García Márquez", "9780307474728", 1, 1)
+    path = str(tmp_path / "catalog.snapshot")
+    CatalogSnapshotWriter(path).rebuild()
+    reader = CatalogSnapshot(path)
+    assert reader.all_books()[0]["author"] == "Gabriel García Márquez"
+    reader.close()
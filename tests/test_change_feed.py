@@ -0,0 +1,73 @@
+import database
+from services.change_feed import ChangeBus, format_sse, get_availability_bus, stream_events
+
+
+def test_ring_buffer_resume_and_missed_events():
+    bus = ChangeBus(capacity=3)
+    for i in range(5):
+        bus.publish("availability", {"book_id": i})
+
+    events, missed = bus.events_since(3)
+    assert [e[0] for e in events] == [4, 5]
+    assert not missed
+
+    events, missed = bus.events_since(1)
+    assert [e[0] for e in events] == [3, 4, 5]
+    assert missed
+    assert bus.wait(5, timeout=0.01) == ([], False)
+
+
+def test_last_event_id_ahead_of_bus_resets():
+    bus = ChangeBus()
+    bus.publish("availability", {"book_id": 1})
+    assert bus.events_since(50) == ([], True)
+    assert bus.wait(50, timeout=5) == ([], True)
+
+    # e.g. a client reconnecting after the server restarted
+    stream = stream_events(bus, 50, heartbeat=0.01)
+    assert next(stream).startswith("retry:")
+    assert next(stream) == format_sse(None, "reset", {"last_event_id": 1})
+    bus.publish("availability", {"book_id": 2})
+    assert next(stream).startswith("id: 2\n")
+
+
+def test_write_paths_publish_availability(library_db):
+    start = get_availability_bus().last_id
+    database.insert_book("Book", "Author", "0000000000001", 2, 2)
+    database.update_book_availability(1, -1)
+
+    events, _ = get_availability_bus().events_since(start)
+    assert [e[1] for e in events] == ["book_added", "availability"]
+    assert events[1][2] == {"book_id": 1, "available_copies": 1, "total_copies": 2}
+
+
+
+def test_each_database_has_its_own_bus(library_db, tmp_path):
+    main_bus = get_availability_bus()
+    start = main_bus.last_id
+    with database.use_database(str(tmp_path / "north.db")):
+        database.init_database()
+        north_bus = get_availability_bus()
+        database.insert_book("Book", "Author", "0000000000001", 2, 2)
+    assert north_bus is not main_bus
+    assert main_bus.last_id == start
+    assert [e[1] for e in north_bus.events_since(0)[0]] == ["book_added"]
+
+def test_stream_endpoint_resumes_from_last_event_id(library_db):
+    from app import create_app
+    client = create_app().test_client()
+    start = get_availability_bus().last_id
+    database.update_book_availability(1, -1)
+
+    response = client.get("/api/stream/availability", headers={"Last-Event-ID": str(start)}, buffered=False)
+    assert response.mimetype == "text/event-stream"
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b"retry:")
+    message = next(chunks).decode()
+    response.close()
+    assert message.startswith(f"id: {start + 1}\nevent: availability\n")
+    assert '"available_copies":2' in message
+
+
+def test_format_sse():
+    assert format_sse(7, "reset", {"a": 1}) == 'id: 7\nevent: reset\ndata: {"a":1}\n\n'
@@ -0,0 +1,90 @@
+import sqlite3
+from datetime import datetime, timedelta
+import database
+from library_service import calculate_late_fee_for_book
+
+
+def _borrow(patron_id, book_id, borrowed, due):
+    database.insert_book("Book", "Author", f"{book_id:013d}", 1, 1)
+    database.insert_borrow_record(patron_id, book_id, borrowed, due)
+
+
+def test_epoch_round_trip():
+    moment = datetime(2025, 9, 1, 12, 30, 15)
+    assert database.from_epoch(database.to_epoch(moment)) == moment
+    assert database.from_epoch(None) is None
+
+
+def test_dates_stored_as_integers(library_db):
+    now = datetime.now()
+    _borrow("123456", 1, now, now + timedelta(days=14))
+
+    conn = sqlite3.connect(library_db)
+    types = conn.execute("SELECT typeof(borrow_date), typeof(due_date) FROM borrow_records").fetchone()
+    conn.close()
+    assert types == ("integer", "integer")
+
+
+def test_borrowed_books_overdue_flag(library_db):
+    now = datetime.now()
+    _borrow("123456", 1, now - timedelta(days=20), now - timedelta(days=6))
+    database.insert_book("Other", "Author", "0000000000002", 1, 1)
+    database.insert_borrow_record("123456", 2, now, now + timedelta(days=14))
+
+    books = {b["book_id"]: b for b in database.get_patron_borrowed_books("123456")}
+    assert books[1]["is_overdue"] is True
+    assert books[2]["is_overdue"] is False
+    assert isinstance(books[1]["due_date"], datetime)
+
+
+def test_late_fee_computed_from_integer_dates(library_db):
+    now = datetime.now()
+    _borrow("123456", 1, now - timedelta(days=24), now - timedelta(days=10, hours=1))
+
+    result = calculate_late_fee_for_book("123456", 1)
+    assert result["days_overdue"] == 10
+    assert result["fee_amount"] == 6.5
+
+
+def test_overdue_query_uses_partial_index(library_db):
+    now = datetime.now()
+    _borrow("123456", 1, now - timedelta(days=20), now - timedelta(days=6))
+
+    overdue = database.get_overdue_borrow_records(now)
+    assert [r["book_id"] for r in overdue] == [1]
+    assert overdue[0]["days_overdue"] == 6
+
+    conn = sqlite3.connect(library_db)
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM borrow_records WHERE due_date < ? AND return_date IS NULL",
+        (database.to_epoch(now),),
+    ).fetchall()
+    conn.close()
+    assert "idx_borrow_records_active_due" in " ".join(row[-1] for row in plan)
+
+
+def test_migrates_text_dates(tmp_path, monkeypatch):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE borrow_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, patron_id TEXT NOT NULL, book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL, due_date TEXT NOT NULL, return_date TEXT)
+    """)
+    conn.execute(
+        "INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date) VALUES (?, ?, ?, ?, ?)",
+        ("123456", 1, "2025-09-01T10:00:00.250000", "2025-09-15T10:00:00.250000", None),
+    )
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(database, "DATABASE", path)
+    database.init_database()
+    database.init_database()  # re-running is a no-op
+
+    conn = sqlite3.connect(path)
+    row = conn.execute("SELECT borrow_date, due_date, return_date FROM borrow_records").fetchone()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.close()
+    assert row == (database.to_epoch(datetime(2025, 9, 1, 10)), database.to_epoch(datetime(2025, 9, 15, 10)), None)
+    assert version == database.SCHEMA_VERSION
@@ -0,0 +1,141 @@
+import json
+from datetime import datetime, timedelta
+import database
+from services.due_date_scheduler import DueDateScheduler, FileNotifier, QueueNotifier, DUE_SOON, NOW_OVERDUE
+
+START = datetime(2025, 10, 1, 9, 0, 0)
+
+
+def _drain(notifier):
+    items = []
+    while not notifier.queue.empty():
+        kind, loan = notifier.queue.get()
+        items.append((kind, loan["book_id"]))
+    return items
+
+
+def test_fires_due_soon_then_overdue(library_db):
+    database.insert_borrow_record("123456", 1, START, START + timedelta(days=3))
+    database.insert_borrow_record("123456", 2, START, START - timedelta(days=1))  # already overdue
+    notifier = QueueNotifier()
+    scheduler = DueDateScheduler(notifier, due_soon=timedelta(days=2), clock=lambda: START)
+    scheduler.load(START)
+
+    assert scheduler.tick(START) == 0
+    assert scheduler.tick(START + timedelta(days=1)) == 1
+    assert scheduler.tick(START + timedelta(days=3)) == 1
+    assert _drain(notifier) == [(DUE_SOON, 1), (NOW_OVERDUE, 1)]
+    assert len(scheduler) == 0
+    scheduler.stop()
+
+
+def test_follows_borrow_and_return_events(library_db):
+    notifier = QueueNotifier()
+    scheduler = DueDateScheduler(notifier, due_soon=timedelta(days=2), clock=lambda: START)
+    scheduler.load(START)
+
+    database.insert_borrow_record("123456", 1, START, START + timedelta(days=4))
+    database.insert_borrow_record("654321", 2, START, START + timedelta(days=4))
+    database.update_borrow_record_return_date("654321", 2, START + timedelta(hours=1))
+
+    scheduler.tick(START + timedelta(days=5))
+    assert _drain(notifier) == [(DUE_SOON, 1), (NOW_OVERDUE, 1)]
+    scheduler.stop()
+
+
+
+def test_ignores_loans_in_other_databases(library_db, tmp_path):
+    notifier = QueueNotifier()
+    scheduler = DueDateScheduler(notifier, due_soon=timedelta(days=2), clock=lambda: START)
+    scheduler.load(START)
+
+    with database.use_database(str(tmp_path / "north.db")):
+        database.init_database()
+        database.insert_borrow_record("123456", 1, START, START + timedelta(days=4))
+    scheduler.tick(START + timedelta(days=5))
+    assert _drain(notifier) == []
+    scheduler.stop()
+
+def test_window_advances_in_pages(library_db):
+    for i in range(12):
+        database.insert_borrow_record("123456", i + 1, START, START + timedelta(days=3 + i))
+    notifier = QueueNotifier()
+    scheduler = DueDateScheduler(notifier, due_soon=timedelta(days=1), lookahead=timedelta(days=2),
+                                 page_size=2, clock=lambda: START)
+    scheduler.load(START)
+    assert len(scheduler) == 1
+
+    scheduler.tick(START + timedelta(days=20))
+    assert len([k for k, _ in _drain(notifier) if k == NOW_OVERDUE]) == 12
+    scheduler.stop()
+
+
+
+def test_loan_returned_while_window_loads_is_not_scheduled(library_db, monkeypatch):
+    from services import due_date_scheduler
+    database.insert_borrow_record("123456", 1, START, START + timedelta(days=3))
+    page_loans = due_date_scheduler.get_active_loans_by_due_date
+
+    def page_then_return(*args):
+        page = page_loans(*args)
+        database.update_borrow_record_return_date("123456", 1, START + timedelta(hours=1))
+        return page
+
+    monkeypatch.setattr(due_date_scheduler, "get_active_loans_by_due_date", page_then_return)
+    notifier = QueueNotifier()
+    scheduler = DueDateScheduler(notifier, due_soon=timedelta(days=2), clock=lambda: START)
+    scheduler.load(START)
+    scheduler.tick(START + timedelta(days=5))
+    assert _drain(notifier) == []
+    scheduler.stop()
+
+
+def test_concurrent_ticks_page_each_window_once(library_db, monkeypatch):
+    import threading
+    import time
+    from services import due_date_scheduler
+    database.insert_borrow_record("123456", 1, START, START + timedelta(days=10))
+    notifier = QueueNotifier()
+    scheduler = DueDateScheduler(notifier, due_soon=timedelta(days=2), clock=lambda: START)
+    scheduler.load(START)
+
+    page_loans = due_date_scheduler.get_active_loans_by_due_date
+    calls = []
+
+    def slow_page(*args):
+        calls.append(args)
+        time.sleep(0.1)
+        return page_loans(*args)
+
+    monkeypatch.setattr(due_date_scheduler, "get_active_loans_by_due_date", slow_page)
+    ticks = [threading.Thread(target=scheduler.tick, args=(START + timedelta(days=3),)) for _ in range(2)]
+    for thread in ticks:
+        thread.start()
+    for thread in ticks:
+        thread.join()
+    assert len(calls) == 1
+    assert len(scheduler) == 1
+    scheduler.stop()
+
+def test_file_notifier_writes_json_lines(tmp_path):
+    path = tmp_path / "notices.jsonl"
+    FileNotifier(str(path)).notify(NOW_OVERDUE, {"id": 1, "due_date": START})
+    assert json.loads(path.read_text())["kind"] == NOW_OVERDUE
+
+
+def test_create_app_runs_scheduler(library_db, tmp_path):
+    import time
+    from app import create_app
+    now = datetime.now()
+    database.insert_book("Book", "Author", "0000000000001", 1, 0)
+    # Becomes "due soon" (two days out) a second after the app starts
+    database.insert_borrow_record("123456", 1, now - timedelta(days=10), now + timedelta(days=2, seconds=1))
+    path = tmp_path / "notifications.jsonl"
+    app = create_app({"DUE_DATE_NOTIFICATIONS": str(path)})
+    try:
+        deadline = time.monotonic() + 5
+        while not path.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert json.loads(path.read_text().splitlines()[0])["kind"] == DUE_SOON
+    finally:
+        app.extensions["due_date_scheduler"].stop()
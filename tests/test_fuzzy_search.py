@@ -0,0 +1,40 @@
+from services import fuzzy_search
+from services.fuzzy_search import FuzzyIndex, edit_distance
+from library_service import search_books_in_catalog
+import database
+
+BOOKS = [
+    {"id": 1, "title": "The Great Gatsby", "author": "F. Scott Fitzgerald"},
+    {"id": 2, "title": "1984", "author": "George Orwell"},
+    {"id": 3, "title": "Animal Farm", "author": "George Orwell"},
+]
+
+
+def test_edit_distance_counts_transposition_once():
+    assert edit_distance("fitzgerlad", "fitzgerald", 2) == 1
+    assert edit_distance("orwel", "orwell", 2) == 1
+    assert edit_distance("abc", "xyz", 1) == 2
+
+
+def test_typos_match_within_budget():
+    index = FuzzyIndex.build(BOOKS)
+    assert index.search("Fitzgerlad") == [(1, 1)]
+    assert [b for b, _ in index.search("orwel")] == [2, 3]
+    assert [b for b, _ in index.search("orwel aminal")] == [3]
+    assert index.search("zzzzzz") == []
+
+
+def test_exact_match_ranks_first():
+    index = FuzzyIndex.build(BOOKS + [{"id": 4, "title": "Farms of Iowa", "author": "Anon"}])
+    assert index.search("farm")[0] == (3, 0)
+
+
+def test_fuzzy_search_type_and_incremental_add(library_db, monkeypatch):
+    monkeypatch.setattr(fuzzy_search, "_indexes", {})
+    database.add_sample_data()
+
+    results = search_books_in_catalog("Fitzgerlad", "fuzzy")
+    assert [b["title"] for b in results] == ["The Great Gatsby"]
+
+    database.insert_book("Brave New World", "Aldous Huxley", "9780060850524", 1, 1)
+    assert [b["title"] for b in search_books_in_catalog("huxly", "fuzzy")] == ["Brave New World"]
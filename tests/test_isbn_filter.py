@@ -0,0 +1,115 @@
+import database
+from library_service import add_book_to_catalog, import_books
+from services import catalog_snapshot, isbn_filter, suggest_service
+from services.isbn_filter import BloomFilter, IsbnFilter, filter_path, isbn_forms, normalize_isbn
+
+
+def test_normalize_and_validate():
+    assert normalize_isbn("0-306-40615-2") == "9780306406157"
+    assert normalize_isbn("978-0-306-40615-7") == "9780306406157"
+    assert normalize_isbn("080442957X") == "9780804429573"
+    assert normalize_isbn("0306406153") is None
+    assert normalize_isbn("1234567890123") is None
+    assert isbn_forms("9780306406157") == ["9780306406157", "0306406152"]
+
+
+def test_bloom_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    for i in range(5000):
+        bloom.add(f"present-{i}")
+    assert all(f"present-{i}" in bloom for i in range(5000))
+    false_positives = sum(f"absent-{i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.03
+
+
+def test_add_book_detects_equivalent_isbn(library_db, monkeypatch):
+    monkeypatch.setattr(isbn_filter, "_filters", {})
+    assert add_book_to_catalog("Book", "Author", "9780306406157", 1)[0]
+    success, message = add_book_to_catalog("Book", "Author", "0-306-40615-2", 1)
+    assert not success
+    assert message == "A book with this ISBN already exists."
+    # A book another process added after this filter was loaded is still a duplicate
+    database.remove_change_listener(isbn_filter._on_change)
+    database.insert_book("Hidden", "Author", "9999999999994", 1, 1)
+    database.add_change_listener(isbn_filter._on_change)
+    assert not isbn_filter.get_isbn_filter().might_contain("9999999999994")
+    assert add_book_to_catalog("Hidden", "Author", "9999999999994", 1) == \
+        (False, "A book with this ISBN already exists.")
+
+
+def test_filter_persists_and_catches_up(library_db, monkeypatch):
+    database.insert_book("A", "Author", "9780306406157", 1, 1)
+    path = filter_path(library_db)
+    IsbnFilter.load_or_build(path)
+
+    # Inserted by "another process" after the filter was saved
+    database.insert_book("B", "Author", "9780804429573", 1, 1)
+    loaded = IsbnFilter.load_or_build(path)
+    assert loaded.might_contain("080442957X")
+    assert loaded.max_book_id == 2
+
+    # A replaced database is detected and the filter rebuilt
+    conn = database.get_db_connection()
+    conn.execute("DELETE FROM books")
+    conn.execute("INSERT INTO books (id, title, author, isbn, total_copies, available_copies) "
+                 "VALUES (2, 'C', 'Author', '9781861972712', 1, 1)")
+    conn.commit()
+    conn.close()
+    rebuilt = IsbnFilter.load_or_build(path)
+    assert rebuilt.might_contain("9781861972712")
+    assert rebuilt.last_isbn == "9781861972712"
+
+
+def test_import_books(library_db, monkeypatch):
+    monkeypatch.setattr(isbn_filter, "_filters", {})
+    database.insert_book("Existing", "Author", "9780306406157", 1, 1)
+    result = import_books([
+        {"title": "Dup as ISBN-10", "author": "A", "isbn": "0306406152", "total_copies": 1},
+        {"title": "New", "author": "B", "isbn": "0-8044-2957-X", "total_copies": 2},
+        {"title": "New again", "author": "B", "isbn": "9780804429573", "total_copies": 2},
+        {"title": "Bad checksum", "author": "C", "isbn": "1234567890123", "total_copies": 1},
+        {"title": "", "author": "C", "isbn": "9781861972712", "total_copies": 1},
+    ])
+    assert result == {"added": 1, "duplicates": 2, "invalid": 2, "invalid_rows": [3, 4]}
+    assert database.get_book_by_isbn("9780804429573")["total_copies"] == 2
+
+
+def test_import_publishes_one_batch_event(library_db, monkeypatch, tmp_path):
+    monkeypatch.setattr(isbn_filter, "_filters", {})
+    index = suggest_service.get_suggest_index()
+    isbn_filter.get_isbn_filter()
+    monkeypatch.setattr(suggest_service, "get_book_by_isbn", None)
+    writer = catalog_snapshot.CatalogSnapshotWriter(str(tmp_path / "catalog.snapshot"))
+    rebuilds = []
+    monkeypatch.setattr(writer, "rebuild", lambda: rebuilds.append(1))
+    events = []
+    listener = lambda event_type, data: events.append((event_type, data))
+    database.add_change_listener(listener)
+    database.add_change_listener(writer.on_change)
+    try:
+        result = import_books([
+            {"title": f"Zebra Book {n}", "author": "Z", "isbn": isbn, "total_copies": 1}
+            for n, isbn in enumerate(["9780306406157", "9780804429573", "9781861972712"])
+        ])
+    finally:
+        database.remove_change_listener(listener)
+        database.remove_change_listener(writer.on_change)
+    assert result["added"] == 3
+    assert [event_type for event_type, _ in events] == ["books_added"]
+    assert [b["isbn"] for b in events[0][1]["books"]] == ["9780306406157", "9780804429573", "9781861972712"]
+    assert rebuilds == [1]
+    # The suggest index is fed the inserted rows without looking each one up
+    assert {s["text"] for s in index.suggest("zebra", 5)} == {"Zebra Book 0", "Zebra Book 1", "Zebra Book 2"}
+    assert isbn_filter.get_isbn_filter().might_contain("9781861972712")
+
+
+def test_add_book_validates_and_normalizes_isbn(library_db, monkeypatch):
+    monkeypatch.setattr(isbn_filter, "_filters", {})
+    assert add_book_to_catalog("T", "A", "9780306406158", 1) == \
+        (False, "ISBN must be 13 digits (or an ISBN-10) with a valid check digit.")
+    assert not add_book_to_catalog("T", "A", "abcdefghijklm", 1)[0]
+
+    assert add_book_to_catalog("T", "A", "0-306-40615-2", 1)[0]
+    assert database.get_book_by_isbn("9780306406157")["title"] == "T"
+    result = import_books([{"title": "T", "author": "A", "isbn": "9780306406157", "total_copies": 1}])
+    assert result["added"] == 0 and result["duplicates"] == 1
@@ -0,0 +1,74 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+import database
+from library_service import borrow_book_by_patron, calculate_late_fee_for_book
+from services import loan_policy
+from services.loan_policy import LoanPolicy, configure_loan_policy, get_loan_policy
+
+POLICY = {
+    "default": {"max_loans": 5, "loan_days": 14},
+    "patron_classes": {"staff": {"patrons": ["200001"], "max_loans": 1, "loan_days": 28}},
+    "collections": {"reserve": {"books": [1], "loan_days": 3, "fee_tiers": [[None, 2.0]], "fee_cap": None}},
+    "rules": [{"patron_class": "staff", "collection": "reserve", "loan_days": 7}],
+}
+
+
+def _legacy_fee(days):
+    if days <= 0:
+        return 0.0
+    fee = 0.5 * days if days <= 7 else (0.5 * 7) + (1.0 * (days - 7))
+    return round(min(fee, 15.0), 2)
+
+
+def test_default_policy_matches_original_rules():
+    policy = LoanPolicy.compile(loan_policy.DEFAULT_POLICY)
+    days = list(range(-5, 400))
+    assert [policy.late_fee("123456", 1, d) for d in days] == [_legacy_fee(d) for d in days]
+    assert policy.late_fees(("123456", 1, d) for d in days) == [_legacy_fee(d) for d in days]
+    rule = policy.rule_for("123456", 1)
+    assert (rule.max_loans, rule.loan_days) == (5, 14)
+    assert policy.due_dates([("123456", 1, 1000)]) == [1000 + 14 * 86400]
+
+
+def test_rule_precedence_and_bulk_evaluation(tmp_path):
+    path = tmp_path / "policy.json"
+    path.write_text(json.dumps(POLICY))
+    policy = configure_loan_policy(str(path))
+    try:
+        assert get_loan_policy() is policy
+        assert policy.rule_for("200001", 2).loan_days == 28
+        assert policy.rule_for("200001", 1).loan_days == 7
+        assert policy.rule_for("123456", 1).loan_days == 3
+        assert policy.rule_for("200001", 1).max_loans == 1
+
+        # Uncapped reserve fees keep growing past the fee table
+        loans = [("123456", 1, 5), ("123456", 2, 5), ("123456", 1, 5000), ("123456", 2, 0)]
+        assert policy.late_fees(loans) == [10.0, 2.5, 10000.0, 0.0]
+    finally:
+        configure_loan_policy(None)
+
+
+def test_invalid_policies():
+    with pytest.raises(ValueError):
+        LoanPolicy.compile({"patron_classes": {}})
+    with pytest.raises(ValueError):
+        LoanPolicy.compile({"default": {}, "rules": [{"patron_class": "nobody"}]})
+    with pytest.raises(ValueError):
+        LoanPolicy.compile({"default": {"fee_tiers": [[7, 0.5], [5, 1.0]]}})
+
+
+def test_borrow_and_fees_follow_policy(library_db, monkeypatch):
+    monkeypatch.setattr(loan_policy, "_policy", LoanPolicy.compile(POLICY))
+    database.insert_book("Reserve Book", "Author", "1000000000001", 2, 2)
+    database.insert_book("Other Book", "Author", "1000000000002", 2, 2)
+
+    success, message = borrow_book_by_patron("200001", 1)
+    assert success
+    assert (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d") in message
+    success, message = borrow_book_by_patron("200001", 2)
+    assert not success and "limit of 1 books" in message
+
+    borrowed = datetime.now() - timedelta(days=10)
+    database.insert_borrow_record("123456", 1, borrowed, borrowed + timedelta(days=3))
+    assert calculate_late_fee_for_book("123456", 1)["fee_amount"] == 14.0
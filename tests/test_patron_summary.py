@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+import database
+from library_service import (
+    borrow_book_by_patron, return_book_by_patron, get_patron_status_report,
+    verify_patron_summary, pay_late_fees
+)
+from services.library_service import get_patron_borrow_history
+
+
+def _add_books(count):
+    for i in range(1, count + 1):
+        database.insert_book(f"Book {i}", "Author", f"{i:013d}", 2, 2)
+
+
+def test_summary_materialized_from_existing_history(library_db):
+    _add_books(2)
+    now = datetime.now()
+    database.insert_borrow_record("123456", 1, now - timedelta(days=30), now - timedelta(days=16))
+    database.update_borrow_record_return_date("123456", 1, now - timedelta(days=6))
+    database.insert_borrow_record("123456", 2, now - timedelta(days=20), now - timedelta(days=3, hours=1))
+
+    report = get_patron_status_report("123456")
+    assert report["borrow_count"] == 1
+    assert report["total_late_fees"] == 8.0  # 10 days late on return + 3 days accruing
+    assert database.get_patron_summary("123456")["fees_incurred"] == 6.5
+    assert verify_patron_summary("123456") == {}
+
+
+def test_summary_updated_incrementally(library_db):
+    _add_books(3)
+    get_patron_status_report("123456")  # no activity yet, nothing stored
+    borrow_book_by_patron("123456", 1)
+    assert database.get_patron_summary("123456") is None
+
+    get_patron_status_report("123456")
+    borrow_book_by_patron("123456", 2)
+    borrow_book_by_patron("123456", 3)
+    return_book_by_patron("123456", 2)
+
+    summary = database.get_patron_summary("123456")
+    assert summary["active_loans"] == 2
+    assert verify_patron_summary("123456") == {}
+
+
+def test_payment_reduces_total(library_db):
+    _add_books(1)
+    now = datetime.now()
+    database.insert_borrow_record("123456", 1, now - timedelta(days=20), now - timedelta(days=4, hours=1))
+    assert get_patron_status_report("123456")["total_late_fees"] == 2.0
+
+    gateway = Mock()
+    gateway.process_payment.return_value = {"status": "success", "transaction_id": "TX9"}
+    assert pay_late_fees("123456", 1, gateway)[0]
+    assert get_patron_status_report("123456")["total_late_fees"] == 0.0
+
+
+def test_history_is_paginated(library_db):
+    _add_books(1)
+    now = datetime.now()
+    for day in range(25):
+        database.insert_borrow_record("123456", 1, now - timedelta(days=100 - day), now - timedelta(days=90 - day))
+        database.update_borrow_record_return_date("123456", 1, now - timedelta(days=95 - day))
+
+    assert len(get_patron_status_report("123456")["borrow_history"]) == 20
+    page = get_patron_borrow_history("123456", limit=10, offset=20)
+    assert len(page) == 5
+    assert page[0]["borrow_date"] < page[-1]["borrow_date"]
+
+
+def test_borrow_during_materialization_is_not_lost(library_db, monkeypatch):
+    import threading
+    import time
+    from services import library_service
+    _add_books(2)
+    borrow_book_by_patron("123456", 1)
+
+    # A borrow arriving while the summary is being computed waits for it to be stored
+    fees_paid = library_service.get_patron_fees_paid
+    borrower = threading.Thread(target=borrow_book_by_patron, args=("123456", 2))
+
+    def slow_fees_paid(patron_id):
+        borrower.start()
+        time.sleep(0.2)
+        return fees_paid(patron_id)
+
+    monkeypatch.setattr(library_service, "get_patron_fees_paid", slow_fees_paid)
+    assert get_patron_status_report("123456")["borrow_count"] == 1
+    borrower.join()
+    monkeypatch.setattr(library_service, "get_patron_fees_paid", fees_paid)
+
+    assert database.get_patron_summary("123456")["active_loans"] == 2
+    assert verify_patron_summary("123456") == {}
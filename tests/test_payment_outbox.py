@@ -0,0 +1,177 @@
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+import database
+from library_service import (
+    calculate_late_fee_for_book, submit_late_fee_payment, refund_late_fee_payment, verify_patron_summary,
+    get_patron_status_report, return_book_by_patron
+)
+from services.payment_worker import PaymentSettlementWorker
+
+
+def _overdue_loan(days_late=4):
+    now = datetime.now()
+    database.insert_book("Book", "Author", "0000000000001", 1, 0)
+    database.insert_borrow_record("123456", 1, now - timedelta(days=20), now - timedelta(days=days_late, hours=1))
+
+
+def _gateway(*responses):
+    gateway = Mock()
+    gateway.process_payment.side_effect = list(responses)
+    return gateway
+
+
+def test_submit_queues_without_calling_gateway(library_db):
+    _overdue_loan()
+    success, msg = submit_late_fee_payment("123456", 1)
+    assert success and "queued" in msg
+
+    payment = database.get_payment(1)
+    assert payment["status"] == "pending"
+    assert payment["amount"] == 2.0
+    assert not submit_late_fee_payment("123456", 1)[0]  # already in flight
+
+
+def test_worker_settles_and_fee_is_subtracted(library_db):
+    _overdue_loan()
+    get_patron_status_report("123456")
+    submit_late_fee_payment("123456", 1)
+
+    worker = PaymentSettlementWorker(_gateway({"status": "success", "transaction_id": "TX1"}))
+    assert worker.drain() == 1
+
+    payment = database.get_payment(1)
+    assert payment["status"] == "settled" and payment["transaction_id"] == "TX1"
+    fee = calculate_late_fee_for_book("123456", 1)
+    assert fee["fee_amount"] == 0.0 and fee["status"] == "Paid"
+    assert verify_patron_summary("123456") == {}
+
+
+def test_failed_attempts_back_off_then_give_up(library_db):
+    _overdue_loan()
+    submit_late_fee_payment("123456", 1)
+    worker = PaymentSettlementWorker(_gateway({"status": "failed", "error": "Declined"}, Exception("timeout")),
+                                     max_attempts=2, base_delay=0)
+
+    worker.drain()
+    payment = database.get_payment(1)
+    assert payment["status"] == "failed"
+    assert payment["attempts"] == 2
+    assert payment["last_error"] == "timeout"
+
+
+def test_refund_reopens_fee(library_db):
+    _overdue_loan()
+    get_patron_status_report("123456")
+    submit_late_fee_payment("123456", 1)
+    PaymentSettlementWorker(_gateway({"status": "success", "transaction_id": "TX1"})).drain()
+
+    gateway = Mock()
+    gateway.refund_payment.return_value = {"status": "success", "refund_id": "RF1"}
+    assert refund_late_fee_payment("TX1", 2.0, gateway)[0]
+
+    assert database.get_payment(1)["refund_id"] == "RF1"
+    assert calculate_late_fee_for_book("123456", 1)["fee_amount"] == 2.0
+    assert verify_patron_summary("123456") == {}
+
+
+def test_pay_late_fee_endpoint_settles_with_worker(library_db, monkeypatch):
+    import time
+    import app as app_module
+    _overdue_loan()
+    monkeypatch.setattr(app_module, "PaymentGateway",
+                        lambda: _gateway({"status": "success", "transaction_id": "TX1"}))
+    app = app_module.create_app({"PAYMENT_WORKERS": 1})
+    client = app.test_client()
+    try:
+        response = client.post("/api/pay_late_fee", data={"patron_id": "123456", "book_id": "1"})
+        assert response.status_code == 202
+        deadline = time.monotonic() + 5
+        while client.get("/api/payments/1").get_json()["status"] != "settled" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert client.get("/api/payments/1").get_json()["transaction_id"] == "TX1"
+    finally:
+        app.extensions["payment_worker"].stop()
+
+
+def test_pay_late_fee_endpoint_refuses_without_worker(library_db):
+    from app import create_app
+    _overdue_loan()
+    client = create_app({"PAYMENT_WORKERS": 0}).test_client()
+
+    response = client.post("/api/pay_late_fee", data={"patron_id": "123456", "book_id": "1"})
+    assert response.status_code == 503
+    assert database.get_payment(1) is None
+
+
+def test_one_open_payment_per_loan_is_enforced_by_the_database(library_db):
+    _overdue_loan()
+    assert database.insert_payment("123456", 1, 1, 2.0) == 1
+    assert database.insert_payment("123456", 1, 1, 2.0) is None
+    # Settled and failed payments don't block a new one
+    assert database.insert_payment("123456", 1, 1, 2.0, database.PAYMENT_SETTLED, "TX0") is not None
+
+
+def test_stale_claim_cannot_settle(library_db):
+    _overdue_loan()
+    submit_late_fee_payment("123456", 1)
+    [stale] = database.claim_due_payments(1)
+    # The lease expires and another worker claims the payment again
+    [current] = database.claim_due_payments(1, lease_seconds=-1)
+    assert current["claim_token"] != stale["claim_token"]
+
+    assert not database.settle_payment(1, stale["claim_token"], "TX-STALE")
+    assert not database.retry_payment(1, stale["claim_token"], 1, datetime.now(), "late")
+    assert database.settle_payment(1, current["claim_token"], "TX1")
+    assert database.get_payment(1)["transaction_id"] == "TX1"
+
+
+def test_charge_after_lost_lease_is_recorded_or_refunded(library_db):
+    _overdue_loan()
+    get_patron_status_report("123456")
+    submit_late_fee_payment("123456", 1)
+    keys = []
+
+    def slow_charge(patron_id, amount, idempotency_key=None):
+        keys.append(idempotency_key)
+        # The call outlives the lease and another worker claims the payment
+        database.claim_due_payments(1, lease_seconds=-1)
+        return {"status": "success", "transaction_id": "TX1"}
+
+    gateway = Mock()
+    gateway.process_payment.side_effect = slow_charge
+    worker = PaymentSettlementWorker(gateway)
+    assert worker.drain() == 1
+    payment = database.get_payment(1)
+    assert (payment["status"], payment["transaction_id"]) == ("settled", "TX1")
+    assert database.get_patron_summary("123456")["fees_paid"] == 2.0
+    assert keys == ["late-fee-payment-1"]
+
+    # A second charge for the already settled payment under another transaction is refunded
+    gateway = _gateway({"status": "success", "transaction_id": "TX2"})
+    gateway.refund_payment.return_value = {"status": "success", "refund_id": "RF1"}
+    claim = dict(payment, claim_token="lost")
+    assert not PaymentSettlementWorker(gateway).process(claim)
+    gateway.refund_payment.assert_called_once_with("TX2", 2.0)
+    assert database.get_payment(1)["transaction_id"] == "TX1"
+    assert database.get_patron_summary("123456")["fees_paid"] == 2.0
+
+    # The same transaction reported again (an idempotent retry) is not refunded
+    gateway = _gateway({"status": "success", "transaction_id": "TX1"})
+    assert not PaymentSettlementWorker(gateway).process(claim)
+    gateway.refund_payment.assert_not_called()
+
+
+def test_pay_then_return_keeps_summary_consistent(library_db):
+    now = datetime.now()
+    database.insert_book("Book", "Author", "0000000000001", 1, 0)
+    database.insert_borrow_record("123456", 1, now - timedelta(days=20), now - timedelta(days=4, hours=1))
+    get_patron_status_report("123456")
+
+    submit_late_fee_payment("123456", 1)
+    PaymentSettlementWorker(_gateway({"status": "success", "transaction_id": "TX1"})).drain()
+    success, message = return_book_by_patron("123456", 1)
+    assert success and "No late fees" in message
+
+    assert verify_patron_summary("123456") == {}
+    summary = database.get_patron_summary("123456")
+    assert (summary["fees_incurred"], summary["fees_paid"]) == (2.0, 2.0)
@@ -0,0 +1,97 @@
+from services.rate_limit import AdmissionController, MemoryBucketStore, SQLiteBucketStore
+
+
+def test_bucket_allows_burst_then_refills():
+    store = MemoryBucketStore()
+    assert all(store.take("ip:1", 1.0, 3, now=0.0)[0] for _ in range(3))
+
+    allowed, retry_after = store.take("ip:1", 1.0, 3, now=0.0)
+    assert not allowed
+    assert retry_after == 1.0
+    assert store.take("ip:1", 1.0, 3, now=1.0)[0]
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryBucketStore(max_keys=2)
+    store.take("ip:1", 1.0, 1, now=0.0)
+    store.take("ip:2", 1.0, 1, now=0.0)
+    store.take("ip:1", 1.0, 1, now=0.0)
+    store.take("ip:3", 1.0, 1, now=0.0)
+    assert len(store) == 2
+    # ip:2 was evicted and starts over with a full bucket; ip:1 is still empty
+    assert store.take("ip:2", 1.0, 1, now=0.0)[0]
+    assert not store.take("ip:3", 1.0, 1, now=0.0)[0]
+
+
+def test_sqlite_store_fails_open_when_locked(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "limits.db")
+    store = SQLiteBucketStore(path)
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("BEGIN EXCLUSIVE")
+    try:
+        assert store.take("patron:123456", 1.0, 0, now=100.0) == (True, 0.0)
+    finally:
+        holder.close()
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "limits.db")
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+    assert first.take("patron:123456", 1.0, 1, now=100.0)[0]
+    assert not second.take("patron:123456", 1.0, 1, now=100.0)[0]
+
+
+def test_admission_bounds_in_flight_and_sheds_on_slow_writes():
+    clock = [0.0]
+    controller = AdmissionController(max_in_flight=1, slo_ms=100, window=2, cooldown=5, clock=lambda: clock[0])
+    assert controller.try_enter()[0]
+    assert controller.try_enter() == (False, 1.0)
+
+    controller.leave(0.5)
+    controller.try_enter()
+    controller.leave(0.5)
+    admitted, retry_after = controller.try_enter()
+    assert not admitted and retry_after == 5
+
+    clock[0] = 6.0
+    assert controller.try_enter()[0]
+
+
+def test_late_fee_polling_gets_429(library_db):
+    from app import create_app
+    client = create_app({"RATE_LIMIT_IP": (0.001, 2)}).test_client()
+
+    assert client.get("/api/late_fee/123456/1").status_code == 200
+    assert client.get("/api/late_fee/123456/1").status_code == 200
+    response = client.get("/api/late_fee/123456/1")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert client.get("/catalog").status_code == 200
+
+
+def test_form_submissions_flash_and_redirect(library_db):
+    from app import create_app
+    client = create_app({"RATE_LIMIT_IP": (0.001, 1)}).test_client()
+
+    client.post("/return", data={"patron_id": "123456", "book_id": "1"})
+    response = client.post("/return", data={"patron_id": "123456", "book_id": "1"})
+    assert response.status_code == 303
+    assert response.headers["Location"].endswith("/return")
+    assert int(response.headers["Retry-After"]) >= 1
+    page = client.get(response.headers["Location"]).get_data(as_text=True)
+    assert "Too many requests. Please slow down. Try again in" in page
+
+    response = client.post("/borrow", data={"patron_id": "123456", "book_id": "1"})
+    assert response.status_code == 303
+    assert response.headers["Location"].endswith("/catalog")
+
+
+def test_malformed_patron_ids_share_no_buckets(library_db):
+    from app import create_app
+    app = create_app({"RATE_LIMIT_IP": (1000.0, 1000)})
+    client = app.test_client()
+    for i in range(5):
+        client.post("/borrow", data={"patron_id": f"bogus-{i}", "book_id": "1"})
+    client.post("/borrow", data={"patron_id": "123456", "book_id": "1"})
+    assert len(app.extensions["rate_limiter"].store) == 2
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+import database
+from app import create_app
+from library_service import borrow_book_by_patron
+from services import recommendation_service
+from services.recommendation_service import CoBorrowIndex, count_basket_pairs
+
+
+def _seed_books(n):
+    for i in range(1, n + 1):
+        database.insert_book(f"Book {i}", "Author", f"{i:013d}", 10, 10)
+
+
+def _loan(patron_id, book_id):
+    now = datetime.now()
+    database.insert_borrow_record(patron_id, book_id, now, now + timedelta(days=14))
+
+
+def test_count_basket_pairs():
+    counts = count_basket_pairs([[1, 2, 3], [1, 2], [4]])
+    assert counts == {(1, 2): 2, (1, 3): 1, (2, 3): 1}
+
+
+def test_pruning_bounds_neighbours_per_book():
+    index = CoBorrowIndex(top_k=2, candidate_factor=2)
+    index.add_pair_counts(((1, 2), 10) for _ in range(1))
+    index.add_pair_counts(((1, other), 1) for other in range(3, 50))
+    assert len(index._neighbors[1]) <= 2 * index.capacity
+    assert index.related(1) == [(2, 10), (3, 1)]
+    assert index.related(1, limit=1) == [(2, 10)]
+
+
+def test_batch_rebuild_matches_incremental_updates(library_db, monkeypatch):
+    monkeypatch.setattr(recommendation_service, "_indexes", {})
+    _seed_books(4)
+    for patron, books in {"100001": [1, 2, 3], "100002": [1, 2], "100003": [2, 4]}.items():
+        for book_id in books:
+            _loan(patron, book_id)
+
+    index = recommendation_service.get_recommendation_index()
+    assert index.related(1) == [(2, 2), (3, 1)]
+    assert index.related(2) == [(1, 2), (3, 1), (4, 1)]
+
+    # New loans update the live index; a repeat borrow of the same book is not a new pair
+    assert borrow_book_by_patron("100003", 1)[0]
+    _loan("100002", 1)
+    assert index.related(1) == [(2, 3), (3, 1), (4, 1)]
+
+    rebuilt = recommendation_service.rebuild_index(chunk_patrons=1)
+    for book_id in range(1, 5):
+        assert rebuilt.related(book_id) == index.related(book_id)
+
+
+def test_loan_events_update_index_without_queries(library_db, monkeypatch):
+    monkeypatch.setattr(recommendation_service, "_indexes", {})
+    _seed_books(3)
+    _loan("100001", 1)
+    index = recommendation_service.get_recommendation_index()
+    _loan("100001", 2)
+    assert index.related(1) == [(2, 1)]
+
+    # The patron's recent books were read once; further loans use the event payload alone
+    with database.count_queries() as counter:
+        recommendation_service._on_change("loan_created", {"id": 3, "patron_id": "100001", "book_id": 3,
+                                                           "due_date": 0})
+        recommendation_service._on_change("loan_created", {"id": 4, "patron_id": "100001", "book_id": 1,
+                                                           "due_date": 0})
+    assert counter.count == 0
+    assert index.related(1) == [(2, 1), (3, 1)]
+
+
+def test_recent_books_memory_is_bounded():
+    index = CoBorrowIndex(recent_books=3, recent_patrons=10)
+    for loan in range(5000):
+        index.record_loan(f"{100000 + loan % 10}", loan)
+        if loan % 100 == 0:
+            index.record_loan(f"{200000 + loan}", loan)
+    assert len(index._baskets) == 10
+    assert all(len(basket) <= 3 for basket in index._baskets.values())
+    assert list(index._baskets["100009"]) == [4979, 4989, 4999]
+    assert "200000" not in index._baskets
+
+    # A new loan pairs only with the patron's last three books
+    index.record_loan("100009", 5000)
+    assert index.related(5000) == [(4979, 1), (4989, 1), (4999, 1)]
+
+
+def test_related_endpoint(library_db, monkeypatch):
+    monkeypatch.setattr(recommendation_service, "_indexes", {})
+    _seed_books(3)
+    for patron in ("100001", "100002"):
+        _loan(patron, 1)
+        _loan(patron, 3)
+    _loan("100003", 2)
+
+    client = create_app().test_client()
+    data = client.get("/api/books/1/related").get_json()
+    assert [(b["id"], b["co_borrow_count"]) for b in data["related"]] == [(3, 2)]
+    assert data["related"][0]["title"] == "Book 3"
+    assert client.get("/api/books/2/related").get_json()["count"] == 0
+    assert client.get("/api/books/999/related").status_code == 404
@@ -0,0 +1,35 @@
+import os
+import database
+from app import create_app
+
+
+def test_catalog_rows_cached_until_copies_change(library_db, tmp_path):
+    app = create_app({"TEMPLATE_BYTECODE_CACHE": str(tmp_path / "jinja")})
+    row_cache = app.extensions["row_cache"]
+    client = app.test_client()
+
+    first = client.get("/catalog").data
+    assert row_cache.misses == 3 and row_cache.hits == 0
+    assert client.get("/catalog").data == first
+    assert row_cache.misses == 3 and row_cache.hits == 3
+    assert os.listdir(tmp_path / "jinja")
+
+    client.post("/borrow", data={"patron_id": "123456", "book_id": "1"})
+    page = client.get("/catalog").data.decode()
+    assert row_cache.misses == 4
+    assert "2/3 Available" in page
+    assert 'placeholder="Patron ID (6 digits)"' in page
+
+
+def test_rows_escaped_and_variants(library_db):
+    database.insert_book("<b>Bold</b> Title", "Author", "9780306406157", 1, 0)
+    database.insert_book("Plain Title", "Author", "9780743273565", 3, 3)
+    client = create_app({"TEMPLATE_BYTECODE_CACHE": False}).test_client()
+
+    page = client.get("/catalog").data.decode()
+    assert "&lt;b&gt;Bold&lt;/b&gt; Title" in page and "<b>Bold</b>" not in page
+    assert "Not Available" in page
+
+    results = client.get("/search?q=plain&type=title").data.decode()
+    assert 'placeholder="Patron ID"' in results
+    assert "Plain Title" in results and "3/3 Available" in results
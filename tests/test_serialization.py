@@ -0,0 +1,63 @@
+import json
+import database
+from app import create_app
+from services import serialization
+from services.serialization import FragmentCache, dumps_json, dumps_msgpack
+
+
+def test_msgpack_encoding(monkeypatch):
+    monkeypatch.setattr(serialization, "msgpack", None)
+    assert dumps_msgpack(None) == b"\xc0"
+    assert dumps_msgpack([True, False, 5, -3]) == b"\x94\xc3\xc2\x05\xfd"
+    assert dumps_msgpack(300) == b"\xcd\x01\x2c"
+    assert dumps_msgpack(70000) == b"\xce\x00\x01\x11\x70"
+    assert dumps_msgpack(-1000) == b"\xd3" + (-1000).to_bytes(8, "big", signed=True)
+    assert dumps_msgpack(1.5) == b"\xcb\x3f\xf8\x00\x00\x00\x00\x00\x00"
+    assert dumps_msgpack({"a": "é"}) == b"\x81\xa1a\xa2\xc3\xa9"
+    assert dumps_msgpack("x" * 40) == b"\xd9\x28" + b"x" * 40
+    assert dumps_msgpack(list(range(16)))[:3] == b"\xdc\x00\x10"
+
+
+def test_fragment_cache_tracks_copy_counts(library_db):
+    cache = FragmentCache()
+    book = {"id": 1, "title": "T", "author": "A", "isbn": "1", "total_copies": 2, "available_copies": 2}
+    first = cache.fragments([book], serialization.JSON)
+    assert cache.fragments([book], serialization.JSON) == first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    changed = cache.fragments([dict(book, available_copies=1)], serialization.JSON)
+    assert json.loads(changed[0])["available_copies"] == 1
+    # Rows with extra fields are encoded but never cached
+    cache.fragments([dict(book, distance=1)] * 2, serialization.JSON)
+    assert cache.misses == 4
+
+
+def test_search_content_negotiation(library_db, monkeypatch):
+    monkeypatch.setattr(serialization, "msgpack", None)
+    database.add_sample_data()
+    client = create_app().test_client()
+
+    response = client.get("/api/search?q=the&type=title")
+    assert response.mimetype == "application/json"
+    data = json.loads(response.data)
+    assert data["count"] == len(data["results"]) > 0
+    assert list(data) == ["search_term", "search_type", "count", "results"]
+
+    packed = client.get("/api/search?q=the&type=title", headers={"Accept": "application/msgpack"})
+    assert packed.mimetype == "application/msgpack"
+    assert packed.data == dumps_msgpack(data)
+    assert "Accept" in packed.headers["Vary"]
+
+    assert client.get("/api/search?q=the", headers={"Accept": "text/html"}).status_code == 406
+    error = client.get("/api/search", headers={"Accept": "application/x-msgpack"})
+    assert error.status_code == 400 and error.data == dumps_msgpack({"error": "Search term is required"})
+
+
+def test_json_matches_jsonify(library_db):
+    database.add_sample_data()
+    client = create_app().test_client()
+    response = client.get("/api/books", headers={"Accept": "*/*"})
+    assert response.mimetype == "application/json"
+    data = response.get_json()
+    assert data["books"] == database.get_books_page({}, 50, None)
+    assert json.loads(dumps_json(data)) == data
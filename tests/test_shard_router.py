@@ -0,0 +1,163 @@
+import database
+from services.isbn_filter import complete_isbn13
+from services.shard_router import ShardRouter, ID_SPAN
+
+
+def _router(tmp_path, branches=("central", "north", "east")):
+    router = ShardRouter({name: str(tmp_path / f"{name}.db") for name in branches})
+    router.init_shards()
+    return router
+
+
+def test_book_ids_encode_their_branch(tmp_path):
+    router = _router(tmp_path)
+    router.add_book("north", "Dune", "Frank Herbert", "9780441172719", 2)
+    router.add_book("east", "Dune", "Frank Herbert", "9780441172719", 1)
+
+    results = router.search_books("dune", "title")
+    assert sorted(b["branch"] for b in results) == ["east", "north"]
+    for book in results:
+        assert router.shard_for_book(book["id"]) == router.shard_for_branch(book["branch"])
+    assert {b["id"] // ID_SPAN for b in results} == {1, 2}
+    router.close()
+
+
+def test_search_merges_in_title_order(tmp_path):
+    router = _router(tmp_path)
+    router.add_book("central", "Zebra Tales", "A", complete_isbn13("100000000000"), 1)
+    router.add_book("north", "Apple Tales", "B", complete_isbn13("100000000001"), 1)
+    router.add_book("east", "Mango Tales", "C", complete_isbn13("100000000002"), 1)
+
+    assert [b["title"] for b in router.search_books("tales", "title")] == \
+        ["Apple Tales", "Mango Tales", "Zebra Tales"]
+    assert [b["title"] for b in router.search_books("mngo", "fuzzy")] == ["Mango Tales"]
+    router.close()
+
+
+def test_borrow_limit_spans_branches(tmp_path):
+    router = _router(tmp_path)
+    ids = []
+    for n, branch in enumerate(["central", "north", "east"] * 2):
+        router.add_book(branch, f"Book {n}", "Author", complete_isbn13(f"{n:012d}"), 3)
+    for branch in router.branches:
+        ids += [b["id"] for b in router.search_books("book", "title") if b["branch"] == branch]
+
+    for book_id in ids[:5]:
+        assert router.borrow_book("123456", book_id)[0]
+    success, message = router.borrow_book("123456", ids[5])
+    assert not success
+    assert "maximum borrowing limit" in message
+
+    assert router.return_book("123456", ids[0])[0]
+    assert router.borrow_book("123456", ids[5])[0]
+
+    report = router.get_patron_status_report("123456")
+    assert report["borrow_count"] == 5
+    assert len(report["currently_borrowed"]) == 5
+    assert len(report["borrow_history"]) == 6
+    router.close()
+
+
+def test_failed_borrow_releases_slot_and_reconcile_repairs_drift(tmp_path):
+    router = _router(tmp_path, ("central", "north"))
+    router.add_book("north", "Solo", "Author", complete_isbn13("100000000009"), 1)
+    book_id = router.search_books("solo", "title")[0]["id"]
+
+    assert router.borrow_book("111111", book_id)[0]
+    for _ in range(6):
+        assert not router.borrow_book("222222", book_id)[0]
+    assert router.reconcile_patron_quota("222222") == 0
+
+    # Simulate a crash after reserving: the counter overcounts until reconciled
+    home = router.home_shard("111111")
+    with database.use_database(router.paths[home]):
+        conn = database.get_db_connection()
+        conn.execute("UPDATE patron_loan_quota SET active_loans = 5 WHERE patron_id = '111111'")
+        conn.commit()
+        conn.close()
+    assert router.reconcile_patron_quota("111111") == 1
+    router.close()
+
+
+def test_invalid_ids_are_rejected(tmp_path):
+    router = _router(tmp_path)
+    assert router.borrow_book("12", 1) == (False, "Invalid patron ID. Must be exactly 6 digits.")
+    assert router.borrow_book("123456", 99 * ID_SPAN) == (False, "Book not found.")
+    assert router.get_patron_status_report("abc") == {"error": "Invalid patron ID"}
+    router.close()
+
+
+def test_indexes_and_snapshot_stay_per_branch(library_db, tmp_path):
+    from services import catalog_snapshot, suggest_service
+    from services.recommendation_service import get_recommendation_index
+    database.insert_book("Main Branch Only", "Author", complete_isbn13("100000000009"), 1, 1)
+    catalog_snapshot.enable(str(tmp_path / "catalog.snapshot"))
+    router = _router(tmp_path)
+    try:
+        router.add_book("north", "Mango Tales", "C", complete_isbn13("100000000002"), 1)
+        assert [b["title"] for b in router.search_books("mngo", "fuzzy")] == ["Mango Tales"]
+        assert router.run(1, lambda: suggest_service.get_suggest_index().suggest("m"))[0]["text"] == "Mango Tales"
+        assert suggest_service.get_suggest_index().suggest("m")[0]["text"] == "Main Branch Only"
+        assert router.run(1, get_recommendation_index) is not get_recommendation_index()
+
+        # Writes to a branch don't touch the main database's snapshot
+        assert [b["title"] for b in catalog_snapshot.get_snapshot().all_books()] == ["Main Branch Only"]
+    finally:
+        router.close()
+        catalog_snapshot.disable()
+
+
+def test_slot_kept_when_borrow_fails_after_writing_the_loan(tmp_path, monkeypatch):
+    from services import library_service
+    router = _router(tmp_path, ("central", "north"))
+    router.add_book("north", "Solo", "Author", complete_isbn13("100000000009"), 1)
+    book_id = router.search_books("solo", "title")[0]["id"]
+    monkeypatch.setattr(library_service, "update_book_availability", lambda *args: False)
+
+    assert not router.borrow_book("111111", book_id)[0]
+    # The loan row exists, so the reconciled count and the counter agree on it
+    assert router.reconcile_patron_quota("111111") == 1
+    home = router.home_shard("111111")
+    with database.use_database(router.paths[home]):
+        conn = database.get_db_connection()
+        row = conn.execute("SELECT active_loans FROM patron_loan_quota WHERE patron_id = '111111'").fetchone()
+        conn.close()
+    assert row["active_loans"] == 1
+    router.close()
+
+
+def _branch_app(tmp_path, **config):
+    from app import create_app
+    branches = {name: str(tmp_path / f"{name}.db") for name in ("central", "north")}
+    return create_app({"BRANCHES": branches, **config})
+
+
+def test_create_app_routes_requests_to_branches(library_db, tmp_path):
+    app = _branch_app(tmp_path)
+    router = app.extensions["shard_router"]
+    router.add_book("north", "Mango Tales", "C", complete_isbn13("100000000002"), 1)
+    router.add_book("central", "Apple Tales", "B", complete_isbn13("100000000001"), 1)
+    mango = router.search_books("mango", "title")[0]["id"]
+    client = app.test_client()
+    try:
+        # Searches naming no branch cover all of them; naming one restricts to it
+        books = client.get("/api/search?q=tales&type=title").get_json()["results"]
+        assert [b["title"] for b in books] == ["Apple Tales", "Mango Tales"]
+        books = client.get("/api/search?q=tales&type=title&branch=north").get_json()["results"]
+        assert [b["title"] for b in books] == ["Mango Tales"]
+        assert client.get("/api/search?q=tales", headers={"X-Library-Branch": "south"}).status_code == 400
+
+        # A borrow by book ID lands on the branch owning the book
+        client.post("/borrow", data={"patron_id": "222333", "book_id": str(mango)})
+        assert router.run(1, database.get_patron_borrow_count, "222333") == 1
+        assert router.run(0, database.get_patron_borrow_count, "222333") == 0
+        assert database.get_patron_borrow_count("222333") == 0
+        assert router.run(1, database.get_book_by_id, mango)["available_copies"] == 0
+    finally:
+        router.close()
+
+
+def test_branches_reject_single_database_workers(library_db, tmp_path):
+    import pytest
+    with pytest.raises(ValueError):
+        _branch_app(tmp_path, PAYMENT_WORKERS=1)
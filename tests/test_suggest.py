@@ -0,0 +1,69 @@
+import pytest
+from services import suggest_service
+from services.suggest_service import SuggestIndex
+
+BOOKS = [
+    {"id": 1, "title": "The Great Gatsby", "author": "F. Scott Fitzgerald"},
+    {"id": 2, "title": "Great Expectations", "author": "Charles Dickens"},
+    {"id": 3, "title": "Grimm's Fairy Tales", "author": "Brothers Grimm"},
+]
+
+
+def test_prefix_matches_title_words_case_insensitive():
+    index = SuggestIndex.build(BOOKS)
+    texts = {s["text"] for s in index.suggest("GREAT")}
+    assert texts == {"The Great Gatsby", "Great Expectations"}
+
+
+def test_ranked_by_borrow_count():
+    index = SuggestIndex.build(BOOKS, {2: 5, 1: 1})
+    results = index.suggest("great", limit=1)
+    assert results[0]["book_id"] == 2
+    assert results[0]["borrow_count"] == 5
+
+
+def test_author_suggestions_and_incremental_updates():
+    index = SuggestIndex.build(BOOKS)
+    index.add_book(4, "Oliver Twist", "Charles Dickens")
+    index.record_borrow(4)
+    index.record_borrow(4)
+
+    results = index.suggest("dick")
+    assert results == [{"type": "author", "text": "Charles Dickens", "borrow_count": 2}]
+    assert index.suggest("oliv")[0]["book_id"] == 4
+    assert index.suggest("   ") == []
+
+
+def test_suggest_endpoint(library_db, monkeypatch):
+    from app import create_app
+    monkeypatch.setattr(suggest_service, "_indexes", {})
+    client = create_app().test_client()
+
+    response = client.get("/api/suggest?q=gat")
+    assert response.status_code == 200
+    assert response.get_json()["suggestions"][0]["text"] == "The Great Gatsby"
+    assert client.get("/api/suggest").status_code == 400
+
+
+def test_short_prefix_ranks_over_every_match():
+    books = [{"id": i, "title": f"Aaa {i}", "author": "Writer"} for i in range(1, 6001)]
+    books.append({"id": 6001, "title": "Azure", "author": "Zed"})
+    index = SuggestIndex.build(books, {6001: 3})
+    assert index.suggest("a", 1)[0]["book_id"] == 6001
+
+    index.record_borrow(7)
+    index.record_borrow(7)
+    index.record_borrow(7)
+    index.record_borrow(7)
+    assert [s["book_id"] for s in index.suggest("a", 2)] == [7, 6001]
+
+
+def test_added_books_merge_into_index(monkeypatch):
+    monkeypatch.setattr(suggest_service, "MERGE_EVERY", 4)
+    index = SuggestIndex.build(BOOKS)
+    for book_id in range(10, 20):
+        index.add_book(book_id, f"Greater Than {book_id}", "New Author")
+    index.record_borrow(15)
+    assert index.suggest("greater", 1)[0]["book_id"] == 15
+    assert len(index.suggest("greater than", 50)) == 10
+    assert index.suggest("gre", 1)[0]["book_id"] == 15
@@ -0,0 +1,61 @@
+import json
+import os
+import database
+from app import create_app
+from services.traffic_capture import capture_files, seed_paths
+from services.traffic_replay import load_capture, replay
+
+
+def _capture(tmp_path, **config):
+    path = str(tmp_path / "capture.jsonl")
+    app = create_app(dict(TRAFFIC_CAPTURE=path, **config))
+    client = app.test_client()
+    client.get("/catalog")
+    client.get("/api/search?q=the&type=title", headers={"Accept": "application/msgpack"})
+    client.post("/borrow", data={"patron_id": "123456", "book_id": "3"})
+    client.post("/borrow", data={"patron_id": "654321", "book_id": "3"})
+    app.extensions["traffic_recorder"].close()
+    return path
+
+
+def test_capture_records_requests(library_db, tmp_path):
+    path = _capture(tmp_path)
+    entries = [json.loads(line) for line in open(path)]
+    assert [e["endpoint"] for e in entries] == [
+        "catalog.catalog", "api.search_books_api", "borrowing.borrow_book", "borrowing.borrow_book"]
+    assert [e["n"] for e in entries] == [1, 2, 3, 4]
+    assert entries[1]["query"] == "q=the&type=title"
+    assert entries[1]["accept"] == "application/msgpack"
+    assert entries[2]["form"] == {"patron_id": "123456", "book_id": "3"}
+    assert all(e["queries"] > 0 and e["ms"] > 0 for e in entries)
+    assert os.path.exists(seed_paths(path)[0])
+
+
+def test_count_queries(library_db):
+    with database.count_queries() as counter:
+        database.get_book_by_id(1)
+        database.get_book_by_id(2)
+    assert counter.count == 2
+    database.get_book_by_id(1)
+    assert counter.count == 2
+
+
+def test_capture_rotation(library_db, tmp_path):
+    path = _capture(tmp_path, TRAFFIC_CAPTURE_MAX_BYTES=300, TRAFFIC_CAPTURE_BACKUPS=10)
+    assert len(capture_files(path)) > 1
+    assert [e["n"] for e in load_capture(path)] == [1, 2, 3, 4]
+
+
+def test_replay_reproduces_statuses(library_db, tmp_path):
+    path = _capture(tmp_path)
+    # The capture changed the live database; replay must start from the seed
+    assert database.get_book_by_id(3)["available_copies"] == 0
+
+    for speed, concurrency in ((0, 1), (100.0, 1), (0, 2)):
+        report = replay(path, speed=speed, concurrency=concurrency, workdir=str(tmp_path))
+        assert report["requests"] == 4 and report["complete"]
+        borrow = report["endpoints"]["borrowing.borrow_book"]
+        assert borrow["count"] == 2
+        if concurrency == 1:
+            assert all(stats["status_mismatches"] == 0 for stats in report["endpoints"].values())
+            assert borrow["queries"] == borrow["captured_queries"]